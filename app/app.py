@@ -4,20 +4,29 @@ FTP Scheduler App - Versione Completa con Sistema Categorie CDR Unificato
 Aggiornato per utilizzare cdr_categories_enhanced.py invece dei file separati
 """
 # Importo le librerie standard
+import atexit
 import os
 import sys
+import time
 import socket
+from types import MappingProxyType
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-from pathlib import Path
-from flask import Flask, send_from_directory, jsonify
+from flask import Flask, Response
 
 # Import il file di configurazione sicura
 from config import SecureConfig
 
+# Provider JSON basato su orjson
+from json_provider import OrjsonProvider, fast_dumps
+
 # Import moduli personalizzati
-from logger_config import get_logger, log_success, log_error, log_warning, log_info
+from logger_config import log_success, log_error, log_warning, log_info
 from performance_monitor import get_performance_monitor
 from scheduler import SchedulerManager
+from cdr_categories_enhanced import CDRAnalyticsEnhanced
+from odoo.odoo_manager import get_odoo_manager
 
 
 #ROUTE Default
@@ -45,6 +54,39 @@ from routes.ftp_route import ftp_routes
 from routes.schedule_routes import schedule_routes
 
 
+# Configurazione Flask statica (non dipende dall'ambiente), costruita una sola volta all'import
+STATIC_FLASK_CONFIG = MappingProxyType({
+    'SESSION_COOKIE_HTTPONLY': True,
+    'SESSION_COOKIE_SAMESITE': 'Lax',
+    'PERMANENT_SESSION_LIFETIME': timedelta(hours=24),
+})
+
+# Dimensione massima (MB) del body delle richieste se non configurata
+DEFAULT_MAX_CONTENT_LENGTH_MB = 32
+
+# TTL in secondi della cache per le risposte di monitoring (probe liveness/readiness)
+MONITORING_CACHE_TTL = 1
+
+
+@lru_cache(maxsize=4)
+def _cached_monitoring_payload(endpoint, time_bucket):
+    # Serializza una sola volta per intervallo il payload del monitor (time_bucket fa da TTL)
+    monitor = get_performance_monitor()
+    if endpoint == 'health':
+        data = monitor.get_health_status()
+    else:
+        data = monitor.get_application_metrics()
+    return fast_dumps(data).encode('utf-8')
+
+
+def _monitoring_response(endpoint):
+    # Risposta JSON con Content-Length e Cache-Control adatti ai probe
+    payload = _cached_monitoring_payload(endpoint, int(time.monotonic() // MONITORING_CACHE_TTL))
+    response = Response(payload, mimetype='application/json')
+    response.headers['Cache-Control'] = f'max-age={MONITORING_CACHE_TTL}'
+    return response
+
+
 def create_app():
     # Crea l'istanza dell'app Flask
     # Imposta le cartelle dei template e statici da variabili d'ambiente o valori di default
@@ -53,25 +95,29 @@ def create_app():
                 static_folder=os.getenv("STATIC_FOLDER", "static"), 
                 static_url_path=os.getenv("STATIC_URL_PATH", "/static"))
     
+    # Serializzazione JSON tramite orjson per tutte le chiamate jsonify
+    app.json = OrjsonProvider(app)
+    # Output compatto e senza ordinamento chiavi (anche in debug)
+    app.json.sort_keys = False
+    app.json.compact = True
+    
     # Configurazione Flask sicura
-    app.config.update(
-        SECRET_KEY=os.getenv('SECRET_KEY', os.urandom(32)),
-        SESSION_COOKIE_SECURE=True if os.getenv('HTTPS', 'false').lower() == 'true' else False,
-        SESSION_COOKIE_HTTPONLY=True,
-        SESSION_COOKIE_SAMESITE='Lax',
-        PERMANENT_SESSION_LIFETIME=timedelta(hours=24)
-    )
+    app.config.update(STATIC_FLASK_CONFIG)
+    secret_key = os.getenv('SECRET_KEY')
+    app.config['SECRET_KEY'] = secret_key if secret_key is not None else os.urandom(32)
+    app.config['SESSION_COOKIE_SECURE'] = os.getenv('HTTPS', 'false').lower() == 'true'
+    # Limite globale del body: Werkzeug interrompe upload più grandi mentre li legge (413)
+    # (valore di default, build_app applica MAX_CONTENT_LENGTH_MB della configurazione)
+    app.config['MAX_CONTENT_LENGTH'] = DEFAULT_MAX_CONTENT_LENGTH_MB * 1024 * 1024
     
     # Route performance monitoring
     @app.route('/api/metrics/performance')
     def get_performance_metrics():
-        monitor = get_performance_monitor()
-        return jsonify(monitor.get_application_metrics())
+        return _monitoring_response('metrics')
     
     @app.route('/api/health/detailed')
     def get_detailed_health():
-        monitor = get_performance_monitor()
-        return jsonify(monitor.get_health_status())
+        return _monitoring_response('health')
     
     return app
 
@@ -90,17 +136,22 @@ def find_free_port(start_port=5000):
 
 
 def print_startup_info(app_host, app_port):
-    # Stampa le informazioni di avvio dell'applicazione
-    print("\n" + "="*60)
-    print("UNISCO MANAGER - VERSIONE UNIFICATA CDR 1.0")
-    print("="*60)
-    print(f"Dashboard: http://{app_host}:{app_port}")
-    print(f"Configurazione: http://{app_host}:{app_port}/config")
-    print(f"Gestione Categorie CDR: http://{app_host}:{app_port}/cdr_categories")
-    print(f"Dashboard CDR: http://{app_host}:{app_port}/cdr_dashboard")
-    print(f"Log: http://{app_host}:{app_port}/logs")
-    print(f"Stato: http://{app_host}:{app_port}/status")
-    print("="*60)
+    # Stampa le informazioni di avvio dell'applicazione con una sola scrittura su stdout
+    base_url = f"http://{app_host}:{app_port}"
+    separator = "=" * 60
+    sys.stdout.write(
+        f"\n{separator}\n"
+        "UNISCO MANAGER - VERSIONE UNIFICATA CDR 1.0\n"
+        f"{separator}\n"
+        f"Dashboard: {base_url}\n"
+        f"Configurazione: {base_url}/config\n"
+        f"Gestione Categorie CDR: {base_url}/cdr_categories\n"
+        f"Dashboard CDR: {base_url}/cdr_dashboard\n"
+        f"Log: {base_url}/logs\n"
+        f"Stato: {base_url}/status\n"
+        f"{separator}\n"
+    )
+    sys.stdout.flush()
     
 
 def graceful_shutdown(scheduler_manager):
@@ -112,82 +163,100 @@ def graceful_shutdown(scheduler_manager):
         log_error(f"Errore durante shutdown: {e}")
 
 
-def main():
-    # Carico tutti i moduli necessari
+def build_app(secure_config=None, start_scheduler=True):
+    """
+    Crea l'app Flask completa: route di tutti i moduli, manager (categorie CDR, Odoo) e scheduler avviato
     
-    try:
-        log_info("Inizializzazione le varie applicazioni di UNISCO MANAGER 1.0")
-
-        # Inizializza configurazione sicura
+    Con start_scheduler=False lo scheduler viene creato (route schedule) ma i job non vengono pianificati.
+    
+    Usata sia da main() (server di sviluppo) sia dai server WSGI esterni, ad es.:
+        gunicorn --workers 1 --threads 8 'app:build_app()'
+    Usare un solo worker (con più thread): ogni processo avvia il proprio scheduler e i job verrebbero eseguiti più volte.
+    """
+    log_info("Inizializzazione le varie applicazioni di UNISCO MANAGER 1.0")
+    
+    # Inizializza configurazione sicura
+    if secure_config is None:
         secure_config = SecureConfig()
-        print(f" Configurazione caricata da: {secure_config}")
-        # Mostra info configurazione
-        config_info = secure_config.get_config()
-        log_info(f"Directory config: {config_info['config_directory']}")
-        log_info(f"Directory output: {config_info['output_directory']}")
-        log_info(f"File categorie: {config_info['categories_config_file']}")
-
-        # Crea app Flask
-        app = create_app()
-        
-        # INIZIALIZZA COMPONENTI CON SISTEMA UNIFICATO
-        # processor = FTPDownloader(secure_config.get_config())
-        # print(dir(processor))
-        # # INTEGRA IL SISTEMA CATEGORIE UNIFICATO (sostituisce i vecchi sistemi)
-        # # log_info("Integrazione Sistema CDR Unificato con configurazione da .env...")
+    print(f" Configurazione caricata da: {secure_config}")
+    # Mostra info configurazione
+    config_info = secure_config.get_config()
+    log_info(f"Directory config: {config_info['config_directory']}")
+    log_info(f"Directory output: {config_info['output_directory']}")
+    log_info(f"File categorie: {config_info['categories_config_file']}")
+
+    # Crea app Flask
+    app = create_app()
+    # Limite del body dalla configurazione già validata (intero, default 32MB)
+    app.config['MAX_CONTENT_LENGTH'] = config_info.get('MAX_CONTENT_LENGTH_MB', DEFAULT_MAX_CONTENT_LENGTH_MB) * 1024 * 1024
+
+    # Prepara in background le istanze con I/O (file categorie, client Odoo)
+    # mentre le altre route vengono registrate; la registrazione resta nel thread principale
+    executor = ThreadPoolExecutor(max_workers=2)
+    categories_future = executor.submit(CDRAnalyticsEnhanced, output_directory=config_info['config_directory'])
+    odoo_future = executor.submit(get_odoo_manager, secure_config)
+    
+    # INIZIALIZZA COMPONENTI CON SISTEMA UNIFICATO
+    # processor = FTPDownloader(secure_config.get_config())
+    # print(dir(processor))
+    # # INTEGRA IL SISTEMA CATEGORIE UNIFICATO (sostituisce i vecchi sistemi)
+    # # log_info("Integrazione Sistema CDR Unificato con configurazione da .env...")
 
 
-        # processor = integrate_enhanced_cdr_system(app, processor, secure_config)
-        
-        # AGGIUNGI ROUTE FTP (aggiornate)
-        ftp = ftp_routes(app, secure_config)
-
-        # GESTIONE CONTRATTI
-        log_info("Registrazione route gestione contratti...")
-        gestione_contratti = contratti_routes(app, secure_config)
-        log_success(f"Route categorie registrate: {gestione_contratti['routes_count']} endpoint")
-
-        # GESTIONE ELABORAZIONE CONTRATTI
-        log_info("Registrazione route gestione dell'elaborazione dei contratti...")
-        elaborazione_contratti = add_elaborazione_contratti_routes(app, secure_config)
-        log_success(f"Route categorie registrate: {elaborazione_contratti['routes_count']} endpoint")
-
-        # GESTIONE FATTURE
-        log_info("Registrazione route gestione fatture...")
-        gestione_fatture = fatture_routes(app, secure_config)
-        log_success(f"Route categorie registrate: {gestione_fatture['routes_count']} endpoint")
-
-        log_info("Registrazione route gestione contratti...")
-        contratti = add_datatable_routes_to_contratti(app, secure_config)
-        log_success(f"Route categorie registrate: {contratti['routes_count']} endpoint")
+    # processor = integrate_enhanced_cdr_system(app, processor, secure_config)
     
-        # GESTIONE ODOO
-        log_info("Registrazione route gestione ODOO...")
-        gestione_odoo = add_odoo_routes(app, secure_config)
-        log_success(f"Route ODOO registrate: {gestione_odoo['routes_count']} endpoint")
-
-        # AGGIUNGI ROUTE PER GESTIONE CATEGORIE (aggiornate)
-        log_info("Registrazione route gestione categorie unificato...")
-        categories_info = add_cdr_categories_routes(app, secure_config)
-        log_success(f"Route categorie registrate: {categories_info['routes_count']} endpoint")
-
-        # AGGIUNGI ROUTE IL LISTINO (aggiornate)
-        log_info("Registrazione route gestione listino prezzi...")
-        listino = create_listino_routes(app, secure_config)
-        log_success(f"Route listino prezzi registrate: {listino['routes_count']} endpoint")
-        log_info(f"Dashboard listino disponibile su: /listino/")
-        log_info(f"Directory upload listino: {listino['upload_folder']}")
-
-        # Inizializza scheduler
-        scheduler_manager = SchedulerManager()
+    # AGGIUNGI ROUTE FTP (aggiornate)
+    ftp_routes(app, secure_config)
+
+    # GESTIONE CONTRATTI
+    log_info("Registrazione route gestione contratti...")
+    gestione_contratti = contratti_routes(app, secure_config)
+    log_success(f"Route categorie registrate: {gestione_contratti['routes_count']} endpoint")
+
+    # GESTIONE ELABORAZIONE CONTRATTI
+    log_info("Registrazione route gestione dell'elaborazione dei contratti...")
+    elaborazione_contratti = add_elaborazione_contratti_routes(app, secure_config)
+    log_success(f"Route categorie registrate: {elaborazione_contratti['routes_count']} endpoint")
+
+    # GESTIONE FATTURE
+    log_info("Registrazione route gestione fatture...")
+    gestione_fatture = fatture_routes(app, secure_config)
+    log_success(f"Route categorie registrate: {gestione_fatture['routes_count']} endpoint")
+
+    log_info("Registrazione route gestione contratti...")
+    contratti = add_datatable_routes_to_contratti(app, secure_config)
+    log_success(f"Route categorie registrate: {contratti['routes_count']} endpoint")
+
+    # GESTIONE ODOO
+    log_info("Registrazione route gestione ODOO...")
+    gestione_odoo = add_odoo_routes(app, secure_config, odoo_future.result())
+    log_success(f"Route ODOO registrate: {gestione_odoo['routes_count']} endpoint")
+
+    # AGGIUNGI ROUTE PER GESTIONE CATEGORIE (aggiornate)
+    log_info("Registrazione route gestione categorie unificato...")
+    categories_info = add_cdr_categories_routes(app, secure_config, categories_future.result())
+    log_success(f"Route categorie registrate: {categories_info['routes_count']} endpoint")
+    executor.shutdown(wait=False)
+
+    # AGGIUNGI ROUTE IL LISTINO (aggiornate)
+    log_info("Registrazione route gestione listino prezzi...")
+    listino = create_listino_routes(app, secure_config)
+    log_success(f"Route listino prezzi registrate: {listino['routes_count']} endpoint")
+    log_info("Dashboard listino disponibile su: /listino/")
+    log_info(f"Directory upload listino: {listino['upload_folder']}")
+
+    # Inizializza scheduler
+    scheduler_manager = SchedulerManager()
+    # Da qui lo scheduler è attivo: se la costruzione fallisce va fermato, main() non riceve ancora il manager
+    try:
         scheduler_manager.set_config(secure_config)
-        
+    
         # AGGIUNGI ROUTE SCHEDULE (aggiornate)
-        schedule = schedule_routes(app, secure_config, scheduler_manager)
+        schedule_routes(app, secure_config, scheduler_manager)
 
         # Crea tutte le route standard
-        default_routes = create_routes(app, secure_config, scheduler_manager)
-        
+        create_routes(app, secure_config, scheduler_manager)
+    
         # MANTIENI INTEGRAZIONE CONTRATTI (se necessario)
         try:
             contracts_info = api_contract_routes(app, secure_config)
@@ -203,19 +272,68 @@ def main():
         #     log_warning("Sistema contratti non disponibile (modulo non trovato)")    
 
         # Avvia scheduler
+        if start_scheduler:
+            try:
+                scheduler_manager.restart_scheduler()
+                log_success("Scheduler inizializzato")
+            except Exception as e:
+                log_error(f"Errore inizializzazione scheduler: {e}")
+    
+        # VERIFICA SISTEMA CATEGORIE UNIFICATO ALL'AVVIO
+        # verify_unified_categories_system(processor)
+    
+        # REGISTRA BREADCRUMB GLOBALS (se disponibile)
         try:
-            scheduler_manager.restart_scheduler()
-            log_success("Scheduler inizializzato")
-        except Exception as e:
-            log_error(f"Errore inizializzazione scheduler: {e}")
+            from routes.menu_routes import register_breadcrumb_globals
+            register_breadcrumb_globals(app)
+            log_success("Funzioni breadcrumb registrate")
+        except ImportError:
+            log_warning("Sistema breadcrumb non disponibile")
+    
+        # Registra cleanup per shutdown graceful
+        atexit.register(lambda: graceful_shutdown(scheduler_manager))
+    
+        # Riferimenti usati da main() per avvio e shutdown
+        app.extensions['secure_config'] = secure_config
+        app.extensions['scheduler_manager'] = scheduler_manager
+    except BaseException:
+        graceful_shutdown(scheduler_manager)
+        raise
+    
+    return app
+
+
+def main():
+    # Carico tutti i moduli necessari
+    scheduler_manager = None
+    
+    try:
+        secure_config = SecureConfig()
+        app_config = secure_config.get_config()
+        
+        # In produzione con server WSGI esterno il server di sviluppo non viene avviato:
+        # l'app completa si ottiene dal server WSGI con build_app()
+        if app_config.get('FLASK_ENV') == 'production' and app_config.get('EXTERNAL_WSGI_SERVER', False):
+            log_info("Modalità produzione: server di sviluppo non avviato, avviare l'app con un server WSGI esterno "
+                     "(es. gunicorn --workers 1 --threads 8 'app:build_app()')")
+            return
+        
+        # Con il reloader il processo padre sorveglia solo i file e avvia un processo figlio (WERKZEUG_RUN_MAIN=true)
+        # che ricrea l'app: i job vanno pianificati solo nel figlio, altrimenti ogni job verrebbe eseguito due volte
+        use_reloader = app_config.get('USE_RELOADER', False)
+        start_scheduler = not use_reloader or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+        
+        # Crea app Flask con tutte le route e lo scheduler avviato
+        app = build_app(secure_config, start_scheduler=start_scheduler)
+        scheduler_manager = app.extensions['scheduler_manager']
         
         # Configurazione server  
-        app_host = secure_config.get_config().get('APP_HOST', '127.0.0.1')
-        requested_port = secure_config.get_config().get('APP_PORT', 5001)
-        app_debug = secure_config.get_config().get('FLASK_DEBUG', False)
+        app_host = app_config.get('APP_HOST', '127.0.0.1')
+        requested_port = app_config.get('APP_PORT', 5001)
+        app_debug = app_config.get('FLASK_DEBUG', False)
         
         # In produzione, disabilita debug mode
-        if secure_config.get_config().get('FLASK_ENV') == 'production':
+        if app_config.get('FLASK_ENV') == 'production':
             app_debug = False
         
         # Trova porta libera se quella richiesta è occupata
@@ -229,40 +347,25 @@ def main():
             if app_port != requested_port:
                 log_info(f"Usando porta alternativa: {app_port}")
         
-        # VERIFICA SISTEMA CATEGORIE UNIFICATO ALL'AVVIO
-        # verify_unified_categories_system(processor)
-        
-        # REGISTRA BREADCRUMB GLOBALS (se disponibile)
-        try:
-            from routes.menu_routes import register_breadcrumb_globals
-            register_breadcrumb_globals(app)
-            log_success("Funzioni breadcrumb registrate")
-        except ImportError:
-            log_warning("Sistema breadcrumb non disponibile")
-        
         # Stampa info di avvio
         print_startup_info(app_host, app_port)
         
-        # Registra cleanup per shutdown graceful
-        import atexit
-        atexit.register(lambda: graceful_shutdown(scheduler_manager))
-        
         # Avvia applicazione
         app.run(
             debug=app_debug,
             host=app_host,
             port=app_port,
-            threaded=True,
-            use_reloader=False #app_debug  # reloader solo se debug è attivo
+            threaded=app_config.get('WERKZEUG_THREADED', True),
+            use_reloader=use_reloader
         )
         
     except KeyboardInterrupt:
         log_info("Applicazione fermata dall'utente")
-        if 'scheduler_manager' in locals():
+        if scheduler_manager is not None:
             graceful_shutdown(scheduler_manager)
     except Exception as e:
         log_error(f"Errore avvio applicazione: {e}")
-        if 'scheduler_manager' in locals():
+        if scheduler_manager is not None:
             graceful_shutdown(scheduler_manager)
         sys.exit(1)
 
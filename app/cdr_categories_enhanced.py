@@ -4,17 +4,55 @@ CDR Categories Enhanced - Sistema unificato per gestione categorie CDR e analyti
 Unisce la gestione delle macro categorie con il sistema di elaborazione CDR avanzato
 """
 
+import copy
 import json
 import logging
 import math
+import os
+import re
+import shutil
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Sequence
 from dataclasses import dataclass, asdict
 from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+from json_provider import fast_dumps, fast_loads
+
+# Automa Aho-Corasick per la classificazione dei tipi chiamata (opzionale, fallback su regex)
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 logger = logging.getLogger(__name__)
 
+# Numero massimo di tipi chiamata memorizzati dal matcher prima di svuotare il memo
+MATCHER_MEMO_MAX_SIZE = 50000
+# Sentinella del memo: distingue "non ancora classificato" da "nessuna categoria" (None)
+_NOT_CLASSIFIED = object()
+
+# Numero di backup del file categorie conservati (i più vecchi vengono eliminati)
+CATEGORIES_BACKUP_KEEP = 20
+
+# Prezzi e costi hanno 4 decimali: in aritmetica intera si lavora in decimillesimi di unità di valuta
+PRICE_SCALE = 10000
+
+# Intervallo minimo (secondi) tra due controlli di modifica del file categorie da parte di altri processi
+CONFIG_RELOAD_CHECK_SECONDS = 1.0
+
+# Parole chiave che identificano un file CDR dal nome (una sola ricerca, senza distinzione maiuscole)
+_CDR_FILENAME_RE = re.compile(r'CDR|RIV|CALL|DETAIL', re.IGNORECASE)
+
+def units_cost(price_units, duration_seconds):
+    """Costo in decimillesimi di prezzo_al_minuto * secondi / 60, arrotondato a metà per eccesso (anche su array NumPy interi)"""
+    return (price_units * duration_seconds * 2 + 60) // 120
+
+
 @dataclass
 class CDRCategory:
     """Classe per rappresentare una categoria CDR con markup personalizzabile"""
@@ -31,12 +69,25 @@ class CDRCategory:
     price_with_markup: Optional[float] = None
     
     def __post_init__(self):
-        if self.created_at is None:
-            self.created_at = datetime.now().isoformat()
-        self.updated_at = datetime.now().isoformat()
+        # I timestamp letti dal file vengono mantenuti: solo una categoria nuova riceve l'ora corrente
+        if self.created_at is None or self.updated_at is None:
+            now = datetime.now().isoformat()
+            if self.created_at is None:
+                self.created_at = now
+            if self.updated_at is None:
+                self.updated_at = now
         
         if self.price_with_markup is None:
             self._calculate_price_with_markup()
+        else:
+            self._refresh_price_units()
+        
+        self._refresh_patterns_upper()
+    
+    def _refresh_patterns_upper(self):
+        """Precalcola i pattern normalizzati (maiuscolo, senza spazi) usati nel matching; da chiamare se patterns cambia"""
+        # Attributo semplice, non campo dataclass: resta fuori da asdict() e dal file di configurazione
+        self._patterns_upper = tuple(pattern.upper().strip() for pattern in self.patterns)
     
     def _calculate_price_with_markup(self, global_markup_percent: float = 0.0):
         """Calcola il prezzo finale applicando il markup"""
@@ -44,10 +95,22 @@ class CDRCategory:
             markup_to_apply = self.custom_markup_percent if self.custom_markup_percent is not None else global_markup_percent
             markup_multiplier = 1 + (markup_to_apply / 100)
             self.price_with_markup = round(self.price_per_minute * markup_multiplier, 4)
-            logger.debug(f"Categoria {self.name}: prezzo base {self.price_per_minute} + {markup_to_apply}% = {self.price_with_markup}")
+            logger.debug("Categoria %s: prezzo base %s + %s%% = %s",
+                         self.name, self.price_per_minute, markup_to_apply, self.price_with_markup)
         except Exception as e:
             logger.error(f"Errore calcolo markup per categoria {self.name}: {e}")
             self.price_with_markup = self.price_per_minute
+        
+        self._refresh_price_units()
+    
+    def _refresh_price_units(self):
+        """Precalcola il prezzo con markup in decimillesimi interi (None se non esprimibile esattamente a 4 decimali)"""
+        price = self.price_with_markup if self.price_with_markup else self.price_per_minute
+        try:
+            units = round(price * PRICE_SCALE)
+            self._price_units = units if units / PRICE_SCALE == price else None
+        except (TypeError, ValueError, OverflowError):
+            self._price_units = None
     
     def update_markup(self, custom_markup_percent: Optional[float] = None, global_markup_percent: float = 0.0):
         """Aggiorna il markup per questa categoria"""
@@ -79,8 +142,8 @@ class CDRCategory:
         
         call_type_upper = call_type.upper().strip()
         
-        for pattern in self.patterns:
-            if pattern.upper().strip() in call_type_upper:
+        for pattern in self._patterns_upper:
+            if pattern in call_type_upper:
                 return True
         
         return False
@@ -92,15 +155,18 @@ class CDRCategory:
         # price_to_use = self.price_with_markup
         
         if unit == 'per_second':
-            cost = price_to_use * (duration_seconds / 60.0)
             duration_billed = duration_seconds
             unit_label = 'secondi'
         else:
-            duration_minutes = duration_seconds / 60.0
-            cost = price_to_use * duration_minutes
-            duration_billed = duration_minutes
+            duration_billed = duration_seconds / 60.0
             unit_label = 'minuti'
         
+        if use_markup and self._price_units is not None and isinstance(duration_seconds, int):
+            # Aritmetica intera esatta, arrotondamento a metà per eccesso: nessun errore di virgola mobile
+            cost = units_cost(self._price_units, duration_seconds) / PRICE_SCALE
+        else:
+            cost = round(price_to_use * (duration_seconds / 60.0), 4)
+        
         return {
             'category_name': self.name,
             'category_display_name': self.display_name,
@@ -111,7 +177,7 @@ class CDRCategory:
             'markup_applied': use_markup,
             'duration_billed': round(duration_billed, 4),
             'unit_label': unit_label,
-            'cost_calculated': round(cost, 4),
+            'cost_calculated': cost,
             'currency': self.currency
         }
 
@@ -119,8 +185,9 @@ class CDRCategory:
 class CDRCategoriesManager:
     """Manager per gestire le categorie CDR con supporto markup personalizzabili"""
     
-    DEFAULT_CATEGORIES = {
-        'FISSI': CDRCategory(
+    # Specifiche delle categorie di default: le istanze vengono create solo quando servono (vedi _build_defaults)
+    _DEFAULT_SPECS = {
+        'FISSI': dict(
             name='FISSI',
             display_name='Chiamate Fisso',
             price_per_minute=0.02,
@@ -128,7 +195,7 @@ class CDRCategoriesManager:
             patterns=['INTERRURBANE URBANE', 'INTERURBANE URBANE', 'URBANE', 'FISSO', 'RETE FISSA', 'TELEFONIA FISSA', 'LOCALE', 'DISTRETTUALE'],
             description='Chiamate verso numeri fissi nazionali'
         ),
-        'MOBILI': CDRCategory(
+        'MOBILI': dict(
             name='MOBILI',
             display_name='Chiamate Mobile',
             price_per_minute=0.15,
@@ -136,7 +203,7 @@ class CDRCategoriesManager:
             patterns=['CELLULARE', 'MOBILE', 'RETE MOBILE', 'TELEFONIA MOBILE', 'GSM', 'UMTS', 'LTE', 'WIND', 'TIM', 'VODAFONE', 'ILIAD'],
             description='Chiamate verso numeri mobili'
         ),
-        'FAX': CDRCategory(
+        'FAX': dict(
             name='FAX',
             display_name='Servizi Fax',
             price_per_minute=0.02,
@@ -144,7 +211,7 @@ class CDRCategoriesManager:
             patterns=['FAX', 'TELEFAX', 'FACSIMILE'],
             description='Servizi di fax'
         ),
-        'NUMERI_VERDI': CDRCategory(
+        'NUMERI_VERDI': dict(
             name='NUMERI_VERDI',
             display_name='Numeri Verdi',
             price_per_minute=0.00,
@@ -152,7 +219,7 @@ class CDRCategoriesManager:
             patterns=['NUMERO VERDE', 'VERDE', '800', 'GRATUITO', 'TOLL FREE'],
             description='Numeri verdi e gratuiti'
         ),
-        'INTERNAZIONALI': CDRCategory(
+        'INTERNAZIONALI': dict(
             name='INTERNAZIONALI',
             display_name='Chiamate Internazionali',
             price_per_minute=0.25,
@@ -162,6 +229,16 @@ class CDRCategoriesManager:
         )
     }
     
+    @classmethod
+    def _build_defaults(cls, global_markup_percent: float = 0.0) -> Dict[str, CDRCategory]:
+        """Crea istanze nuove delle categorie di default (mai condivise tra manager), con il markup globale applicato"""
+        defaults = {}
+        for name, spec in cls._DEFAULT_SPECS.items():
+            category = CDRCategory(**dict(spec, patterns=list(spec['patterns'])))
+            category._calculate_price_with_markup(global_markup_percent)
+            defaults[name] = category
+        return defaults
+    
     def __init__(self, config_file: str = None, secure_config: 'SecureConfig' = None):
         """Inizializza il manager con configurazione da .env"""
         
@@ -182,18 +259,32 @@ class CDRCategoriesManager:
             self.global_markup_percent = float(os.getenv('VOIP_MARKUP_PERCENT', 0.0))
         
         self.categories: Dict[str, CDRCategory] = {}
+        # Versione dei dati: incrementata ad ogni modifica, invalida le proiezioni in cache
+        self._version = 0
+        self._projection_cache: Dict[Any, tuple] = {}
+        # mtime del file all'ultimo caricamento/salvataggio, per accorgersi delle modifiche di altri processi
+        self._file_mtime: Optional[int] = None
+        self._file_checked_at = 0.0
+        # Prefisso ETag univoco per istanza: evita 304 errati dopo un riavvio
+        self._etag_prefix = format(int(datetime.now().timestamp() * 1000), 'x')
         logger.info(f"🔧 CDR Categories Manager - File config: {self.config_file}")
         logger.info(f"💰 Markup globale da config: {self.global_markup_percent}%")
         self.load_categories()
 
-    def load_categories(self):
-        """Carica le categorie dal file di configurazione"""
+    def load_categories(self, fallback_to_defaults: bool = True):
+        """
+        Carica le categorie dal file di configurazione
+        
+        Args:
+            fallback_to_defaults: Se il file non è leggibile usa le categorie di default (caricamento iniziale);
+                                  se False mantiene quelle in memoria (ricarica a runtime)
+        """
         try:
             if self.config_file.exists():
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                with open(self.config_file, 'rb') as f:
+                    data = fast_loads(f.read())
                 
-                self.categories = {}
+                categories = {}
                 for cat_name, cat_data in data.items():
                     if isinstance(cat_data, dict):
                         if 'custom_markup_percent' not in cat_data:
@@ -203,40 +294,124 @@ class CDRCategoriesManager:
                         
                         category = CDRCategory(**cat_data)
                         category._calculate_price_with_markup(self.global_markup_percent)
-                        self.categories[cat_name] = category
+                        categories[cat_name] = category
                     else:
                         logger.warning(f"Categoria {cat_name} ha formato non valido")
                 
+                # Sostituzione in un solo passo: le richieste concorrenti non vedono mai un dizionario parziale
+                self.categories = categories
+                self._file_mtime = self._config_mtime()
                 logger.info(f"Caricate {len(self.categories)} categorie CDR da {self.config_file}")
+            elif not fallback_to_defaults:
+                logger.warning(f"File categorie {self.config_file} non trovato, mantengo le categorie attualmente in memoria")
+                return
             else:
                 logger.info("File categorie non trovato, creo categorie di default")
-                self.categories = self.DEFAULT_CATEGORIES.copy()
-                for category in self.categories.values():
-                    category._calculate_price_with_markup(self.global_markup_percent)
+                self.categories = self._build_defaults(self.global_markup_percent)
                 self.save_categories()
                 
         except Exception as e:
             logger.error(f"Errore caricamento categorie: {e}")
+            if not fallback_to_defaults:
+                # File momentaneamente non valido (scrittura in corso, modifica manuale): restano le categorie correnti,
+                # altrimenti il primo salvataggio successivo sovrascriverebbe la configurazione reale con i default
+                logger.warning("Mantengo le categorie attualmente in memoria")
+                return
             logger.info("Uso categorie di default")
-            self.categories = self.DEFAULT_CATEGORIES.copy()
-            for category in self.categories.values():
-                category._calculate_price_with_markup(self.global_markup_percent)
+            self.categories = self._build_defaults(self.global_markup_percent)
+        
+        self._invalidate_cache()
     
-    def save_categories(self):
-        """Salva le categorie nel file di configurazione"""
+    def _config_mtime(self) -> Optional[int]:
+        """mtime (ns) del file categorie, None se non accessibile"""
         try:
-            if self.config_file.exists():
+            return self.config_file.stat().st_mtime_ns
+        except OSError:
+            return None
+    
+    def reload_if_changed(self) -> bool:
+        """Ricarica le categorie se il file è stato modificato da un altro processo (es. altro worker WSGI)"""
+        now = time.monotonic()
+        if now - self._file_checked_at < CONFIG_RELOAD_CHECK_SECONDS:
+            return False
+        self._file_checked_at = now
+        
+        mtime = self._config_mtime()
+        if mtime is None or mtime == self._file_mtime:
+            return False
+        
+        logger.info(f"File categorie modificato esternamente, ricarico {self.config_file}")
+        self.load_categories(fallback_to_defaults=False)
+        return True
+    
+    @property
+    def version(self) -> int:
+        """Versione corrente delle categorie (cambia ad ogni modifica)"""
+        return self._version
+    
+    @property
+    def etag(self) -> str:
+        """ETag (debole) dello stato corrente delle categorie"""
+        return f"cats-{self._etag_prefix}-{self._version}"
+    
+    def _invalidate_cache(self):
+        """Invalida le proiezioni in cache dopo una modifica delle categorie"""
+        self._version += 1
+        self._projection_cache.clear()
+    
+    def cached_projection(self, key: Any, builder) -> Any:
+        """
+        Restituisce il valore in cache per la versione corrente, costruendolo se necessario
+        
+        Il valore è condiviso tra tutti i chiamanti: i metodi pubblici ne restituiscono copie
+        o viste in sola lettura, i builder esterni (es. risposte serializzate) valori immutabili.
+        """
+        version = self._version
+        cached = self._projection_cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        
+        value = builder()
+        self._projection_cache[key] = (version, value)
+        return value
+    
+    def save_categories(self, backup: bool = False):
+        """
+        Salva le categorie nel file di configurazione
+        
+        Args:
+            backup: Se True copia prima il file esistente in un backup con timestamp
+                    (usato dalle operazioni distruttive: import, eliminazione, reset)
+        """
+        self._invalidate_cache()
+        try:
+            payload = fast_dumps(self._category_dicts(), indent=True).encode('utf-8')
+            
+            # Contenuto identico a quello su disco: niente scrittura né backup
+            try:
+                if self.config_file.read_bytes() == payload:
+                    logger.debug(f"Categorie invariate, nessuna scrittura su {self.config_file}")
+                    return True
+                file_exists = True
+            except FileNotFoundError:
+                file_exists = False
+            
+            if backup and file_exists:
                 backup_file = Path(str(self.config_file) + f'.backup.{datetime.now().strftime("%Y%m%d_%H%M%S")}')
-                import shutil
-                shutil.copy2(self.config_file, backup_file)
+                # Il file viene sempre sostituito con os.replace (nuovo inode): un hardlink
+                # conserva il contenuto precedente senza copiarlo
+                try:
+                    os.link(self.config_file, backup_file)
+                except OSError:
+                    shutil.copyfile(self.config_file, backup_file)
                 logger.info(f"Backup categorie creato: {backup_file}")
+                self._prune_backups()
             
-            data = {}
-            for cat_name, category in self.categories.items():
-                data[cat_name] = asdict(category)
-            
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            # Scrittura su file temporaneo e rename atomico: il file non resta mai scritto a metà
+            tmp_file = Path(str(self.config_file) + '.tmp')
+            tmp_file.write_bytes(payload)
+            os.replace(tmp_file, self.config_file)
+            self._file_mtime = self._config_mtime()
             
             logger.info(f"Categorie salvate in {self.config_file}")
             return True
@@ -245,45 +420,26 @@ class CDRCategoriesManager:
             logger.error(f"Errore salvataggio categorie: {e}")
             return False
 
+    def _prune_backups(self):
+        """Elimina i backup del file categorie più vecchi, conservando gli ultimi CATEGORIES_BACKUP_KEEP"""
+        # Il timestamp nel nome (AAAAMMGG_HHMMSS) ordina i backup cronologicamente
+        backups = sorted(self.config_file.parent.glob(self.config_file.name + '.backup.*'))
+        for old_backup in backups[:-CATEGORIES_BACKUP_KEEP]:
+            try:
+                old_backup.unlink()
+                logger.debug("Backup categorie eliminato: %s", old_backup)
+            except OSError as e:
+                logger.warning(f"Impossibile eliminare il backup {old_backup}: {e}")
+
     # [INCLUDI TUTTI GLI ALTRI METODI DEL CDRCategoriesManager...]
     def add_category(self, name: str, display_name: str, price_per_minute: float, 
                     patterns: List[str], currency: str = 'EUR', description: str = '',
-                    custom_markup_percent: Optional[float] = None) -> bool:
-        """Aggiunge una nuova categoria"""
+                    custom_markup_percent: Optional[float] = None, is_active: bool = True) -> bool:
+        """Aggiunge una nuova categoria (anche già disattivata, con un solo salvataggio)"""
         try:
-            if not name or not name.strip():
-                raise ValueError("Nome categoria obbligatorio")
-            
-            name = name.upper().strip()
-            
-            if name in self.categories:
-                raise ValueError(f"Categoria {name} già esistente")
-            
-            if price_per_minute < 0:
-                raise ValueError("Prezzo deve essere positivo")
-            
-            if not patterns or not any(p.strip() for p in patterns):
-                raise ValueError("Almeno un pattern è obbligatorio")
-            
-            if custom_markup_percent is not None:
-                if custom_markup_percent < -100:
-                    raise ValueError("Markup non può essere inferiore a -100%")
-                if custom_markup_percent > 1000:
-                    raise ValueError("Markup troppo alto (massimo 1000%)")
-            
-            clean_patterns = [p.strip() for p in patterns if p.strip()]
-            
-            category = CDRCategory(
-                name=name,
-                display_name=display_name.strip(),
-                price_per_minute=float(price_per_minute),
-                currency=currency,
-                patterns=clean_patterns,
-                description=description.strip(),
-                custom_markup_percent=custom_markup_percent
-            )
-            
-            category._calculate_price_with_markup(self.global_markup_percent)
+            category = self._build_category(name, display_name, price_per_minute, patterns,
+                                            currency, description, custom_markup_percent, is_active)
+            name = category.name
             
             self.categories[name] = category
             
@@ -292,66 +448,58 @@ class CDRCategoriesManager:
                 return True
             else:
                 del self.categories[name]
+                self._invalidate_cache()
                 return False
                 
         except Exception as e:
             logger.error(f"Errore aggiunta categoria {name}: {e}")
             return False
     
+    def _build_category(self, name: str, display_name: str, price_per_minute: float,
+                        patterns: List[str], currency: str = 'EUR', description: str = '',
+                        custom_markup_percent: Optional[float] = None, is_active: bool = True) -> CDRCategory:
+        """Valida i dati e crea una nuova categoria (senza aggiungerla né salvare)"""
+        if not name or not name.strip():
+            raise ValueError("Nome categoria obbligatorio")
+        
+        name = name.upper().strip()
+        
+        if name in self.categories:
+            raise ValueError(f"Categoria {name} già esistente")
+        
+        if price_per_minute < 0:
+            raise ValueError("Prezzo deve essere positivo")
+        
+        if not patterns or not any(p.strip() for p in patterns):
+            raise ValueError("Almeno un pattern è obbligatorio")
+        
+        if custom_markup_percent is not None:
+            if custom_markup_percent < -100:
+                raise ValueError("Markup non può essere inferiore a -100%")
+            if custom_markup_percent > 1000:
+                raise ValueError("Markup troppo alto (massimo 1000%)")
+        
+        clean_patterns = [p.strip() for p in patterns if p.strip()]
+        
+        category = CDRCategory(
+            name=name,
+            display_name=display_name.strip(),
+            price_per_minute=float(price_per_minute),
+            currency=currency,
+            patterns=clean_patterns,
+            description=description.strip(),
+            is_active=bool(is_active),
+            custom_markup_percent=custom_markup_percent
+        )
+        
+        category._calculate_price_with_markup(self.global_markup_percent)
+        
+        return category
+    
     def update_category(self, name: str, **kwargs) -> bool:
         """Aggiorna una categoria esistente"""
         try:
-            name = name.upper().strip()
-            
-            if name not in self.categories:
-                raise ValueError(f"Categoria {name} non trovata")
-            
-            category = self.categories[name]
-            price_changed = False
-            markup_changed = False
-            
-            if 'display_name' in kwargs:
-                category.display_name = kwargs['display_name'].strip()
-            
-            if 'price_per_minute' in kwargs:
-                price = float(kwargs['price_per_minute'])
-                if price < 0:
-                    raise ValueError("Prezzo deve essere positivo")
-                category.price_per_minute = price
-                price_changed = True
-            
-            if 'patterns' in kwargs:
-                patterns = kwargs['patterns']
-                if not patterns or not any(p.strip() for p in patterns):
-                    raise ValueError("Almeno un pattern è obbligatorio")
-                category.patterns = [p.strip() for p in patterns if p.strip()]
-            
-            if 'currency' in kwargs:
-                category.currency = kwargs['currency']
-            
-            if 'description' in kwargs:
-                category.description = kwargs['description'].strip()
-            
-            if 'is_active' in kwargs:
-                category.is_active = bool(kwargs['is_active'])
-            
-            if 'custom_markup_percent' in kwargs:
-                new_markup = kwargs['custom_markup_percent']
-                if new_markup is not None:
-                    new_markup = float(new_markup)
-                    if new_markup < -100:
-                        raise ValueError("Markup non può essere inferiore a -100%")
-                    if new_markup > 1000:
-                        raise ValueError("Markup troppo alto (massimo 1000%)")
-                
-                if category.custom_markup_percent != new_markup:
-                    category.custom_markup_percent = new_markup
-                    markup_changed = True
-            
-            if price_changed or markup_changed:
-                category._calculate_price_with_markup(self.global_markup_percent)
-            
-            category.updated_at = datetime.now().isoformat()
+            name = self._apply_category_update(name, **kwargs)
             
             if self.save_categories():
                 logger.info(f"Categoria {name} aggiornata con successo")
@@ -360,8 +508,194 @@ class CDRCategoriesManager:
                 return False
                 
         except Exception as e:
+            # La categoria può essere stata modificata parzialmente
+            self._invalidate_cache()
             logger.error(f"Errore aggiornamento categoria {name}: {e}")
             return False
+    
+    def update_categories_bulk(self, updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Aggiorna più categorie applicando le modifiche in memoria e salvando una sola volta
+        
+        Args:
+            updates: Lista di {'category_name': str, 'updates': dict}
+        
+        Returns:
+            Lista di {'category_name', 'success', 'message'} nello stesso ordine di updates
+        """
+        results = []
+        
+        try:
+            with self.transaction():
+                for item in updates:
+                    name = item.get('category_name')
+                    try:
+                        self._apply_category_update(name, **item.get('updates', {}))
+                        results.append({'category_name': name, 'success': True})
+                    except Exception as e:
+                        self._invalidate_cache()
+                        logger.error(f"Errore aggiornamento categoria {name}: {e}")
+                        results.append({'category_name': name, 'success': False, 'message': str(e)})
+                
+                if any(result['success'] for result in results):
+                    if not self.save_categories():
+                        raise IOError("Errore salvataggio categorie")
+                    logger.info(f"Aggiornamento massivo: {sum(1 for r in results if r['success'])} categorie salvate")
+        except IOError as e:
+            for result in results:
+                if result['success']:
+                    result['success'] = False
+                    result['message'] = str(e)
+        
+        return results
+    
+    def bulk_upsert(self, rows: List[Dict[str, Any]], merge: bool = True) -> List[Dict[str, Any]]:
+        """
+        Crea o aggiorna più categorie in memoria e salva una sola volta
+        
+        Args:
+            rows: Lista di dizionari con 'name' e i campi della categoria
+            merge: Se False rimuove le categorie esistenti non presenti in rows
+        
+        Returns:
+            Lista di {'category_name', 'success', 'created', 'message'} nello stesso ordine di rows
+        """
+        results = []
+        
+        try:
+            with self.transaction():
+                for row in rows:
+                    fields = dict(row)
+                    name = str(fields.pop('name', '') or '').upper().strip()
+                    # Copia della categoria come savepoint: una riga non valida non lascia modifiche parziali
+                    previous = self.categories.get(name)
+                    if previous is not None:
+                        self.categories[name] = self._copy_category(previous)
+                    try:
+                        if previous is not None:
+                            self._apply_category_update(name, **fields)
+                            created = False
+                        else:
+                            category = self._build_category(name, **fields)
+                            self.categories[category.name] = category
+                            created = True
+                        results.append({'category_name': name, 'success': True, 'created': created})
+                    except Exception as e:
+                        if previous is not None:
+                            self.categories[name] = previous
+                        logger.error(f"Errore import categoria {name}: {e}")
+                        results.append({'category_name': name, 'success': False, 'created': False, 'message': str(e)})
+                
+                imported_names = {result['category_name'] for result in results if result['success']}
+                if imported_names:
+                    if not merge:
+                        for name in [n for n in self.categories if n not in imported_names]:
+                            del self.categories[name]
+                    
+                    if not self.save_categories(backup=True):
+                        raise IOError("Errore salvataggio categorie")
+                    logger.info(f"Import massivo: {len(imported_names)} categorie salvate")
+        except IOError as e:
+            for result in results:
+                if result['success']:
+                    result['success'] = False
+                    result['message'] = str(e)
+        
+        return results
+    
+    @contextmanager
+    def transaction(self):
+        """Raggruppa più modifiche in memoria: in caso di eccezione ripristina le categorie precedenti"""
+        snapshot = {name: self._copy_category(category) for name, category in self.categories.items()}
+        try:
+            yield self
+        except Exception:
+            self.categories = snapshot
+            self._invalidate_cache()
+            raise
+    
+    @staticmethod
+    def _copy_category(category: CDRCategory) -> CDRCategory:
+        """Copia indipendente di una categoria (senza ricalcolare timestamp e prezzi)"""
+        category_copy = copy.copy(category)
+        category_copy.patterns = list(category.patterns)
+        return category_copy
+    
+    def _apply_category_update(self, name: str, **kwargs) -> str:
+        """Applica in memoria gli aggiornamenti a una categoria (senza salvare), restituisce il nome normalizzato"""
+        name = name.upper().strip()
+        
+        if name not in self.categories:
+            raise ValueError(f"Categoria {name} non trovata")
+        
+        category = self.categories[name]
+        price_changed = False
+        markup_changed = False
+        # Campi diversi da prezzo e markup effettivamente modificati
+        other_changed = False
+        
+        if 'display_name' in kwargs:
+            display_name = kwargs['display_name'].strip()
+            if category.display_name != display_name:
+                category.display_name = display_name
+                other_changed = True
+        
+        if 'price_per_minute' in kwargs:
+            price = float(kwargs['price_per_minute'])
+            if price < 0:
+                raise ValueError("Prezzo deve essere positivo")
+            if category.price_per_minute != price:
+                category.price_per_minute = price
+                price_changed = True
+        
+        if 'patterns' in kwargs:
+            patterns = kwargs['patterns']
+            if not patterns or not any(p.strip() for p in patterns):
+                raise ValueError("Almeno un pattern è obbligatorio")
+            clean_patterns = [p.strip() for p in patterns if p.strip()]
+            if category.patterns != clean_patterns:
+                category.patterns = clean_patterns
+                category._refresh_patterns_upper()
+                other_changed = True
+        
+        if 'currency' in kwargs:
+            if category.currency != kwargs['currency']:
+                category.currency = kwargs['currency']
+                other_changed = True
+        
+        if 'description' in kwargs:
+            description = kwargs['description'].strip()
+            if category.description != description:
+                category.description = description
+                other_changed = True
+        
+        if 'is_active' in kwargs:
+            is_active = bool(kwargs['is_active'])
+            if category.is_active != is_active:
+                category.is_active = is_active
+                other_changed = True
+        
+        if 'custom_markup_percent' in kwargs:
+            new_markup = kwargs['custom_markup_percent']
+            if new_markup is not None:
+                new_markup = float(new_markup)
+                if new_markup < -100:
+                    raise ValueError("Markup non può essere inferiore a -100%")
+                if new_markup > 1000:
+                    raise ValueError("Markup troppo alto (massimo 1000%)")
+            
+            if category.custom_markup_percent != new_markup:
+                category.custom_markup_percent = new_markup
+                markup_changed = True
+        
+        if price_changed or markup_changed:
+            category._calculate_price_with_markup(self.global_markup_percent)
+        
+        # Il timestamp cambia solo se la categoria è stata davvero modificata
+        if price_changed or markup_changed or other_changed:
+            category.updated_at = datetime.now().isoformat()
+        
+        return name
 
     def get_category(self, name: str) -> Optional[CDRCategory]:
         """Ottiene una categoria per nome"""
@@ -376,25 +710,107 @@ class CDRCategoriesManager:
         return {name: cat for name, cat in self.categories.items() if cat.is_active}
     
     def get_all_categories_with_pricing(self) -> Dict[str, Dict[str, Any]]:
-        """Ottiene tutte le categorie con informazioni pricing complete"""
+        """Ottiene tutte le categorie con informazioni pricing complete (in cache fino alla prossima modifica)"""
+        return copy.deepcopy(self.cached_projection('categories_with_pricing', self._build_categories_with_pricing))
+    
+    def _build_categories_with_pricing(self) -> Dict[str, Dict[str, Any]]:
         result = {}
+        category_dicts = self._category_dicts()
         for name, category in self.categories.items():
-            category_data = asdict(category)
+            category_data = dict(category_dicts[name])
             category_data['pricing_info'] = category.get_pricing_info(self.global_markup_percent)
             result[name] = category_data
         
         return result
     
+    def _category_dicts(self) -> Dict[str, Dict[str, Any]]:
+        """asdict() di ogni categoria, calcolato una volta per versione (in sola lettura: copiare prima di modificare)"""
+        return self.cached_projection('category_dicts', lambda: {
+            name: asdict(category) for name, category in self.categories.items()
+        })
+    
+    def get_active_pattern_index(self) -> tuple:
+        """Indice (pattern maiuscolo, nome categoria) delle categorie attive (in cache fino alla prossima modifica)"""
+        return self.cached_projection('active_pattern_index', lambda: tuple(
+            (pattern, name)
+            for name, category in self.categories.items() if category.is_active
+            for pattern in category._patterns_upper
+        ))
+    
+    def _build_matcher(self) -> tuple:
+        """
+        Matcher delle categorie attive: (categorie in ordine di priorità, automa Aho-Corasick o regex, memo dei tipi già classificati)
+        
+        L'automa, se pyahocorasick è installato, associa ogni pattern alla posizione della prima categoria che lo usa.
+        Altrimenti si usa un'unica regex con un gruppo per categoria, nello stesso ordine di priorità.
+        """
+        categories = [
+            category for category in self.categories.values()
+            if category.is_active and category.patterns
+        ]
+        
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            # Un pattern vuoto corrisponde a qualsiasi tipo chiamata (come l'operatore in)
+            empty_rank = None
+            for rank, category in enumerate(categories):
+                for pattern in category._patterns_upper:
+                    if not pattern:
+                        if empty_rank is None:
+                            empty_rank = rank
+                    elif pattern not in automaton:
+                        automaton.add_word(pattern, rank)
+            if len(automaton):
+                automaton.make_automaton()
+            else:
+                # Nessun pattern non vuoto (es. tutte le categorie disattivate): un trie vuoto non diventa un automa
+                automaton = None
+            return categories, (automaton, empty_rank), {}
+        
+        # Lookahead su ogni posizione: in ciascun punto l'alternanza trova il gruppo (categoria) di priorità più alta
+        # che inizia lì, quindi il minimo sulle posizioni è la prima categoria con un pattern contenuto nel tipo chiamata
+        alternatives = '|'.join(
+            '({})'.format('|'.join(map(re.escape, category._patterns_upper)))
+            for category in categories
+        )
+        pattern_regex = re.compile(f'(?=(?:{alternatives}))') if categories else None
+        return categories, pattern_regex, {}
+    
     def classify_call_type(self, call_type: str) -> Optional[CDRCategory]:
         """Classifica un tipo di chiamata e restituisce la categoria corrispondente"""
         if not call_type:
             return None
         
-        for category in self.categories.values():
-            if category.is_active and category.matches_pattern(call_type):
-                return category
+        # Matcher ricostruito solo dopo una modifica: i tipi chiamata ripetuti sono un lookup nel memo
+        categories, matcher, memo = self.cached_projection('matcher', self._build_matcher)
+        call_type_upper = call_type.upper().strip()
+        cached = memo.get(call_type_upper, _NOT_CLASSIFIED)
+        if cached is not _NOT_CLASSIFIED:
+            return cached
+        
+        # Una sola scansione del tipo chiamata: vince la categoria con priorità più alta tra i pattern trovati
+        best_rank = None
+        if isinstance(matcher, tuple):
+            automaton, best_rank = matcher
+            if automaton is not None:
+                for _, rank in automaton.iter(call_type_upper):
+                    if best_rank is None or rank < best_rank:
+                        best_rank = rank
+                        if rank == 0:
+                            break
+        elif matcher is not None:
+            for match in matcher.finditer(call_type_upper):
+                rank = match.lastindex - 1
+                if best_rank is None or rank < best_rank:
+                    best_rank = rank
+                    if rank == 0:
+                        break
+        matched = categories[best_rank] if best_rank is not None else None
         
-        return None
+        if len(memo) >= MATCHER_MEMO_MAX_SIZE:
+            memo.clear()
+        memo[call_type_upper] = matched
+        return matched
     
     def calculate_call_cost(self, call_type: str, duration_seconds: int, unit: str = 'per_minute') -> Dict[str, Any]:
         """Calcola il costo di una chiamata basato sulla categoria"""
@@ -423,65 +839,191 @@ class CDRCategoriesManager:
         
         return result
     
+    def get_price_table(self) -> tuple:
+        """
+        Tabella prezzi allineata al matcher (in cache fino alla prossima modifica):
+        (categorie, prezzi base, prezzi con markup, prezzi con markup in decimillesimi interi o None)
+        
+        La posizione di ogni categoria è la sua priorità nel matcher, la stessa restituita da classify_batch.
+        Gli array prezzi hanno uno 0 in coda: l'indice -1 (tipo non riconosciuto) punta proprio lì.
+        I prezzi interi sono None se almeno una categoria ha un prezzo con più di 4 decimali.
+        """
+        return self.cached_projection('price_table', self._build_price_table)
+    
+    def _build_price_table(self) -> tuple:
+        categories = self.cached_projection('matcher', self._build_matcher)[0]
+        prices_base = np.array([cat.price_per_minute for cat in categories] + [0.0], dtype=np.float64)
+        # Stessa regola di CDRCategory.calculate_cost: senza prezzo con markup si usa il prezzo base
+        prices_markup = np.array([cat.price_with_markup or cat.price_per_minute for cat in categories] + [0.0], dtype=np.float64)
+        price_units = None
+        if all(cat._price_units is not None for cat in categories):
+            price_units = np.array([cat._price_units for cat in categories] + [0], dtype=np.int64)
+        # Tabella condivisa tra i chiamanti: array in sola lettura
+        for prices in (prices_base, prices_markup, price_units):
+            if prices is not None:
+                prices.flags.writeable = False
+        return tuple(categories), prices_base, prices_markup, price_units
+    
+    def classify_batch(self, call_types: Sequence[str]) -> np.ndarray:
+        """Classifica un lotto di tipi chiamata: posizione della categoria nella tabella prezzi per ogni riga, -1 se non riconosciuto"""
+        categories = self.get_price_table()[0]
+        rank_by_name = {category.name: rank for rank, category in enumerate(categories)}
+        # In un CDR i tipi chiamata distinti sono pochi: ognuno viene classificato una sola volta per lotto
+        rank_by_type = {}
+        
+        def lookup(call_type):
+            rank = rank_by_type.get(call_type)
+            if rank is None:
+                category = self.classify_call_type(call_type)
+                rank = rank_by_name[category.name] if category is not None else -1
+                rank_by_type[call_type] = rank
+            return rank
+        
+        return np.fromiter(map(lookup, call_types), dtype=np.int32, count=len(call_types))
+    
+    def calculate_call_cost_batch(self, call_types: Sequence[str], durations_seconds: Sequence[int],
+                                  use_markup: bool = True) -> tuple:
+        """
+        Calcola il costo di un intero lotto di chiamate con un'unica operazione vettoriale
+        
+        Equivale a calculate_call_cost riga per riga (il costo è sempre prezzo al minuto * minuti).
+        
+        Returns:
+            (array costi arrotondati a 4 decimali, array indici categoria come da classify_batch)
+        """
+        category_index = self.classify_batch(call_types)
+        _, prices_base, prices_markup, price_units = self.get_price_table()
+        durations = np.asarray(durations_seconds)
+        
+        if use_markup and price_units is not None and durations.dtype.kind in 'iu':
+            # Come calculate_cost: costo intero esatto in decimillesimi, una sola operazione sul lotto
+            return units_cost(price_units[category_index], durations.astype(np.int64)) / PRICE_SCALE, category_index
+        
+        prices = prices_markup if use_markup else prices_base
+        costs = prices[category_index] * (durations.astype(np.float64) / 60.0)
+        # Arrotondamento di round() (non np.round, che sui valori a metà può differire di 0.0001)
+        costs = np.fromiter((round(cost, 4) for cost in costs.tolist()), dtype=np.float64, count=len(costs))
+        return costs, category_index
+    
     def get_statistics(self) -> Dict[str, Any]:
-        """Ottiene statistiche sulle categorie"""
-        active_count = sum(1 for cat in self.categories.values() if cat.is_active)
-        total_patterns = sum(len(cat.patterns) for cat in self.categories.values())
+        """Ottiene statistiche sulle categorie (in cache fino alla prossima modifica)"""
+        return copy.deepcopy(self.cached_projection('statistics', self._build_statistics))
+    
+    def _build_statistics(self) -> Dict[str, Any]:
+        # Tutti i contatori in un'unica passata sulle categorie
+        total = len(self.categories)
+        active_count = 0
+        total_patterns = 0
+        custom_markup_count = 0
+        min_base = max_base = min_markup = max_markup = None
+        sum_base = sum_markup = 0
+        custom_min = custom_max = None
+        currencies = set()
+        last_modified = None
         
-        custom_markup_count = sum(1 for cat in self.categories.values() if cat.custom_markup_percent is not None)
-        global_markup_count = sum(1 for cat in self.categories.values() if cat.custom_markup_percent is None)
+        for cat in self.categories.values():
+            if cat.is_active:
+                active_count += 1
+            total_patterns += len(cat.patterns)
+            
+            base = cat.price_per_minute
+            if min_base is None:
+                min_base = max_base = base
+            elif base < min_base:
+                min_base = base
+            elif base > max_base:
+                max_base = base
+            sum_base += base
+            
+            with_markup = cat.price_with_markup
+            if min_markup is None:
+                min_markup = max_markup = with_markup
+            elif with_markup < min_markup:
+                min_markup = with_markup
+            elif with_markup > max_markup:
+                max_markup = with_markup
+            sum_markup += with_markup
+            
+            custom = cat.custom_markup_percent
+            if custom is not None:
+                custom_markup_count += 1
+                if custom_min is None:
+                    custom_min = custom_max = custom
+                elif custom < custom_min:
+                    custom_min = custom
+                elif custom > custom_max:
+                    custom_max = custom
+            
+            currencies.add(cat.currency)
+            if last_modified is None or cat.updated_at > last_modified:
+                last_modified = cat.updated_at
         
+        avg_base = sum_base / total if total else 0
+        avg_markup = sum_markup / total if total else 0
         price_range = {
-            'min': min((cat.price_per_minute for cat in self.categories.values()), default=0),
-            'max': max((cat.price_per_minute for cat in self.categories.values()), default=0),
-            'avg': sum(cat.price_per_minute for cat in self.categories.values()) / len(self.categories) if self.categories else 0,
-            'min_base': min((cat.price_per_minute for cat in self.categories.values()), default=0),
-            'max_base': max((cat.price_per_minute for cat in self.categories.values()), default=0),
-            'min_with_markup': min((cat.price_with_markup for cat in self.categories.values()), default=0),
-            'max_with_markup': max((cat.price_with_markup for cat in self.categories.values()), default=0),
-            'avg_base': sum(cat.price_per_minute for cat in self.categories.values()) / len(self.categories) if self.categories else 0,
-            'avg_with_markup': sum(cat.price_with_markup for cat in self.categories.values()) / len(self.categories) if self.categories else 0
+            'min': min_base if total else 0,
+            'max': max_base if total else 0,
+            'avg': avg_base,
+            'min_base': min_base if total else 0,
+            'max_base': max_base if total else 0,
+            'min_with_markup': min_markup if total else 0,
+            'max_with_markup': max_markup if total else 0,
+            'avg_base': avg_base,
+            'avg_with_markup': avg_markup
         }
         
         return {
-            'total_categories': len(self.categories),
+            'total_categories': total,
             'active_categories': active_count,
-            'inactive_categories': len(self.categories) - active_count,
+            'inactive_categories': total - active_count,
             'total_patterns': total_patterns,
             'price_range': price_range,
-            'currencies': list(set(cat.currency for cat in self.categories.values())),
-            'last_modified': max((cat.updated_at for cat in self.categories.values()), default=None),
+            'currencies': list(currencies),
+            'last_modified': last_modified,
             'markup_statistics': {
                 'global_markup_percent': self.global_markup_percent,
-                'categories_using_global_markup': global_markup_count,
+                'categories_using_global_markup': total - custom_markup_count,
                 'categories_using_custom_markup': custom_markup_count,
                 'custom_markup_range': {
-                    'min': min((cat.custom_markup_percent for cat in self.categories.values() if cat.custom_markup_percent is not None), default=None),
-                    'max': max((cat.custom_markup_percent for cat in self.categories.values() if cat.custom_markup_percent is not None), default=None),
+                    'min': custom_min,
+                    'max': custom_max,
                 }
             }
         }
     
     def validate_patterns_conflicts(self) -> List[Dict[str, Any]]:
-        """Verifica conflitti tra pattern delle categorie"""
-        conflicts = []
+        """Verifica conflitti tra pattern delle categorie (in cache fino alla prossima modifica)"""
+        return copy.deepcopy(self.cached_projection('patterns_conflicts', self._build_patterns_conflicts))
+    
+    def _build_patterns_conflicts(self) -> List[Dict[str, Any]]:
+        # Indice inverso pattern -> categorie attive che lo usano, in un solo passaggio (nell'ordine delle categorie)
+        pattern_index: Dict[str, List[str]] = {}
+        for category in self.categories.values():
+            if not category.is_active:
+                continue
+            for pattern in category._patterns_upper:
+                names = pattern_index.setdefault(pattern, [])
+                if not names or names[-1] != category.name:
+                    names.append(category.name)
         
-        categories_list = list(self.categories.values())
+        # Pattern in comune raggruppati per coppia di categorie
+        pair_patterns: Dict[tuple, List[str]] = {}
+        for pattern, names in pattern_index.items():
+            for i in range(len(names) - 1):
+                for j in range(i + 1, len(names)):
+                    pair_patterns.setdefault((names[i], names[j]), []).append(pattern)
         
-        for i, cat1 in enumerate(categories_list):
-            for j, cat2 in enumerate(categories_list[i+1:], i+1):
-                if not cat1.is_active or not cat2.is_active:
-                    continue
-                
-                common_patterns = set(p.upper() for p in cat1.patterns) & set(p.upper() for p in cat2.patterns)
-                
-                if common_patterns:
-                    conflicts.append({
-                        'category1': cat1.name,
-                        'category2': cat2.name,
-                        'common_patterns': list(common_patterns),
-                        'severity': 'high' if len(common_patterns) > 1 else 'medium'
-                    })
+        # Stesso ordine della scansione per coppie: prima categoria, poi seconda
+        position = {name: i for i, name in enumerate(self.categories)}
+        conflicts = []
+        for (name1, name2), common_patterns in sorted(pair_patterns.items(),
+                                                      key=lambda item: (position[item[0][0]], position[item[0][1]])):
+            conflicts.append({
+                'category1': name1,
+                'category2': name2,
+                'common_patterns': common_patterns,
+                'severity': 'high' if len(common_patterns) > 1 else 'medium'
+            })
         
         return conflicts
     
@@ -493,11 +1035,13 @@ class CDRCategoriesManager:
             
             # Ricalcola prezzi per tutte le categorie che usano markup globale
             categories_updated = 0
+            now_iso = datetime.now().isoformat()
             for category in self.categories.values():
                 if category.custom_markup_percent is None:  # Usa markup globale
                     old_price = category.price_with_markup
                     category._calculate_price_with_markup(self.global_markup_percent)
                     if old_price != category.price_with_markup:
+                        category.updated_at = now_iso
                         categories_updated += 1
             
             if self.save_categories():
@@ -507,6 +1051,7 @@ class CDRCategoriesManager:
             else:
                 # Rollback
                 self.global_markup_percent = old_markup
+                self._invalidate_cache()
                 return False
                 
         except Exception as e:
@@ -515,13 +1060,12 @@ class CDRCategoriesManager:
 
     def get_category_with_pricing(self, name: str) -> Optional[Dict[str, Any]]:
         """Ottiene una categoria con informazioni complete sui prezzi"""
-        category = self.get_category(name)
-        if not category:
+        name = name.upper().strip()
+        if name not in self.categories:
             return None
         
-        # Restituisce tutte le info pricing
-        category_data = asdict(category)
-        category_data['pricing_info'] = category.get_pricing_info(self.global_markup_percent)
+        # Restituisce tutte le info pricing (copia della proiezione in cache)
+        category_data = copy.deepcopy(self.cached_projection('categories_with_pricing', self._build_categories_with_pricing)[name])
         category_data['global_markup_percent'] = self.global_markup_percent
         
         return category_data
@@ -541,7 +1085,7 @@ class CDRCategoriesManager:
             
             del self.categories[name]
             
-            if self.save_categories():
+            if self.save_categories(backup=True):
                 logger.info(f"Categoria {name} eliminata con successo")
                 return True
             else:
@@ -551,48 +1095,63 @@ class CDRCategoriesManager:
             logger.error(f"Errore eliminazione categoria {name}: {e}")
             return False
 
+    def export_categories_obj(self) -> Dict[str, Dict[str, Any]]:
+        """Esporta le categorie come dizionario nativo (senza passare da una stringa JSON)"""
+        return copy.deepcopy(self._category_dicts())
+    
     def export_categories(self, format: str = 'json') -> str:
         """Esporta le categorie in vari formati"""
-        data = {name: asdict(cat) for name, cat in self.categories.items()}
-        
         if format.lower() == 'json':
-            return json.dumps(data, indent=2, ensure_ascii=False)
+            return fast_dumps(self.export_categories_obj(), indent=True)
         elif format.lower() == 'csv':
-            import csv
-            import io
-            
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # Header
-            writer.writerow(['Name', 'Display Name', 'Price per Minute', 'Custom Markup %', 'Price With Markup', 'Currency', 
-                        'Patterns', 'Description', 'Active', 'Created', 'Updated'])
-            
-            # Data
-            for category in self.categories.values():
-                writer.writerow([
-                    category.name,
-                    category.display_name,
-                    category.price_per_minute,
-                    category.custom_markup_percent if category.custom_markup_percent is not None else 'Global',
-                    category.price_with_markup,
-                    category.currency,
-                    '; '.join(category.patterns),
-                    category.description,
-                    category.is_active,
-                    category.created_at,
-                    category.updated_at
-                ])
-            
-            return output.getvalue()
+            return self.cached_projection('export_csv', self._build_export_csv)
         else:
             raise ValueError(f"Formato {format} non supportato")
 
-    def import_categories(self, data: str, format: str = 'json', merge: bool = True) -> bool:
-        """Importa categorie da dati esterni"""
+    def _build_export_csv(self) -> str:
+        import csv
+        import io
+        
+        output = io.StringIO()
+        writer = csv.writer(output)
+        
+        # Header
+        writer.writerow(['Name', 'Display Name', 'Price per Minute', 'Custom Markup %', 'Price With Markup', 'Currency', 
+                    'Patterns', 'Description', 'Active', 'Created', 'Updated'])
+        
+        # Data: un'unica writerows su un generatore di righe
+        writer.writerows(
+            [
+                category.name,
+                category.display_name,
+                category.price_per_minute,
+                category.custom_markup_percent if category.custom_markup_percent is not None else 'Global',
+                category.price_with_markup,
+                category.currency,
+                '; '.join(category.patterns),
+                category.description,
+                category.is_active,
+                category.created_at,
+                category.updated_at
+            ]
+            for category in self.categories.values()
+        )
+        
+        return output.getvalue()
+
+    def import_categories(self, data, format: str = 'json', merge: bool = True) -> bool:
+        """
+        Importa categorie da dati esterni
+        
+        Args:
+            data: Stringa JSON (format='json') oppure dizionario già decodificato (format='dict')
+            format: 'json' o 'dict'
+            merge: Se False sostituisce tutte le categorie esistenti
+        """
         try:
-            if format.lower() == 'json':
-                imported_data = json.loads(data)
+            if format.lower() in ('json', 'dict'):
+                # Il dizionario già decodificato (es. dal body della richiesta) evita il round-trip JSON
+                imported_data = data if isinstance(data, dict) else fast_loads(data)
                 
                 if not merge:
                     self.categories.clear()
@@ -610,7 +1169,7 @@ class CDRCategoriesManager:
                         category._calculate_price_with_markup(self.global_markup_percent)
                         self.categories[cat_name.upper()] = category
                 
-                return self.save_categories()
+                return self.save_categories(backup=True)
             else:
                 raise ValueError(f"Formato {format} non supportato per l'import")
                 
@@ -621,11 +1180,8 @@ class CDRCategoriesManager:
     def reset_to_defaults(self) -> bool:
         """Ripristina le categorie di default"""
         try:
-            self.categories = self.DEFAULT_CATEGORIES.copy()
-            # Applica markup globale alle categorie default
-            for category in self.categories.values():
-                category._calculate_price_with_markup(self.global_markup_percent)
-            if self.save_categories():
+            self.categories = self._build_defaults(self.global_markup_percent)
+            if self.save_categories(backup=True):
                 logger.info("Categorie ripristinate ai valori di default")
                 return True
             return False
@@ -672,25 +1228,30 @@ class CDRAnalyticsEnhanced:
             # Raggruppa per codice_contratto
             grouped_data = self._group_by_contract(enhanced_records)
             
-            # Genera report per ogni contratto
+            # Genera report per ogni contratto: istante di generazione e configurazione
+            # categorie sono gli stessi per tutti i report del file e vengono calcolati una volta
             generated_files = []
             total_contracts = len(grouped_data)
+            generated_at = datetime.now()
+            categories_configuration = self._categories_configuration()
             
             for contract_code, contract_records in grouped_data.items():
                 try:
                     report_file = self._generate_contract_report(
                         contract_code, 
                         contract_records, 
-                        metadata
+                        metadata,
+                        generated_at,
+                        categories_configuration
                     )
                     if report_file:
                         generated_files.append(report_file)
-                        logger.info(f"✅ Report generato per contratto {contract_code}: {report_file}")
+                        logger.info("✅ Report generato per contratto %s: %s", contract_code, report_file)
                 except Exception as e:
                     logger.error(f"❌ Errore generazione report contratto {contract_code}: {e}")
             
             # Genera report riassuntivo
-            summary_file = self._generate_summary_report(grouped_data, metadata)
+            summary_file = self._generate_summary_report(grouped_data, metadata, generated_at)
             if summary_file:
                 generated_files.append(summary_file)
             
@@ -721,81 +1282,91 @@ class CDRAnalyticsEnhanced:
             }
     
     def _enhance_records_with_categories(self, records: List[Dict]) -> List[Dict]:
-        """Arricchisce i record CDR con informazioni categorie e costi calcolati"""
-        enhanced_records = []
-        category_usage = defaultdict(lambda: {
-            'count': 0, 
-            'total_cost': 0.0, 
-            'total_duration': 0,
-            'total_duration_seconds': 0
-        })
-        unmatched_types = set()
+        """Arricchisce i record CDR con informazioni categorie e costi calcolati (calcolo vettoriale sull'intero lotto)"""
+        enhanced_records = [None] * len(records)
+        valid_rows = []
+        call_types = []
+        durations = []
+        original_costs = []
         
-        for record in records:
+        for position, record in enumerate(records):
             try:
-                enhanced_record = record.copy()
-                
                 tipo_chiamata = record.get('tipo_chiamata', '')
+                if tipo_chiamata and not isinstance(tipo_chiamata, str):
+                    raise TypeError(f"tipo chiamata non valido: {tipo_chiamata!r}")
                 durata_secondi = int(record.get('durata_secondi', 0))
                 costo_originale = float(record.get('costo_euro', 0.0))
-                
-                # Calcola costo con sistema categorie
-                cost_calculation = self.categories_manager.calculate_call_cost(
-                    tipo_chiamata, 
-                    durata_secondi,
-                    unit='per_minute'
-                )
-                
-                # Arricchisci record con informazioni categoria
-                enhanced_record.update({
-                    'categoria_cliente': cost_calculation['category_name'],
-                    'categoria_display': cost_calculation['category_display_name'],
-                    'prezzo_categoria_per_minuto': cost_calculation['price_per_minute'],
-                    'costo_cliente_euro': round(float(cost_calculation['cost_calculated']),4),
-                    'durata_fatturata_minuti': cost_calculation['duration_billed'],
-                    'categoria_matched': cost_calculation['matched'],
-                    'valuta_categoria': cost_calculation['currency'],
-                    'costo_originale_euro': costo_originale,
-                    'differenza_costo_euro': round(cost_calculation['cost_calculated'] - costo_originale, 4),
-                    'risparmio_percentuale': round(
-                        ((cost_calculation['cost_calculated'] - costo_originale) / costo_originale * 100) 
-                        if costo_originale > 0 else 0, 2
-                    ),
-                    
-                    'tipo_chiamata_originale': tipo_chiamata,
-                    'processed_timestamp': datetime.now().isoformat()
-                })
-                
-                # Statistiche utilizzo categorie
-                cat_name = cost_calculation['category_name']
-                category_usage[cat_name]['count'] += 1
-                category_usage[cat_name]['total_cost'] +=  round(float(cost_calculation['cost_calculated']), 4) #cost_calculation['cost_calculated']
-                category_usage[cat_name]['total_duration'] += durata_secondi
-                category_usage[cat_name]['total_duration_seconds'] += durata_secondi
-                category_usage[cat_name]['display_name'] = cost_calculation['category_display_name']
-                
-                if not cost_calculation['matched']:
-                    unmatched_types.add(tipo_chiamata)
-                
-                enhanced_records.append(enhanced_record)
-                
             except Exception as e:
                 logger.error(f"Errore elaborazione record: {e}")
                 record['categoria_cliente'] = 'ERRORE'
                 record['costo_cliente_euro'] = float(record.get('costo_euro', 0.0))
-                enhanced_records.append(record)
+                enhanced_records[position] = record
+                continue
+            
+            valid_rows.append((position, record))
+            call_types.append(tipo_chiamata)
+            durations.append(durata_secondi)
+            original_costs.append(costo_originale)
+        
+        # Classificazione e costi calcolati in blocco sugli array del lotto
+        costs, category_index = self.categories_manager.calculate_call_cost_batch(call_types, durations)
+        categories = self.categories_manager.get_price_table()[0]
+        
+        durations_array = np.asarray(durations, dtype=np.float64)
+        matched = category_index >= 0
+        
+        # Dati fissi per categoria, indicizzati come la tabella prezzi (ultima voce: non riconosciuto)
+        category_info = [
+            (cat.name, cat.display_name, cat.price_per_minute, cat.currency, True) for cat in categories
+        ] + [('ALTRO', 'Altro/Sconosciuto', 0.0, 'EUR', False)]
+        processed_timestamp = datetime.now().isoformat()
+        
+        for (position, record), tipo_chiamata, durata_secondi, costo_originale, index, cost in zip(
+                valid_rows, call_types, durations, original_costs, category_index.tolist(), costs.tolist()):
+            cat_name, cat_display, cat_price, cat_currency, cat_matched = category_info[index]
+            # Il record caricato dal file non serve altrove: viene arricchito sul posto, senza copia
+            record.update({
+                'categoria_cliente': cat_name,
+                'categoria_display': cat_display,
+                'prezzo_categoria_per_minuto': cat_price,
+                'costo_cliente_euro': cost,
+                'durata_fatturata_minuti': round(durata_secondi / 60.0, 4) if cat_matched else durata_secondi / 60.0,
+                'categoria_matched': cat_matched,
+                'valuta_categoria': cat_currency,
+                'costo_originale_euro': costo_originale,
+                'differenza_costo_euro': round(cost - costo_originale, 4),
+                'risparmio_percentuale': round(
+                    ((cost - costo_originale) / costo_originale * 100)
+                    if costo_originale > 0 else 0, 2
+                ),
+                
+                'tipo_chiamata_originale': tipo_chiamata,
+                'processed_timestamp': processed_timestamp
+            })
+            enhanced_records[position] = record
         
-        # Log statistiche dettagliate
-        logger.info(f"💰 Elaborazione categorie completata:")
-        for cat_name, stats in category_usage.items():
-            avg_cost_per_min = (stats['total_cost'] / (stats['total_duration_seconds'] / 60)) if stats['total_duration_seconds'] > 0 else 0
-            duration_minutes = stats['total_duration_seconds'] / 60
-            logger.info(f"   {stats['display_name']}: {stats['count']} chiamate, "
-                    f"{duration_minutes:.1f} min, €{avg_cost_per_min:.4f}/min medio, totale €{stats['total_cost']:.2f}")
+        # Statistiche utilizzo categorie: conteggi e somme per categoria in un'unica passata vettoriale
+        slots = np.where(matched, category_index, len(categories))
+        counts = np.bincount(slots, minlength=len(category_info))
+        total_costs = np.bincount(slots, weights=costs, minlength=len(category_info))
+        total_seconds = np.bincount(slots, weights=durations_array, minlength=len(category_info))
         
+        # Log statistiche dettagliate (calcoli per categoria solo se il livello INFO è attivo)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("💰 Elaborazione categorie completata:")
+            for slot, count in enumerate(counts.tolist()):
+                if not count:
+                    continue
+                total_cost = float(total_costs[slot])
+                duration_minutes = float(total_seconds[slot]) / 60
+                avg_cost_per_min = (total_cost / duration_minutes) if duration_minutes > 0 else 0
+                logger.info("   %s: %s chiamate, %.1f min, €%.4f/min medio, totale €%.2f",
+                            category_info[slot][1], count, duration_minutes, avg_cost_per_min, total_cost)
+        
+        unmatched_types = {call_types[i] for i in np.flatnonzero(~matched).tolist()}
         if unmatched_types:
             logger.warning(f"⚠️ Tipi chiamata non riconosciuti ({len(unmatched_types)}):")
-            for unmatched in sorted(unmatched_types):
+            for unmatched in sorted(unmatched_types, key=str):
                 logger.warning(f"   - '{unmatched}'")
         
         return enhanced_records
@@ -811,16 +1382,26 @@ class CDRAnalyticsEnhanced:
     
     def _group_by_contract(self, records: List[Dict]) -> Dict[str, List[Dict]]:
         """Raggruppa record per codice contratto"""        
-        grouped = defaultdict(list)
+        # Raggruppamento sul valore letto (intero dal parser CDR, hash immediato):
+        # la chiave stringa si costruisce una volta per contratto invece che per record
+        grouped_raw = defaultdict(list)
         
         for record in records:
             contract_code = record.get('codice_contratto')
             if contract_code is not None:
-                contract_key = str(contract_code)
-                grouped[contract_key].append(record)
+                grouped_raw[contract_code].append(record)
+        
+        grouped = {}
+        for contract_code, contract_records in grouped_raw.items():
+            contract_key = str(contract_code)
+            if contract_key in grouped:
+                # Stesso codice presente sia come numero sia come testo
+                grouped[contract_key].extend(contract_records)
+            else:
+                grouped[contract_key] = contract_records
         
         logger.info(f"📋 Contratti raggruppati: {len(grouped)}")
-        return dict(grouped)
+        return grouped
     
     def _aggregate_contract_data_with_categories(self, records: List[Dict]) -> Dict[str, Any]:
         """Aggrega dati contratto con breakdown per categoria"""
@@ -915,12 +1496,22 @@ class CDRAnalyticsEnhanced:
         }
         return result
     
-    def _generate_contract_report(self, contract_code: str, records: List[Dict], metadata: Dict) -> Optional[str]:
+    def _categories_configuration(self) -> Dict[str, Any]:
+        """Riepilogo della configurazione categorie incluso nei report contratto"""
+        return {
+            'active_categories': len(self.categories_manager.get_active_categories()),
+            'total_categories': len(self.categories_manager.get_all_categories()),
+            'categories_statistics': self.categories_manager.get_statistics()
+        }
+    
+    def _generate_contract_report(self, contract_code: str, records: List[Dict], metadata: Dict,
+                                  generated_at: Optional[datetime] = None,
+                                  categories_configuration: Optional[Dict] = None) -> Optional[str]:
         """Genera report per contratto con categorizzazione completa"""
         try:
             aggregated_data = self._aggregate_contract_data_with_categories(records)
             
-            now = datetime.now()
+            now = generated_at or datetime.now()
             timestamp = now.strftime("%Y%m%d_%H%M%S")
             current_month = now.strftime("%m")
             current_year = now.strftime("%Y")
@@ -959,23 +1550,20 @@ class CDRAnalyticsEnhanced:
                 'raw_records': records
             }
             
-            report['categories_configuration'] = {
-                'active_categories': len(self.categories_manager.get_active_categories()),
-                'total_categories': len(self.categories_manager.get_all_categories()),
-                'categories_statistics': self.categories_manager.get_statistics()
-            }
+            report['categories_configuration'] = categories_configuration or self._categories_configuration()
             
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(report, f, indent=2, ensure_ascii=False)
             
-            logger.info(f"📄 Report contratto con categorie salvato: {filepath}")
+            logger.info("📄 Report contratto con categorie salvato: %s", filepath)
             return str(filepath)
             
         except Exception as e:
             logger.error(f"Errore generazione report contratto {contract_code}: {e}")
             return None
     
-    def _generate_summary_report(self, grouped_data: Dict, metadata: Dict) -> Optional[str]:
+    def _generate_summary_report(self, grouped_data: Dict, metadata: Dict,
+                                 generated_at: Optional[datetime] = None) -> Optional[str]:
         """Genera report riassuntivo globale con breakdown per categoria"""
         try:
             # now = datetime.now()
@@ -984,7 +1572,7 @@ class CDRAnalyticsEnhanced:
             # filename = f"SUMMARY_CATEGORIES_{current_month}.json"
             # filepath = self.analytics_directory / filename
 
-            now = datetime.now()
+            now = generated_at or datetime.now()
             timestamp = now.strftime("%Y%m%d_%H%M%S")
             current_month = now.strftime("%m")
             current_year = now.strftime("%Y")
@@ -1075,7 +1663,7 @@ class CDRAnalyticsEnhanced:
                 data['contracts_count'] = len(data['contracts_using'])
                 data['avg_cost_per_call'] = round(data['cost_client_euro'] / data['calls'], 4) if data['calls'] > 0 else 0
                 data['match_rate'] = round((data['matched_calls'] / data['calls']) * 100, 1) if data['calls'] > 0 else 0
-                data['contracts_using'] = list(data['contracts_using'])
+                data['contracts_using'] = sorted(data['contracts_using'], key=str)
             
             summary_report = {
                 'metadata': {
@@ -1189,7 +1777,7 @@ class CDRAnalyticsEnhanced:
             if not record.get('categoria_matched', True):
                 unmatched.add(record.get('tipo_chiamata_originale', ''))
         
-        return sorted(list(unmatched))
+        return sorted(unmatched, key=str)
     
     def _get_daily_breakdown_with_categories(self, records: List[Dict]) -> Dict[str, Dict]:
         """Genera breakdown giornaliero con categorie"""
@@ -1430,24 +2018,25 @@ def integrate_enhanced_cdr_system(app, processor, secure_config):
                 
                 cdr_results = []
                 
-                for json_file in result['converted_files']:
-                    if self._is_cdr_file(json_file):
-                        logger.info(f"🔍 Analisi CDR con categorie per: {json_file}")
-                        
-                        cdr_result = self.cdr_analytics.process_cdr_file(json_file)
-                        cdr_results.append(cdr_result)
+                # Filtra i file CDR prima del ciclo di analisi
+                cdr_files = [f for f in result['converted_files'] if self._is_cdr_file(f)]
+                for json_file in cdr_files:
+                    logger.info("🔍 Analisi CDR con categorie per: %s", json_file)
+                    
+                    cdr_result = self.cdr_analytics.process_cdr_file(json_file)
+                    cdr_results.append(cdr_result)
+                    
+                    if cdr_result.get('success'):
+                        logger.info("✅ Analisi completata: %s report con categorie", len(cdr_result.get('generated_files', [])))
                         
-                        if cdr_result.get('success'):
-                            logger.info(f"✅ Analisi completata: {len(cdr_result.get('generated_files', []))} report con categorie")
-                            
-                            # Log campo richiesto
-                            stats = cdr_result.get('category_stats', {})
-                            if stats:
-                                logger.info("💰 Breakdown costi per categoria:")
-                                for cat_name, cat_stats in stats.items():
-                                    logger.info(f"   {cat_stats.get('display_name', cat_name)}: €{cat_stats.get('total_cost', 0):.2f}")
-                        else:
-                            logger.warning(f"⚠️ Analisi CDR fallita per {json_file}: {cdr_result.get('message')}")
+                        # Log campo richiesto
+                        stats = cdr_result.get('category_stats', {})
+                        if stats:
+                            logger.info("💰 Breakdown costi per categoria:")
+                            for cat_name, cat_stats in stats.items():
+                                logger.info("   %s: €%.2f", cat_stats.get('display_name', cat_name), cat_stats.get('total_cost', 0))
+                    else:
+                        logger.warning(f"⚠️ Analisi CDR fallita per {json_file}: {cdr_result.get('message')}")
                 
                 # Risultato finale con info categorie
                 if cdr_results:
@@ -1471,10 +2060,8 @@ def integrate_enhanced_cdr_system(app, processor, secure_config):
     def _is_cdr_file_enhanced(self, json_file_path):
         """Determina se un file JSON è un file CDR (versione migliorata)"""
         try:
-            filename = Path(json_file_path).name.upper()
-            
             # Check nome file
-            if any(keyword in filename for keyword in ['CDR', 'RIV', 'CALL', 'DETAIL']):
+            if _CDR_FILENAME_RE.search(Path(json_file_path).name):
                 return True
             
             # Check contenuto
@@ -1533,23 +2120,26 @@ if __name__ == "__main__":
         
         result = process_cdr_with_categories_standalone(file_path)
         
+        # Report costruito in memoria e scritto con una sola write
+        out = []
         if result['success']:
-            print(f"✅ Elaborazione completata!")
-            print(f"📊 Contratti elaborati: {result['total_contracts']}")
-            print(f"📁 File generati: {len(result['generated_files'])}")
-            print(f"🏷️ Sistema categorie: {result.get('categories_system_enabled', False)}")
+            out.append(f"✅ Elaborazione completata!")
+            out.append(f"📊 Contratti elaborati: {result['total_contracts']}")
+            out.append(f"📁 File generati: {len(result['generated_files'])}")
+            out.append(f"🏷️ Sistema categorie: {result.get('categories_system_enabled', False)}")
             
             # Mostra campo richiesto
             stats = result.get('category_stats', {})
             if stats:
-                print(f"💰 Breakdown costi per categoria:")
+                out.append(f"💰 Breakdown costi per categoria:")
                 for cat_name, cat_stats in stats.items():
-                    print(f"   {cat_stats.get('display_name', cat_name)}: €{cat_stats.get('total_cost', 0):.2f} ({cat_stats.get('calls', 0)} chiamate)")
+                    out.append(f"   {cat_stats.get('display_name', cat_name)}: €{cat_stats.get('total_cost', 0):.2f} ({cat_stats.get('calls', 0)} chiamate)")
             
             for file_path in result['generated_files']:
-                print(f"   📄 {file_path}")
+                out.append(f"   📄 {file_path}")
         else:
-            print(f"❌ Errore: {result['message']}")
+            out.append(f"❌ Errore: {result['message']}")
+        sys.stdout.write('\n'.join(out) + '\n')
     else:
         print("Uso: python cdr_categories_enhanced.py <file_cdr.json>")
         print("Esempio: python cdr_categories_enhanced.py output/RIV_12345_MESE_05_2024-06-05-14.16.27.json")
\ No newline at end of file
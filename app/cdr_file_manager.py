@@ -1,9 +1,30 @@
+import os
 from pathlib import Path
 from typing import List, Union
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _scan_files(directory_path: Path, recursive: bool = False):
+    """
+    Restituisce i DirEntry dei file della directory (e delle sottodirectory se recursive).
+    
+    Come glob('**/...') non entra nei link simbolici a directory e salta le sottodirectory non leggibili.
+    """
+    pending = [directory_path]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        yield entry
+                    elif recursive and entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+        except PermissionError:
+            if current is directory_path:
+                raise
+
 def get_files_by_extension(directory: Union[str, Path], extension: str, recursive: bool = False) -> List[Path]:
     """
     Legge tutti i file con una determinata estensione da una directory.
@@ -45,16 +66,10 @@ def get_files_by_extension(directory: Union[str, Path], extension: str, recursiv
             # Aggiunge il punto se mancante (es: 'json' -> '.json')
             extension = f'.{extension}'
         
-        # Pattern di ricerca
-        if recursive:
-            pattern = f'**/*{extension}'
-            files = list(directory_path.glob(pattern))
-        else:
-            pattern = f'*{extension}'
-            files = list(directory_path.glob(pattern))
-        
-        # Filtra solo i file (esclude directory)
-        files = [f for f in files if f.is_file()]
+        # Scansione con os.scandir: nome e tipo dei file arrivano dalla lettura della directory,
+        # senza creare un Path e fare una stat() per ogni voce come glob() + is_file()
+        files = [Path(entry.path) for entry in _scan_files(directory_path, recursive)
+                 if entry.name.endswith(extension)]
         
         # Ordina per nome file
         files.sort(key=lambda x: x.name.lower())
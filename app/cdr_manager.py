@@ -4,7 +4,9 @@ from pathlib import Path
 from typing import List, Optional, Union, Dict, Any
 from datetime import datetime
 from collections import defaultdict, Counter
+from operator import itemgetter
 import statistics
+import heapq
 
 try:
     from dotenv import load_dotenv
@@ -300,22 +302,17 @@ def analyze_cdr_data(file_path: str) -> Dict[str, Any]:
 def _create_unified_contract_data(contract_code: int, records: List[Dict]) -> Dict[str, Any]:
     """Crea la struttura unificata per un singolo contratto con tutti i dati originali e analisi."""
     
-    # Dati originali unificati
-    unified_records = []
-    unique_callers = set()
-    unique_called_numbers = set()
-    service_codes = set()
-    
-    for record in records:
-        unified_records.append(record)
-        unique_callers.add(record['numero_chiamante'])
-        unique_called_numbers.add(record['numero_chiamato'])
-        service_codes.add(record['codice_servizio'])
+    # Valori distinti e totali raccolti direttamente dai record (iterazione in C con itemgetter),
+    # senza copiare la lista: i record originali sono già raggruppati per contratto
+    unique_callers = set(map(itemgetter('numero_chiamante'), records))
+    unique_called_numbers = set(map(itemgetter('numero_chiamato'), records))
+    service_codes = set(map(itemgetter('codice_servizio'), records))
+    call_times = list(map(itemgetter('data_ora_chiamata'), records))
     
     # Calcoli base
     total_calls = len(records)
-    total_duration = sum(r['durata_secondi'] for r in records)
-    total_cost = sum(r['costo_euro'] for r in records)
+    total_duration = sum(map(itemgetter('durata_secondi'), records))
+    total_cost = sum(map(itemgetter('costo_euro'), records))
     
     # Analisi dettagliate
     call_types_analysis = _analyze_call_types(records)
@@ -334,8 +331,8 @@ def _create_unified_contract_data(contract_code: int, records: List[Dict]) -> Di
             'unique_called_numbers': len(unique_called_numbers),
             'unique_service_codes': len(service_codes),
             'date_range': {
-                'first_call': min(r['data_ora_chiamata'] for r in records),
-                'last_call': max(r['data_ora_chiamata'] for r in records)
+                'first_call': min(call_times),
+                'last_call': max(call_times)
             }
         },
         
@@ -365,19 +362,28 @@ def _create_unified_contract_data(contract_code: int, records: List[Dict]) -> Di
             'most_frequent_callers': _get_most_frequent_callers(records, 10)
         },
         
-        'original_records': unified_records
+        'original_records': records
     }
 
 
+def _group_records_by(records: List[Dict], field: str) -> Dict[Any, List[Dict]]:
+    """Raggruppa i record per valore del campo in una sola passata (invece di filtrare l'intera lista per ogni valore)."""
+    groups = defaultdict(list)
+    for record in records:
+        groups[record[field]].append(record)
+    return groups
+
+
 def _analyze_call_types(records: List[Dict]) -> Dict[str, Any]:
     """Analizza i tipi di chiamata."""
     call_types = Counter(r['tipo_chiamata'] for r in records)
+    type_groups = _group_records_by(records, 'tipo_chiamata')
     total = len(records)
     
     # Calcola costi e durate per tipo
     type_details = {}
     for call_type in call_types.keys():
-        type_records = [r for r in records if r['tipo_chiamata'] == call_type]
+        type_records = type_groups[call_type]
         type_details[call_type] = {
             'count': len(type_records),
             'percentage': round((len(type_records) / total) * 100, 2),
@@ -400,11 +406,12 @@ def _analyze_call_types(records: List[Dict]) -> Dict[str, Any]:
 def _analyze_operators(records: List[Dict]) -> Dict[str, Any]:
     """Analizza la distribuzione degli operatori."""
     operators = Counter(r['operatore'] for r in records)
+    operator_groups = _group_records_by(records, 'operatore')
     total = len(records)
     
     operator_details = {}
     for operator in operators.keys():
-        op_records = [r for r in records if r['operatore'] == operator]
+        op_records = operator_groups[operator]
         operator_details[operator] = {
             'count': len(op_records),
             'percentage': round((len(op_records) / total) * 100, 2),
@@ -535,10 +542,11 @@ def _analyze_durations(records: List[Dict]) -> Dict[str, Any]:
 def _analyze_services(records: List[Dict]) -> Dict[str, Any]:
     """Analizza i codici servizio."""
     services = Counter(r['codice_servizio'] for r in records)
+    service_groups = _group_records_by(records, 'codice_servizio')
     
     service_details = {}
     for service_code in services.keys():
-        service_records = [r for r in records if r['codice_servizio'] == service_code]
+        service_records = service_groups[service_code]
         service_details[service_code] = {
             'count': len(service_records),
             'total_cost': round(sum(r['costo_euro'] for r in service_records), 2),
@@ -557,12 +565,12 @@ def _analyze_services(records: List[Dict]) -> Dict[str, Any]:
 
 def _get_top_calls_by_cost(records: List[Dict], limit: int) -> List[Dict]:
     """Restituisce le chiamate più costose."""
-    return sorted(records, key=lambda x: x['costo_euro'], reverse=True)[:limit]
+    return heapq.nlargest(limit, records, key=itemgetter('costo_euro'))
 
 
 def _get_top_calls_by_duration(records: List[Dict], limit: int) -> List[Dict]:
     """Restituisce le chiamate più lunghe."""
-    return sorted(records, key=lambda x: x['durata_secondi'], reverse=True)[:limit]
+    return heapq.nlargest(limit, records, key=itemgetter('durata_secondi'))
 
 
 def _get_most_frequent_destinations(records: List[Dict], limit: int) -> List[Dict]:
@@ -585,24 +593,24 @@ def _generate_global_summary(contracts: Dict) -> Dict[str, Any]:
     total_cost = sum(contract['aggregated_metrics']['total_cost_euro'] for contract in contracts.values())
     total_duration = sum(contract['aggregated_metrics']['total_duration_seconds'] for contract in contracts.values())
     
-    # Top contratti per diverse metriche
-    most_active_contracts = sorted(
+    # Top contratti per diverse metriche (nlargest: solo i primi 10, senza ordinare tutti i contratti)
+    most_active_contracts = heapq.nlargest(
+        10,
         contracts.items(),
-        key=lambda x: x[1]['aggregated_metrics']['total_calls'],
-        reverse=True
-    )[:10]
+        key=lambda x: x[1]['aggregated_metrics']['total_calls']
+    )
     
-    most_expensive_contracts = sorted(
+    most_expensive_contracts = heapq.nlargest(
+        10,
         contracts.items(),
-        key=lambda x: x[1]['aggregated_metrics']['total_cost_euro'],
-        reverse=True
-    )[:10]
+        key=lambda x: x[1]['aggregated_metrics']['total_cost_euro']
+    )
     
-    highest_average_cost_contracts = sorted(
+    highest_average_cost_contracts = heapq.nlargest(
+        10,
         contracts.items(),
-        key=lambda x: x[1]['aggregated_metrics']['average_call_cost_euro'],
-        reverse=True
-    )[:10]
+        key=lambda x: x[1]['aggregated_metrics']['average_call_cost_euro']
+    )
     
     # Analisi globale dei tipi di chiamata
     all_call_types = Counter()
@@ -744,22 +752,17 @@ def analyze_cdr_data_with_markup(file_path: str, categories_file_path: str) -> D
 def _create_unified_contract_data_with_markup(contract_code: int, records: List[Dict], categories: Dict) -> Dict[str, Any]:
     """Crea la struttura unificata per un singolo contratto con calcolo del markup."""
     
-    # Dati originali unificati
-    unified_records = []
-    unique_callers = set()
-    unique_called_numbers = set()
-    service_codes = set()
-    
-    for record in records:
-        unified_records.append(record)
-        unique_callers.add(record['numero_chiamante'])
-        unique_called_numbers.add(record['numero_chiamato'])
-        service_codes.add(record['codice_servizio'])
+    # Valori distinti e totali raccolti direttamente dai record (iterazione in C con itemgetter),
+    # senza copiare la lista: i record originali sono già raggruppati per contratto
+    unique_callers = set(map(itemgetter('numero_chiamante'), records))
+    unique_called_numbers = set(map(itemgetter('numero_chiamato'), records))
+    service_codes = set(map(itemgetter('codice_servizio'), records))
+    call_times = list(map(itemgetter('data_ora_chiamata'), records))
     
     # Calcoli base
     total_calls = len(records)
-    total_duration = sum(r['durata_secondi'] for r in records)
-    total_cost = sum(r['costo_euro'] for r in records)
+    total_duration = sum(map(itemgetter('durata_secondi'), records))
+    total_cost = sum(map(itemgetter('costo_euro'), records))
     
     # Analisi dettagliate con markup
     call_types_analysis = _analyze_call_types_with_markup(records, categories)
@@ -784,8 +787,8 @@ def _create_unified_contract_data_with_markup(contract_code: int, records: List[
             'unique_called_numbers': len(unique_called_numbers),
             'unique_service_codes': len(service_codes),
             'date_range': {
-                'first_call': min(r['data_ora_chiamata'] for r in records),
-                'last_call': max(r['data_ora_chiamata'] for r in records)
+                'first_call': min(call_times),
+                'last_call': max(call_times)
             }
         },
         
@@ -818,19 +821,20 @@ def _create_unified_contract_data_with_markup(contract_code: int, records: List[
             'most_frequent_callers': _get_most_frequent_callers(records, 10)
         },
         
-        'original_records': unified_records
+        'original_records': records
     }
 
 
 def _analyze_call_types_with_markup(records: List[Dict], categories: Dict) -> Dict[str, Any]:
     """Analizza i tipi di chiamata con calcolo del markup quando il costo è 0."""
     call_types = Counter(r['tipo_chiamata'] for r in records)
+    type_groups = _group_records_by(records, 'tipo_chiamata')
     total = len(records)
     
     # Calcola costi e durate per tipo
     type_details = {}
     for call_type in call_types.keys():
-        type_records = [r for r in records if r['tipo_chiamata'] == call_type]
+        type_records = type_groups[call_type]
         original_total_cost = sum(r['costo_euro'] for r in type_records)
         total_duration_minutes = sum(r['durata_secondi'] for r in type_records) / 60
         
@@ -906,24 +910,24 @@ def _generate_global_summary_with_markup(contracts: Dict) -> Dict[str, Any]:
     )
     total_duration = sum(contract['aggregated_metrics']['total_duration_seconds'] for contract in contracts.values())
     
-    # Top contratti per diverse metriche
-    most_active_contracts = sorted(
+    # Top contratti per diverse metriche (nlargest: solo i primi 10, senza ordinare tutti i contratti)
+    most_active_contracts = heapq.nlargest(
+        10,
         contracts.items(),
-        key=lambda x: x[1]['aggregated_metrics']['total_calls'],
-        reverse=True
-    )[:10]
+        key=lambda x: x[1]['aggregated_metrics']['total_calls']
+    )
     
-    most_expensive_contracts = sorted(
+    most_expensive_contracts = heapq.nlargest(
+        10,
         contracts.items(),
-        key=lambda x: x[1]['aggregated_metrics']['total_cost_euro_final_user'],
-        reverse=True
-    )[:10]
+        key=lambda x: x[1]['aggregated_metrics']['total_cost_euro_final_user']
+    )
     
-    highest_average_cost_contracts = sorted(
+    highest_average_cost_contracts = heapq.nlargest(
+        10,
         contracts.items(),
-        key=lambda x: x[1]['aggregated_metrics']['average_call_cost_euro_final_user'],
-        reverse=True
-    )[:10]
+        key=lambda x: x[1]['aggregated_metrics']['average_call_cost_euro_final_user']
+    )
     
     # Analisi globale dei tipi di chiamata
     all_call_types = Counter()
@@ -1048,6 +1052,11 @@ def export_contracts_to_files(unified_data: Dict[str, Any], output_directory: st
     # Dizionario per tenere traccia dei file creati
     created_files = {}
     
+    # Valori comuni a tutti i file dell'esportazione, calcolati una volta
+    exported_timestamp = datetime.now().isoformat()
+    source_analysis = unified_data.get('metadata', {})
+    export_directory = str(output_directory)
+    
     # Esporta ogni contratto
     for contract_id, contract_data in contracts.items():
         try:
@@ -1058,12 +1067,12 @@ def export_contracts_to_files(unified_data: Dict[str, Any], output_directory: st
             # Crea la struttura dati per il singolo contratto
             single_contract_data = {
                 'metadata': {
-                    'exported_timestamp': datetime.now().isoformat(),
+                    'exported_timestamp': exported_timestamp,
                     'contract_id': contract_id,
-                    'source_analysis': unified_data.get('metadata', {}),
+                    'source_analysis': source_analysis,
                     'export_info': {
                         'filename': filename,
-                        'export_directory': str(output_directory)
+                        'export_directory': export_directory
                     }
                 },
                 'contract_data': contract_data
@@ -1561,8 +1570,9 @@ def complete_cdr_conversion(files: str, codifica):
         load_dotenv()
         secure_config = SecureConfig()
         
-        output_path = secure_config.get_config().get('output_directory')
-        analytics_output_folder = secure_config.get_config().get('analytics_output_folder')
+        cfg = secure_config.get_config()
+        output_path = cfg.get('output_directory')
+        analytics_output_folder = cfg.get('analytics_output_folder')
         percorso_save = os.path.join(output_path, 'json_from_cdr')
         percorso_cdr = os.path.join(output_path, 'ftp_cdr')
         os.makedirs(percorso_save, exist_ok=True)
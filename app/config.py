@@ -32,6 +32,7 @@ class SecureConfig:
             'ftp_user': os.getenv('FTP_USER', ''),
             'ftp_password': os.getenv('FTP_PASSWORD', ''),
             'ftp_directory': os.getenv('FTP_DIRECTORY', '/'),
+            'ftp_parallel_downloads': self._str_to_int(os.getenv('FTP_PARALLEL_DOWNLOADS', '4'), 4),
             'download_all_files': self._str_to_bool(os.getenv('DOWNLOAD_ALL_FILES', 'false')),
             'specific_filename': os.getenv('SPECIFIC_FILENAME', ''),
             'output_directory': os.getenv('OUTPUT_DIRECTORY', './output'),
@@ -66,6 +67,10 @@ class SecureConfig:
             'APP_PORT': self._str_to_int(os.getenv('APP_PORT', '5001'), 5001),
             'APP_HOST': os.getenv('APP_HOST', '127.0.0.1'),
             'BASE_HOST': os.getenv('BASE_HOST', 'http://127.0.0.1'),
+            'WERKZEUG_THREADED': self._str_to_bool(os.getenv('WERKZEUG_THREADED', 'true')),
+            'USE_RELOADER': self._str_to_bool(os.getenv('USE_RELOADER', 'false')),
+            'EXTERNAL_WSGI_SERVER': self._str_to_bool(os.getenv('EXTERNAL_WSGI_SERVER', 'false')),
+            'MAX_CONTENT_LENGTH_MB': self._str_to_int(os.getenv('MAX_CONTENT_LENGTH_MB', '32'), 32),
         }
 
     def get_config_file_path(self, filename: str = None) -> Path:
@@ -217,7 +222,7 @@ class SecureConfig:
                         continue
                 
                 # Conversioni di tipo
-                if key in ['schedule_day', 'schedule_hour', 'schedule_minute', 'interval_days', 'schedule_interval_value']:
+                if key in ['schedule_day', 'schedule_hour', 'schedule_minute', 'interval_days', 'schedule_interval_value', 'ftp_parallel_downloads']:
                     value = self._str_to_int(value, self.config[key])
                 elif key in ['voip_price_fixed', 'voip_price_mobile', 'voip_markup_percent', 'voip_price_fixed_final', 'voip_price_mobile_final']:
                     value = self._str_to_float(value, self.config[key])
@@ -330,6 +335,7 @@ FTP_PORT={config['ftp_port']}
 FTP_USER={config['ftp_user']}
 FTP_PASSWORD={config['ftp_password']}
 FTP_DIRECTORY={config['ftp_directory']}
+FTP_PARALLEL_DOWNLOADS={config.get('ftp_parallel_downloads', 4)}
 
 # Configurazione Download
 DOWNLOAD_ALL_FILES={str(config['download_all_files']).lower()}
@@ -376,6 +382,10 @@ FLASK_DEBUG={str(config.get('FLASK_DEBUG', True)).lower()}
 APP_PORT={config.get('APP_PORT', 5001)}
 APP_HOST={config.get('APP_HOST', '127.0.0.1')}
 BASE_HOST={config.get('BASE_HOST', 'http://127.0.0.1')}
+WERKZEUG_THREADED={str(config.get('WERKZEUG_THREADED', True)).lower()}
+USE_RELOADER={str(config.get('USE_RELOADER', False)).lower()}
+EXTERNAL_WSGI_SERVER={str(config.get('EXTERNAL_WSGI_SERVER', False)).lower()}
+MAX_CONTENT_LENGTH_MB={config.get('MAX_CONTENT_LENGTH_MB', 32)}
 
 """
         # Scrittura dei file .env e .env.local
@@ -433,6 +443,7 @@ def load_config_from_env_local(secure_config):
                     'ftp_user': os.getenv('FTP_USER', ''),
                     'ftp_password': os.getenv('FTP_PASSWORD', ''),
                     'ftp_directory': os.getenv('FTP_DIRECTORY', '/'),
+                    'ftp_parallel_downloads': secure_config._str_to_int(os.getenv('FTP_PARALLEL_DOWNLOADS', '4'), 4),
                     'download_all_files': secure_config._str_to_bool(os.getenv('DOWNLOAD_ALL_FILES', 'false')),
                     'specific_filename': os.getenv('SPECIFIC_FILENAME', ''),
                     'file_naming_pattern': os.getenv('FILE_NAMING_PATTERN', 'monthly'),
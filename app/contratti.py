@@ -7,7 +7,7 @@ import requests
 import logging
 from typing import Dict, List, Any, Optional, Tuple, Callable
 from datetime import datetime
-import json
+from json_provider import fast_loads
 
 logger = logging.getLogger(__name__)
 
@@ -367,7 +367,7 @@ class ElaborazioneContratti:
                 contract_code = contract.get('contract_code', '')
                 
                 if not odoo_id or not contract_type:
-                    logger.debug(f"⚠️ Contratto {contract_code} saltato: odoo_id='{odoo_id}', type='{contract_type}'")
+                    logger.debug("⚠️ Contratto %s saltato: odoo_id='%s', type='%s'", contract_code, odoo_id, contract_type)
                     continue
                 
                 # Processa contratto valido
@@ -375,7 +375,7 @@ class ElaborazioneContratti:
                     valid_count += 1
                     result = processor_func(contract_code, contract_type, odoo_id)
                     results.append(result)
-                    logger.info(f"✅ Processato contratto {contract_code}")
+                    logger.info("✅ Processato contratto %s", contract_code)
                     
                 except Exception as e:
                     logger.error(f"❌ Errore processing {contract_code}: {e}")
@@ -430,7 +430,7 @@ class ElaborazioneContratti:
                         'contract_type': contract_type,
                         'status': 'ok'
                     })
-                    logger.info(f"✅ {contract_code}")
+                    logger.info("✅ %s", contract_code)
             
             return {
                 'success': True,
@@ -513,8 +513,8 @@ class CDRContractsServiceStandalone:
             True se il caricamento è riuscito, False altrimenti
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                self.contracts_data = json.load(file)
+            with open(file_path, 'rb') as file:
+                self.contracts_data = fast_loads(file.read())
             self._cached_contracts = None
             logger.info(f"✅ Contratti caricati da file: {file_path}")
             return True
@@ -686,7 +686,8 @@ class ElaborazioneContrattiStandalone:
             
             logger.info(f"📊 Contratti da elaborare: {len(contracts)}")
             
-            # Elabora contratti validi
+            # Elabora contratti validi (un solo timestamp per tutta l'elaborazione)
+            processed_at = datetime.now().isoformat()
             results = []
             valid_count = 0
             invalid_count = 0
@@ -709,7 +710,7 @@ class ElaborazioneContrattiStandalone:
                             try:
                                 custom_result = processor_callback(contract)
                                 results.append(custom_result)
-                                logger.info(f"✅ Callback completato per contratto {contract_code}")
+                                logger.info("✅ Callback completato per contratto %s", contract_code)
                                 continue
                             except Exception as e:
                                 logger.error(f"❌ Errore callback per contratto {contract_code}: {e}")
@@ -718,19 +719,19 @@ class ElaborazioneContrattiStandalone:
                                     'contract_code': contract_code,
                                     'status': 'callback_error',
                                     'error': str(e),
-                                    'processed_at': datetime.now().isoformat()
+                                    'processed_at': processed_at
                                 })
                                 continue
                         
                         # Elaborazione standard (se nessun callback)
-                        elaboration_result = self._elabora_contratto_standard(contract)
+                        elaboration_result = self._elabora_contratto_standard(contract, processed_at)
                         results.append(elaboration_result)
-                        logger.info(f"✅ Processato contratto {contract_code} - {contract_name}")
+                        logger.info("✅ Processato contratto %s - %s", contract_code, contract_name)
                         
                     else:
                         invalid_count += 1
-                        logger.debug(f"⚠️ Contratto {contract_code} saltato: "
-                                   f"odoo_id='{odoo_id}', type='{contract_type}', code='{contract_code}'")
+                        logger.debug("⚠️ Contratto %s saltato: odoo_id='%s', type='%s', code='%s'",
+                                     contract_code, odoo_id, contract_type, contract_code)
                         
                         results.append({
                             'contract_code': contract_code,
@@ -742,7 +743,7 @@ class ElaborazioneContrattiStandalone:
                                 'contract_type': not bool(contract_type),
                                 'contract_code': not bool(contract_code)
                             },
-                            'processed_at': datetime.now().isoformat()
+                            'processed_at': processed_at
                         })
                 
                 except Exception as e:
@@ -752,7 +753,7 @@ class ElaborazioneContrattiStandalone:
                         'contract_code': contract.get('contract_code', 'Unknown'),
                         'status': 'error',
                         'error': str(e),
-                        'processed_at': datetime.now().isoformat()
+                        'processed_at': processed_at
                     })
             
             # Riepilogo finale
@@ -776,7 +777,7 @@ class ElaborazioneContrattiStandalone:
                     'error_contracts': [r for r in results if r.get('status') == 'error'],
                     'callback_error_contracts': [r for r in results if r.get('status') == 'callback_error']
                 },
-                'processing_timestamp': datetime.now().isoformat()
+                'processing_timestamp': processed_at
             }
             
         except Exception as e:
@@ -788,12 +789,13 @@ class ElaborazioneContrattiStandalone:
                 'processing_timestamp': datetime.now().isoformat()
             }
     
-    def _elabora_contratto_standard(self, contract: Dict[str, Any]) -> Dict[str, Any]:
+    def _elabora_contratto_standard(self, contract: Dict[str, Any], processed_at: Optional[str] = None) -> Dict[str, Any]:
         """
         Elaborazione standard di un contratto (da personalizzare)
         
         Args:
             contract: Dati del contratto
+            processed_at: Timestamp ISO dell'elaborazione (default: adesso)
             
         Returns:
             Risultato dell'elaborazione
@@ -820,7 +822,7 @@ class ElaborazioneContrattiStandalone:
             'odoo_id': odoo_id,
             'phone_number': phone_number,
             'status': 'processed',
-            'processed_at': datetime.now().isoformat(),
+            'processed_at': processed_at or datetime.now().isoformat(),
             'elaboration_notes': f"Contratto {contract_code} elaborato con successo",
             'actions_performed': [
                 'validation_completed',
@@ -6,20 +6,66 @@ Estratte da FTPProcessor per uso modulare
 
 import json
 import logging
+import mmap
+import multiprocessing
+import os
+import re
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 
+from json_provider import fast_dumps, fast_loads
+
+# Kernel vettoriali di pyarrow per il parsing dei file CDR (opzionale, fallback sul parser riga per riga)
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+    pc = None
+
 logger = logging.getLogger(__name__)
 
-def convert_to_json(file_path, output_directory):
+# Tracciato dei file CDR (campi separati da ';', senza intestazione)
+CDR_HEADERS = [
+    'data_ora_chiamata',
+    'numero_chiamante', 
+    'numero_chiamato',
+    'durata_secondi',
+    'tipo_chiamata',
+    'operatore',
+    'costo_euro',
+    'codice_contratto',
+    'codice_servizio',
+    'cliente_finale_comune',
+    'prefisso_chiamato'
+]
+CDR_INT_FIELDS = ('durata_secondi', 'codice_contratto', 'codice_servizio')
+CDR_FLOAT_FIELDS = ('costo_euro',)
+# Dimensione dei blocchi letti dai file CDR: la memoria usata per il testo resta limitata anche su file enormi
+CDR_READ_CHUNK_BYTES = 16 * 1024 * 1024
+# Caratteri di controllo su cui str.splitlines() va a capo ma la lettura in modalità testo no
+# (singoli byte: il test 'in' su bytes è una memchr, molto più rapida di una regex su blocchi da 16MB)
+_EXTRA_LINE_BREAKS = (b'\x0b', b'\x0c', b'\x1c', b'\x1d', b'\x1e')
+# Parole chiave che identificano un file CDR dal nome (una sola ricerca, senza distinzione maiuscole)
+_CDR_FILENAME_RE = re.compile(r'CDR|RIV|CALL|DETAIL', re.IGNORECASE)
+
+def convert_to_json(file_path, output_directory, force=False):
     """
     Converte un file in formato JSON
     Supporta CSV, TXT, Excel, e file CDR
     
+    Se il JSON di output è già stato prodotto da questo stesso sorgente (nome, dimensione e mtime registrati
+    in un file marker accanto al JSON) la conversione viene saltata, es. rielaborazione dopo un'interruzione.
+    Un sorgente diverso con lo stesso nome JSON (X.cdr / X.csv) o ripristinato con un vecchio mtime viene riconvertito.
+    
     Args:
         file_path (str|Path): Path del file da convertire
         output_directory (str|Path): Directory di output
+        force (bool): Riconverte anche se il JSON è già aggiornato
         
     Returns:
         str|None: Path del file JSON creato o None se errore
@@ -33,11 +79,15 @@ def convert_to_json(file_path, output_directory):
         json_filename = file_path.stem + '.json'
         json_path = output_directory / json_filename
         
+        if not force and _is_json_up_to_date(file_path, json_path):
+            logger.info(f"File già convertito e invariato, conversione saltata: {json_path}")
+            return str(json_path)
+        
         data = None
         
         # Controlla se è un file CDR (Call Detail Record) basandosi sul nome o estensione
         if file_extension == '.cdr' or 'CDR' in file_path.name.upper():
-            data = _parse_cdr_file(file_path)
+            data = parse_cdr_file(file_path)
         elif file_extension == '.csv':
             data = _parse_csv_file(file_path)
         elif file_extension in ['.xlsx', '.xls']:
@@ -70,9 +120,13 @@ def convert_to_json(file_path, output_directory):
         else:
             final_data = data
         
-        # Salva il file JSON
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(final_data, f, indent=2, ensure_ascii=False)
+        # Salva il file JSON su file temporaneo e rename atomico: un JSON scritto a metà
+        # non deve mai risultare "già convertito" alla rielaborazione successiva
+        # (serializzazione orjson in un solo passaggio, stesso formato indentato di json.dump)
+        tmp_path = json_path.with_name(json_path.name + '.tmp')
+        tmp_path.write_bytes(fast_dumps(final_data, indent=True).encode('utf-8'))
+        os.replace(tmp_path, json_path)
+        _write_conversion_marker(file_path, json_path)
         
         logger.info(f"File convertito in JSON: {json_path}")
         return str(json_path)
@@ -81,66 +135,44 @@ def convert_to_json(file_path, output_directory):
         logger.error(f"Errore nella conversione di {file_path}: {e}")
         return None
 
-def _parse_cdr_file(file_path):
+def _conversion_marker_path(json_path):
+    """File (nascosto) accanto al JSON con la firma del sorgente da cui è stato prodotto"""
+    return json_path.with_name('.' + json_path.name + '.source')
+
+def _conversion_signature(file_path, json_path):
+    """Firma di sorgente e JSON: cambia se cambia il sorgente (anche solo nome o dimensione) o se il JSON viene riscritto"""
+    source_stat = file_path.stat()
+    json_stat = json_path.stat()
+    return {
+        'source_file': file_path.name,
+        'source_size': source_stat.st_size,
+        'source_mtime_ns': source_stat.st_mtime_ns,
+        'json_size': json_stat.st_size,
+        'json_mtime_ns': json_stat.st_mtime_ns
+    }
+
+def _write_conversion_marker(file_path, json_path):
+    """Registra da quale sorgente è stato prodotto il JSON (un errore qui comporta solo una riconversione futura)"""
+    try:
+        _conversion_marker_path(json_path).write_text(fast_dumps(_conversion_signature(file_path, json_path)), encoding='utf-8')
+    except OSError as e:
+        logger.warning(f"Impossibile scrivere il marker di conversione per {json_path}: {e}")
+
+def _is_json_up_to_date(file_path, json_path):
+    """True se il JSON di output esiste, non è vuoto ed è stato prodotto da questo sorgente nella versione attuale"""
+    try:
+        recorded = fast_loads(_conversion_marker_path(json_path).read_bytes())
+        return json_path.stat().st_size > 0 and recorded == _conversion_signature(file_path, json_path)
+    except (OSError, ValueError):
+        return False
+
+def parse_cdr_file(file_path):
     """Parsing specifico per file CDR"""
     try:
-        cdr_headers = [
-            'data_ora_chiamata',
-            'numero_chiamante', 
-            'numero_chiamato',
-            'durata_secondi',
-            'tipo_chiamata',
-            'operatore',
-            'costo_euro',
-            'codice_contratto',
-            'codice_servizio',
-            'cliente_finale_comune',
-            'prefisso_chiamato'
-        ]
-        
-        data = []
-        with open(file_path, 'r', encoding='cp1252') as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
-                if line:  # Ignora righe vuote
-                    fields = line.split(';')
-                    
-                    # Assicurati che ci siano abbastanza campi
-                    while len(fields) < len(cdr_headers):
-                        fields.append('')
-                    
-                    # Crea record con conversioni di tipo appropriate
-                    record = {}
-                    for i, header in enumerate(cdr_headers):
-                        if i < len(fields):
-                            value = fields[i].strip()
-                            
-                            # Conversioni di tipo specifiche
-                            if header == 'durata_secondi':
-                                try:
-                                    record[header] = int(value) if value else 0
-                                except ValueError:
-                                    record[header] = 0
-                            elif header == 'costo_euro':
-                                try:
-                                    record[header] = float(value.replace(',', '.')) if value else 0.0
-                                except ValueError:
-                                    record[header] = 0.0
-                            elif header in ['codice_contratto', 'codice_servizio']:
-                                try:
-                                    record[header] = int(value) if value else 0
-                                except ValueError:
-                                    record[header] = 0
-                            else:
-                                record[header] = value
-                        else:
-                            record[header] = ''
-                    
-                    # Aggiungi metadati utili
-                    record['record_number'] = line_num
-                    record['raw_line'] = line
-                    
-                    data.append(record)
+        if pc is not None:
+            data = _parse_cdr_file_arrow(file_path)
+        else:
+            data = _parse_cdr_file_lines(file_path)
         
         logger.info(f"File CDR processato: {len(data)} record trovati")
         return data
@@ -149,6 +181,166 @@ def _parse_cdr_file(file_path):
         logger.error(f"Errore parsing CDR {file_path}: {e}")
         return None
 
+def _iter_cdr_line_chunks(file_path, chunk_size=CDR_READ_CHUNK_BYTES):
+    """
+    Legge il file CDR (cp1252) a blocchi e restituisce, per ogni blocco, la lista delle sue righe
+    
+    Come la modalità testo va a capo su LF, CRLF e CR, ma decodifica e split avvengono in C su tutto il blocco.
+    Il file è mappato in memoria: ogni blocco termina dopo l'ultimo LF entro chunk_size e viene copiato
+    dalla mappa una sola volta, senza buffer di lettura né concatenazioni con il resto del blocco precedente.
+    """
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return  # mmap non accetta file vuoti
+        
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            
+            pos = 0
+            while pos < size:
+                end = pos + chunk_size
+                if end >= size:
+                    end = size
+                else:
+                    # Le righe non vengono spezzate: se nel blocco non c'è un LF si arriva al primo successivo
+                    end = (mm.rfind(b'\n', pos, end) + 1) or (mm.find(b'\n', end) + 1) or size
+                yield _split_cdr_lines(mm[pos:end])
+                pos = end
+
+def _split_cdr_lines(data):
+    """Decodifica un blocco cp1252 e lo divide in righe"""
+    if any(char in data for char in _EXTRA_LINE_BREAKS):
+        # Caso raro: split sui soli fine riga in bytes, poi decodifica riga per riga
+        return [line.decode('cp1252') for line in data.splitlines()]
+    return data.decode('cp1252').splitlines()
+
+def _parse_cdr_file_lines(file_path):
+    """Parsing CDR riga per riga in Python (usato se pyarrow non è installato)"""
+    data = []
+    line_num = 0
+    field_count = len(CDR_HEADERS)
+    for lines in _iter_cdr_line_chunks(file_path):
+        for line in lines:
+            line_num += 1
+            line = line.strip()
+            if line:  # Ignora righe vuote
+                # Split limitato ai campi del tracciato: quelli in eccesso restano nell'ultimo pezzo, ignorato
+                fields = line.split(';', field_count)
+                
+                # Campi mancanti vuoti (0 per i numerici)
+                if len(fields) < field_count:
+                    fields.extend([''] * (field_count - len(fields)))
+                
+                # Crea record con conversioni di tipo appropriate
+                record = {}
+                for header, value in zip(CDR_HEADERS, fields):
+                    value = value.strip()
+                    
+                    # Conversioni di tipo specifiche
+                    if header == 'durata_secondi':
+                        try:
+                            record[header] = int(value) if value else 0
+                        except ValueError:
+                            record[header] = 0
+                    elif header == 'costo_euro':
+                        try:
+                            record[header] = float(value.replace(',', '.')) if value else 0.0
+                        except ValueError:
+                            record[header] = 0.0
+                    elif header in ['codice_contratto', 'codice_servizio']:
+                        try:
+                            record[header] = int(value) if value else 0
+                        except ValueError:
+                            record[header] = 0
+                    else:
+                        record[header] = value
+                
+                # Aggiungi metadati utili
+                record['record_number'] = line_num
+                record['raw_line'] = line
+                
+                data.append(record)
+    
+    return data
+
+def _parse_cdr_file_arrow(file_path):
+    """
+    Parsing CDR con i kernel vettoriali di pyarrow: trim, split e conversioni girano in C su tutte le righe
+    
+    Stesso risultato del parser riga per riga: righe vuote ignorate, campi mancanti vuoti (o 0 per i numerici),
+    valori numerici non validi convertiti in 0, numero riga fisico e riga originale in ogni record.
+    """
+    data = []
+    first_line_number = 1
+    for lines in _iter_cdr_line_chunks(file_path):
+        data.extend(_parse_cdr_lines_arrow(lines, first_line_number))
+        first_line_number += len(lines)
+    return data
+
+def _parse_cdr_lines_arrow(lines, first_line_number):
+    """Converte in record un blocco di righe CDR; first_line_number è il numero della prima riga nel file"""
+    lines = pc.utf8_trim_whitespace(pa.array(lines, type=pa.string()))
+    not_empty = pc.not_equal(pc.utf8_length(lines), 0)
+    # Numero riga fisico (righe vuote comprese) delle sole righe con dati
+    record_numbers = pc.add(pc.indices_nonzero(not_empty), first_line_number)
+    raw_lines = pc.filter(lines, not_empty)
+    
+    # Separatori aggiunti in coda: ogni riga ha almeno tutti i campi del tracciato (i mancanti restano vuoti),
+    # quelli in eccesso finiscono nell'ultimo pezzo e vengono ignorati
+    field_count = len(CDR_HEADERS)
+    padded = pc.binary_join_element_wise(raw_lines, ';' * field_count, '')
+    fields = pc.split_pattern(padded, ';', max_splits=field_count)
+    
+    columns = []
+    for i, header in enumerate(CDR_HEADERS):
+        values = pc.utf8_trim_whitespace(pc.list_element(fields, i))
+        
+        # Conversioni di tipo specifiche (vuoti o non validi -> 0): i valori nel formato comune vengono convertiti
+        # in C, gli altri non vuoti (oltre 18 cifre, inf/nan, '1_000', ...) con la stessa conversione Python del parser riga per riga
+        if header in CDR_INT_FIELDS:
+            valid = pc.match_substring_regex(values, r'^[+-]?[0-9]{1,18}$')
+            converted = pc.cast(pc.if_else(valid, pc.utf8_ltrim(values, '+'), '0'), pa.int64()).to_pylist()
+            columns.append(_convert_remaining(converted, values, valid, _cdr_int))
+        elif header in CDR_FLOAT_FIELDS:
+            values = pc.replace_substring(values, ',', '.')
+            valid = pc.match_substring_regex(values, r'^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$')
+            converted = pc.cast(pc.if_else(valid, pc.utf8_ltrim(values, '+'), '0'), pa.float64()).to_pylist()
+            columns.append(_convert_remaining(converted, values, valid, _cdr_float))
+        else:
+            columns.append(values.to_pylist())
+    
+    # Aggiungi metadati utili
+    columns.append(record_numbers.to_pylist())
+    columns.append(raw_lines.to_pylist())
+    
+    keys = CDR_HEADERS + ['record_number', 'raw_line']
+    return [dict(zip(keys, row)) for row in zip(*columns)]
+
+def _convert_remaining(converted, values, valid, convert):
+    """Applica convert ai valori non vuoti esclusi dalla conversione vettoriale (valid falso)"""
+    remaining = pc.and_(pc.invert(valid), pc.not_equal(pc.utf8_length(values), 0))
+    indices = pc.indices_nonzero(remaining)
+    if len(indices):
+        for index, value in zip(indices.to_pylist(), pc.take(values, indices).to_pylist()):
+            converted[index] = convert(value)
+    return converted
+
+def _cdr_int(value):
+    """Conversione intera del parser riga per riga (non validi -> 0)"""
+    try:
+        return int(value) if value else 0
+    except ValueError:
+        return 0
+
+def _cdr_float(value):
+    """Conversione decimale del parser riga per riga, virgola già sostituita (non validi -> 0.0)"""
+    try:
+        return float(value) if value else 0.0
+    except ValueError:
+        return 0.0
+
 def _parse_csv_file(file_path):
     """Parsing per file CSV"""
     try:
@@ -186,7 +378,7 @@ def _parse_txt_file(file_path):
         
         # Se la prima riga contiene molti punti e virgola, trattalo come CDR
         if first_line.count(';') >= 5:
-            return _parse_cdr_file(file_path)
+            return parse_cdr_file(file_path)
         else:
             # Assume formato CSV con tab o altro delimitatore
             try:
@@ -225,7 +417,7 @@ def _parse_unknown_file(file_path):
             with open(temp_cdr, 'w', encoding='utf-8') as f:
                 f.write(content)
             
-            result = _parse_cdr_file(temp_cdr)
+            result = parse_cdr_file(temp_cdr)
             
             # Rimuovi file temporaneo
             try:
@@ -241,13 +433,25 @@ def _parse_unknown_file(file_path):
         logger.error(f"Errore parsing file sconosciuto {file_path}: {e}")
         return None
 
-def convert_multiple_files(file_paths, output_directory):
+def _available_cpus():
+    """CPU utilizzabili dal processo (rispetta affinità e limiti del container dove supportato)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def convert_multiple_files(file_paths, output_directory, max_workers=None, force=False):
     """
     Converte più file in JSON
     
+    I file sono indipendenti: con più di un file la conversione gira in parallelo su più processi
+    (parsing e serializzazione sono CPU-bound), mantenendo l'ordine dei risultati.
+    
     Args:
         file_paths (list): Lista di path dei file
         output_directory (str|Path): Directory di output
+        max_workers (int): Processi paralleli (default: numero di CPU, 1 = conversione sequenziale)
+        force (bool): Riconverte anche i file il cui JSON è già aggiornato
         
     Returns:
         dict: Risultato con file convertiti e errori
@@ -255,15 +459,43 @@ def convert_multiple_files(file_paths, output_directory):
     converted_files = []
     conversion_errors = []
     
-    for file_path in file_paths:
+    file_paths = list(file_paths)
+    workers = min(len(file_paths), max_workers or _available_cpus())
+    
+    outcomes = None
+    if workers > 1:
         try:
-            json_path = convert_to_json(file_path, output_directory)
-            if json_path:
-                converted_files.append(json_path)
-            else:
-                conversion_errors.append(f"Conversione fallita per: {file_path}")
-        except Exception as e:
-            conversion_errors.append(f"Errore conversione {file_path}: {str(e)}")
+            # forkserver: l'app è multi-thread (Werkzeug, scheduler) e un fork diretto potrebbe copiare lock già acquisiti
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver')) as executor:
+                futures = [executor.submit(convert_to_json, file_path, output_directory, force) for file_path in file_paths]
+                outcomes = []
+                for future in futures:
+                    try:
+                        outcomes.append((future.result(), None))
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        outcomes.append((None, e))
+        except (OSError, BrokenProcessPool) as e:
+            # Processi non disponibili (ambiente limitato): si torna alla conversione sequenziale
+            logger.warning(f"Conversione parallela non disponibile, procedo in sequenza: {e}")
+            outcomes = None
+    
+    if outcomes is None:
+        outcomes = []
+        for file_path in file_paths:
+            try:
+                outcomes.append((convert_to_json(file_path, output_directory, force), None))
+            except Exception as e:
+                outcomes.append((None, e))
+    
+    for file_path, (json_path, error) in zip(file_paths, outcomes):
+        if error is not None:
+            conversion_errors.append(f"Errore conversione {file_path}: {str(error)}")
+        elif json_path:
+            converted_files.append(json_path)
+        else:
+            conversion_errors.append(f"Conversione fallita per: {file_path}")
     
     return {
         'converted_files': converted_files,
@@ -276,6 +508,9 @@ def is_cdr_file(json_file_path):
     """
     Determina se un file JSON è un file CDR
     
+    L'esito del controllo sul contenuto è memorizzato per path, mtime e dimensione:
+    un file già verificato e non modificato non viene riletto né riparsato.
+    
     Args:
         json_file_path (str|Path): Path del file JSON
         
@@ -283,35 +518,39 @@ def is_cdr_file(json_file_path):
         bool: True se è un file CDR
     """
     try:
-        filename = Path(json_file_path).name.upper()
-        
         # Check nome file
-        if any(keyword in filename for keyword in ['CDR', 'RIV', 'CALL', 'DETAIL']):
+        if _CDR_FILENAME_RE.search(Path(json_file_path).name):
             return True
         
-        # Check contenuto
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Check metadati
-        metadata = data.get('metadata', {})
-        if metadata.get('file_type') == 'CDR':
-            return True
-        
-        # Check struttura record
-        records = data.get('records', [])
-        if records and len(records) > 0:
-            first_record = records[0]
-            cdr_fields = [
-                'data_ora_chiamata', 'numero_chiamante', 'numero_chiamato', 
-                'durata_secondi', 'tipo_chiamata', 'costo_euro', 'codice_contratto'
-            ]
-            
-            matching_fields = sum(1 for field in cdr_fields if field in first_record)
-            return matching_fields >= 5
-        
-        return False
+        # Check contenuto (in cache finché il file non cambia)
+        stat = os.stat(json_file_path)
+        return _is_cdr_json_content(os.fspath(json_file_path), stat.st_mtime_ns, stat.st_size)
         
     except Exception as e:
         logger.error(f"Errore verifica file CDR {json_file_path}: {e}")
-        return False
\ No newline at end of file
+        return False
+
+@lru_cache(maxsize=4096)
+def _is_cdr_json_content(json_file_path, mtime_ns, size):
+    """Verifica dal contenuto (metadati o campi del primo record) se il JSON è un file CDR"""
+    with open(json_file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    # Check metadati
+    metadata = data.get('metadata', {})
+    if metadata.get('file_type') == 'CDR':
+        return True
+    
+    # Check struttura record
+    records = data.get('records', [])
+    if records and len(records) > 0:
+        first_record = records[0]
+        cdr_fields = [
+            'data_ora_chiamata', 'numero_chiamante', 'numero_chiamato', 
+            'durata_secondi', 'tipo_chiamata', 'costo_euro', 'codice_contratto'
+        ]
+        
+        matching_fields = sum(1 for field in cdr_fields if field in first_record)
+        return matching_fields >= 5
+    
+    return False
\ No newline at end of file
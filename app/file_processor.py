@@ -10,6 +10,8 @@ from datetime import datetime, timedelta
 from pathlib import Path
 import pandas as pd
 from utils import extract_data_from_api
+from file_converter import parse_cdr_file
+from json_provider import fast_dumps
 logger = logging.getLogger(__name__)
 
 class ConvertFILE:
@@ -364,66 +366,10 @@ class ConvertFILE:
             
             # Controlla se è un file CDR (Call Detail Record) basandosi sul nome o estensione
             if file_extension == '.cdr' or 'CDR' in file_path.name.upper():
-                # File CDR - parsing personalizzato
-                cdr_headers = [
-                    'data_ora_chiamata',
-                    'numero_chiamante', 
-                    'numero_chiamato',
-                    'durata_secondi',
-                    'tipo_chiamata',
-                    'operatore',
-                    'costo_euro',
-                    'codice_contratto',
-                    'codice_servizio',
-                    'cliente_finale_comune',
-                    'prefisso_chiamato'
-                ]
-                
-                data = []
-                with open(file_path, 'r', encoding='cp1252') as f:
-                    for line_num, line in enumerate(f, 1):
-                        line = line.strip()
-                        if line:  # Ignora righe vuote
-                            fields = line.split(';')
-                            
-                            # Assicurati che ci siano abbastanza campi
-                            while len(fields) < len(cdr_headers):
-                                fields.append('')
-                            
-                            # Crea record con conversioni di tipo appropriate
-                            record = {}
-                            for i, header in enumerate(cdr_headers):
-                                if i < len(fields):
-                                    value = fields[i].strip()
-                                    
-                                    # Conversioni di tipo specifiche
-                                    if header == 'durata_secondi':
-                                        try:
-                                            record[header] = int(value) if value else 0
-                                        except ValueError:
-                                            record[header] = 0
-                                    elif header == 'costo_euro':
-                                        try:
-                                            record[header] = float(value.replace(',', '.')) if value else 0.0
-                                        except ValueError:
-                                            record[header] = 0.0
-                                    elif header in ['codice_contratto', 'codice_servizio']:
-                                        try:
-                                            record[header] = int(value) if value else 0
-                                        except ValueError:
-                                            record[header] = 0
-                                    else:
-                                        record[header] = value
-                                else:
-                                    record[header] = ''
-                            
-                            # Aggiungi metadati utili
-                            record['record_number'] = line_num
-                            record['raw_line'] = line
-                            
-                            data.append(record)
-                
-                logger.info(f"File CDR processato: {len(data)} record trovati")
+                # File CDR - stesso parser di file_converter (vettoriale con pyarrow, se installato)
+                data = parse_cdr_file(file_path)
+                if data is None:
+                    return None
             
             elif file_extension == '.csv':
                 # Legge CSV - controlla se è separato da punto e virgola
@@ -510,9 +456,8 @@ class ConvertFILE:
             else:
                 final_data = data
             
-            # Salva il file JSON
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(final_data, f, indent=2, ensure_ascii=False)
+            # Salva il file JSON (serializzazione orjson in un solo passaggio, stesso formato di json.dump indentato)
+            json_path.write_bytes(fast_dumps(final_data, indent=True).encode('utf-8'))
             
             logger.info(f"File convertito in JSON: {json_path}")
             return str(json_path)
@@ -12,6 +12,7 @@ from pathlib import Path
 import pandas as pd
 import json
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 # import logging
 from logger_config import get_logger
 # from exception_handler import handle_exceptions, APIResponse, ExceptionHandler
@@ -20,8 +21,15 @@ from logger_config import get_logger
 # from datetime import datetime
 from flask import render_template, request, jsonify, redirect, url_for, Response
 from utils import extract_data_from_api
+from file_converter import parse_cdr_file
+from json_provider import fast_dumps
 logger = get_logger(__name__)
 
+# Blocco di lettura del canale dati FTP (il default di ftplib è 8KB)
+FTP_DOWNLOAD_BLOCKSIZE = 1024 * 1024
+# Connessioni FTP usate in parallelo per scaricare più file (sovrascrivibile con FTP_PARALLEL_DOWNLOADS)
+FTP_PARALLEL_DOWNLOADS = 4
+
 try:
     from dotenv import load_dotenv
     load_dotenv()  # Carica variabili dal file .env
@@ -176,13 +184,14 @@ class FTPDownloader:
             
         return file_corrispondenti
     
-    def scarica_file(self, nome_file_remoto, cartella_locale="./downloads"):
+    def scarica_file(self, nome_file_remoto, cartella_locale="./downloads", ftp=None):
         """
         Scarica un singolo file dal server FTP
         
         Args:
             nome_file_remoto (str): Nome del file sul server
             cartella_locale (str): Cartella locale dove salvare
+            ftp (ftplib.FTP): Connessione da usare (default la connessione principale)
             
         Returns:
             bool: True se il download è riuscito
@@ -196,7 +205,8 @@ class FTPDownloader:
             
             # Scarica il file
             with open(percorso_locale, 'wb') as file_locale:
-                self.ftp.retrbinary(f'RETR {nome_file_remoto}', file_locale.write)
+                (ftp or self.ftp).retrbinary(f'RETR {nome_file_remoto}', file_locale.write,
+                                             blocksize=FTP_DOWNLOAD_BLOCKSIZE)
             
             print(f"✓ Scaricato: {nome_file_remoto} -> {percorso_locale}")
             return True
@@ -205,6 +215,46 @@ class FTPDownloader:
             print(f"✗ Errore nello scaricare {nome_file_remoto}: {e}")
             return False
     
+    def _scarica_file_in_parallelo(self, file_da_scaricare, directory_ftp, cartella_locale, workers):
+        """
+        Scarica più file su connessioni FTP dedicate (ftplib non è thread-safe: una connessione per thread)
+        
+        Il trasferimento è dominato dalla latenza di rete: più canali dati aperti insieme riducono il tempo totale.
+        
+        Returns:
+            list: Esito (bool) per ogni file, nello stesso ordine di file_da_scaricare
+        """
+        def scarica_blocco(nomi_file):
+            ftp = ftplib.FTP()
+            try:
+                ftp.connect(self.host, self.port)
+                ftp.login(self.username, self.password)
+                ftp.cwd(directory_ftp)
+            except Exception as e:
+                print(f"✗ Connessione FTP aggiuntiva non riuscita, uso la connessione principale: {e}")
+                ftp.close()
+                return None
+            try:
+                return [self.scarica_file(nome_file, cartella_locale, ftp=ftp) for nome_file in nomi_file]
+            finally:
+                try:
+                    ftp.quit()
+                except Exception:
+                    ftp.close()
+        
+        # Ogni connessione scarica una quota dei file (round robin)
+        blocchi = [file_da_scaricare[i::workers] for i in range(workers)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            esiti_blocchi = list(executor.map(scarica_blocco, blocchi))
+        
+        esiti = {}
+        for nomi_file, esiti_blocco in zip(blocchi, esiti_blocchi):
+            if esiti_blocco is None:
+                # Connessione non disponibile: i suoi file passano alla connessione principale
+                esiti_blocco = [self.scarica_file(nome_file, cartella_locale) for nome_file in nomi_file]
+            esiti.update(zip(nomi_file, esiti_blocco))
+        return [esiti[nome_file] for nome_file in file_da_scaricare]
+    
     def scarica_per_template(self, template, directory_ftp="/", cartella_locale="./downloads", data=None, test=None):
         """
         Scarica tutti i file che corrispondono al template
@@ -252,8 +302,15 @@ class FTPDownloader:
         else:
             print(f"\nInizio download di {len(file_da_scaricare)} file...")
             
-            for filename in file_da_scaricare:
-                if self.scarica_file(filename, cartella_locale):
+            workers = min(len(file_da_scaricare),
+                          max(1, int(self.config.get('ftp_parallel_downloads') or FTP_PARALLEL_DOWNLOADS)))
+            if workers > 1:
+                esiti = self._scarica_file_in_parallelo(file_da_scaricare, directory_ftp, cartella_locale, workers)
+            else:
+                esiti = [self.scarica_file(filename, cartella_locale) for filename in file_da_scaricare]
+            
+            for filename, scaricato in zip(file_da_scaricare, esiti):
+                if scaricato:
                     file_scaricati.append(filename)
             
             print(f"\n=== DOWNLOAD COMPLETATO ===")
@@ -551,66 +608,10 @@ class FTPDownloader:
             
             # Controlla se è un file CDR (Call Detail Record) basandosi sul nome o estensione
             if file_extension == '.cdr' or 'CDR' in file_path.name.upper():
-                # File CDR - parsing personalizzato
-                cdr_headers = [
-                    'data_ora_chiamata',
-                    'numero_chiamante', 
-                    'numero_chiamato',
-                    'durata_secondi',
-                    'tipo_chiamata',
-                    'operatore',
-                    'costo_euro',
-                    'codice_contratto',
-                    'codice_servizio',
-                    'cliente_finale_comune',
-                    'prefisso_chiamato'
-                ]
-                
-                data = []
-                with open(file_path, 'r', encoding='cp1252') as f:
-                    for line_num, line in enumerate(f, 1):
-                        line = line.strip()
-                        if line:  # Ignora righe vuote
-                            fields = line.split(';')
-                            
-                            # Assicurati che ci siano abbastanza campi
-                            while len(fields) < len(cdr_headers):
-                                fields.append('')
-                            
-                            # Crea record con conversioni di tipo appropriate
-                            record = {}
-                            for i, header in enumerate(cdr_headers):
-                                if i < len(fields):
-                                    value = fields[i].strip()
-                                    
-                                    # Conversioni di tipo specifiche
-                                    if header == 'durata_secondi':
-                                        try:
-                                            record[header] = int(value) if value else 0
-                                        except ValueError:
-                                            record[header] = 0
-                                    elif header == 'costo_euro':
-                                        try:
-                                            record[header] = float(value.replace(',', '.')) if value else 0.0
-                                        except ValueError:
-                                            record[header] = 0.0
-                                    elif header in ['codice_contratto', 'codice_servizio']:
-                                        try:
-                                            record[header] = int(value) if value else 0
-                                        except ValueError:
-                                            record[header] = 0
-                                    else:
-                                        record[header] = value
-                                else:
-                                    record[header] = ''
-                            
-                            # Aggiungi metadati utili
-                            record['record_number'] = line_num
-                            record['raw_line'] = line
-                            
-                            data.append(record)
-                
-                logger.info(f"File CDR processato: {len(data)} record trovati")
+                # File CDR - stesso parser di file_converter (vettoriale con pyarrow, se installato)
+                data = parse_cdr_file(file_path)
+                if data is None:
+                    return None
             
             elif file_extension == '.csv':
                 # Legge CSV - controlla se è separato da punto e virgola
@@ -697,9 +698,8 @@ class FTPDownloader:
             else:
                 final_data = data
             
-            # Salva il file JSON
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(final_data, f, indent=2, ensure_ascii=False)
+            # Salva il file JSON (serializzazione orjson in un solo passaggio, stesso formato di json.dump indentato)
+            json_path.write_bytes(fast_dumps(final_data, indent=True).encode('utf-8'))
             
             logger.info(f"File convertito in JSON: {json_path}")
             return str(json_path)
@@ -9,7 +9,7 @@ def extract_routes_from_file(file_path):
     Estrae i route da un singolo file.
     Supporta diversi pattern comuni per definire route.
     """
-    routes = []
+    routes = set()
     
     try:
         with open(file_path, 'r', encoding='utf-8') as file:
@@ -41,8 +41,8 @@ def extract_routes_from_file(file_path):
                 route = match.strip()
                 if route and not route.startswith('/'):
                     route = '/' + route
-                if route and route not in routes:
-                    routes.append(route)
+                if route:
+                    routes.add(route)
                     
     except Exception as e:
         print(f"Errore nel leggere il file {file_path}: {e}")
@@ -0,0 +1,93 @@
+"""
+JSON Provider - Serializzazione JSON veloce per Flask basata su orjson
+Se orjson non è installato viene usato il provider standard di Flask
+"""
+
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _orjson_default(obj):
+    """Converte i tipi non gestiti nativamente da orjson"""
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, "__html__"):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def fast_dumps(obj, indent: bool = False) -> str:
+    """Serializza in JSON (UTF-8 non escapato) con orjson, o con json standard se non disponibile"""
+    if orjson is not None:
+        try:
+            option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+            return orjson.dumps(obj, default=_orjson_default, option=option).decode('utf-8')
+        except TypeError:
+            pass
+    # Stessi tipi e stesso ordine delle chiavi del percorso orjson
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False, default=_orjson_default, sort_keys=False)
+
+
+def fast_loads(s):
+    """Decodifica JSON da str/bytes con orjson, o con json standard se non disponibile"""
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Provider JSON che usa orjson per dumps/loads e per le risposte jsonify"""
+
+    def _orjson_option(self, indent: bool = False) -> int:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def _dumps_bytes(self, obj, indent: bool = False) -> bytes:
+        return orjson.dumps(obj, default=_orjson_default, option=self._orjson_option(indent))
+
+    def dumps(self, obj, **kwargs) -> str:
+        # Parametri specifici di json.dumps (indent, cls, ...) restano sul provider standard
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return self._dumps_bytes(obj).decode('utf-8')
+        except TypeError:
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        try:
+            payload = self._dumps_bytes(obj, indent)
+        except TypeError:
+            return super().response(obj)
+
+        return self._app.response_class(payload, mimetype=self.mimetype)
@@ -23,17 +23,17 @@ MENU_ITEMS = [
     },
     ##########################################
     {
-        'endpoint': 'cdr_categories_dashboard',
+        'endpoint': 'cdr_categories.cdr_categories_dashboard',
         'title': 'Dashboard categorie',
         'icon': 'ki-outline ki-element-11',
     },
     {
-        'endpoint': 'cdr_categories_edit',
+        'endpoint': 'cdr_categories.cdr_categories_edit',
         'title': 'Gestione categorie',
         'icon': 'ki-outline ki-notepad-edit ',
     },
         {
-        'endpoint': 'cdr_categories_page_new',
+        'endpoint': 'cdr_categories.cdr_categories_page_new',
         'title': 'Modifica categorie NEW',
         'icon': 'ki-outline ki-notepad-edit ',
     },
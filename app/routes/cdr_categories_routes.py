@@ -3,899 +3,1377 @@ Categories Routes - Route Flask per gestione categorie CDR con markup personaliz
 Aggiornato per utilizzare il sistema unificato cdr_categories_enhanced.py
 """
 
-import json
+import csv
+import gzip
+import hashlib
+import io
 import logging
 from datetime import datetime
+import operator
 import os
-from flask import request, jsonify, render_template, Response
+import re
+import time
+from types import MappingProxyType
+from flask import Blueprint, current_app, request, jsonify, render_template, make_response, Response, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
 from cdr_categories_enhanced import CDRAnalyticsEnhanced    
-import csv
-import io
+from json_provider import fast_dumps
+
+# Parser CSV multithread di pyarrow per gli import grandi (opzionale)
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+    pacsv = None
 
 logger = logging.getLogger(__name__)
 
+# Blueprint definito una sola volta all'import: le dipendenze sono in app.extensions['cdr_categories']
+categories_bp = Blueprint('cdr_categories', __name__)
+
+# Dimensione massima dei payload JSON accettati dalle API categorie
+MAX_CATEGORY_PAYLOAD_BYTES = 64 * 1024
+MAX_IMPORT_PAYLOAD_BYTES = 5 * 1024 * 1024
+# Righe massime accettate dall'import CSV (limita anche i file gzip molto compressi)
+MAX_IMPORT_ROWS = 100000
+# Oltre questa dimensione dell'upload l'import CSV usa pyarrow, se installato
+CSV_ARROW_MIN_BYTES = 1024 * 1024
+CSV_ARROW_BLOCK_SIZE = 8 * 1024 * 1024  # Blocco di lettura del parser pyarrow
+# Errori di riga riportati al massimo nella risposta dell'import CSV (gli altri sono solo contati)
+MAX_IMPORT_ERRORS = 100
+
+# Durata massima (secondi) dello snapshot di /api/categories/health: intercetta le modifiche al file
+HEALTH_CACHE_TTL = 5.0
+
+
+# Timestamp per i nomi file di export, formattato al massimo una volta al secondo
+_filename_ts_second = 0
+_filename_ts_value = ''
+
+
+def _filename_timestamp():
+    """Timestamp YYYYmmdd_HHMMSS per i nomi file di export (in cache per secondo)"""
+    global _filename_ts_second, _filename_ts_value
+    now = int(time.time())
+    if now != _filename_ts_second:
+        _filename_ts_value = time.strftime("%Y%m%d_%H%M%S", time.localtime(now))
+        _filename_ts_second = now
+    return _filename_ts_value
+
+
+def _csv_field(value):
+    """Formatta un campo CSV con le stesse regole di quoting minimo di csv.writer"""
+    if value is None:
+        return ''
+    text = str(value)
+    if ',' in text or '"' in text or '\n' in text or '\r' in text:
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def _csv_row(values):
+    """Riga CSV completa (terminatore CRLF come csv.writer) costruita con un solo join"""
+    return ','.join(map(_csv_field, values)) + '\r\n'
 
-def add_cdr_categories_routes(app, secure_config):
+
+# Header dell'export CSV già formattato e lettura di tutti i campi di una categoria con una sola chiamata
+_CSV_EXPORT_HEADER = _csv_row((
+    'Nome', 'Nome Visualizzato', 'Prezzo Base', 'Markup Personalizzato',
+    'Prezzo Finale', 'Valuta', 'Pattern (separati da ;)', 'Descrizione',
+    'Attiva', 'Data Creazione', 'Ultima Modifica'
+))
+_CSV_EXPORT_FIELDS = operator.attrgetter(
+    'name', 'display_name', 'price_per_minute', 'custom_markup_percent',
+    'price_with_markup', 'currency', 'patterns', 'description',
+    'is_active', 'created_at', 'updated_at'
+)
+
+
+# Intestazioni CSV accettate in import (export delle route e del manager) -> campo categoria
+_CSV_IMPORT_COLUMNS = {
+    'Nome': 'name', 'Name': 'name',
+    'Nome Visualizzato': 'display_name', 'Display Name': 'display_name',
+    'Prezzo Base': 'price_per_minute', 'Price per Minute': 'price_per_minute',
+    'Markup Personalizzato': 'custom_markup_percent', 'Custom Markup %': 'custom_markup_percent',
+    'Valuta': 'currency', 'Currency': 'currency',
+    'Pattern (separati da ;)': 'patterns', 'Patterns': 'patterns',
+    'Descrizione': 'description', 'Description': 'description',
+    'Attiva': 'is_active', 'Active': 'is_active',
+}
+_CSV_IMPORT_FIELDS = (
+    'name', 'display_name', 'price_per_minute', 'custom_markup_percent',
+    'currency', 'patterns', 'description', 'is_active'
+)
+_CSV_TRUE_VALUES = frozenset(('sì', 'si', 's', 'yes', 'y', 'true', '1'))
+_CSV_FALSE_VALUES = frozenset(('no', 'n', 'false', '0'))
+_CSV_GLOBAL_MARKUP_VALUES = frozenset(('', 'globale', 'global'))
+_CURRENCY_RE = re.compile(r'^[A-Z]{3}$')
+
+
+def _csv_import_getter(header):
     """
-    Aggiunge le route per la gestione delle categorie CDR con markup
+    Prepara l'estrazione dei campi per le righe dell'import CSV a partire dall'intestazione
     
-    Args:
-        app: Istanza Flask
-        cdr_analytics_enhanced: Istanza CDRAnalyticsEnhanced con categories_manager
-        secure_config: Configurazione sicura per markup globale
+    Restituisce un operator.itemgetter sulle posizioni delle colonne in _CSV_IMPORT_FIELDS:
+    le colonne assenti puntano all'ultimo elemento, una stringa vuota aggiunta ad ogni riga.
+    """
+    positions = {}
+    for index, column in enumerate(header):
+        column = column.strip()
+        positions.setdefault(_CSV_IMPORT_COLUMNS.get(column, column), index)
+    
+    if 'name' not in positions:
+        raise ValueError('colonna Nome mancante')
+    
+    return operator.itemgetter(*(positions.get(field, -1) for field in _CSV_IMPORT_FIELDS))
+
+
+def _parse_csv_category_row(fields):
     """
-    # categories_manager = cdr_analytics_enhanced.get_categories_manager()
-    out_directory = secure_config.get_config()['config_directory']
-    analytics = CDRAnalyticsEnhanced(output_directory=out_directory)
-    categories_manager = analytics.get_categories_manager()
+    Converte e valida i campi di una riga CSV (ordine di _CSV_IMPORT_FIELDS) per bulk_upsert,
+    solleva ValueError se non valida
     
-    @app.route('/cdr_categories_new')
-    def cdr_categories_page_new():
-        """Pagina principale gestione categorie con info configurazione e markup"""
+    Le righe scartate qui non arrivano al manager: nessuna copia o modifica in memoria per dati sporchi.
+    """
+    (name, display_name, price_raw, markup_raw, currency,
+     patterns_raw, description, is_active_raw) = map(str.strip, fields)
+    
+    if not name:
+        raise ValueError('nome categoria mancante')
+    
+    try:
+        price = float(price_raw.replace(',', '.'))
+    except ValueError:
+        raise ValueError(f"prezzo non valido '{price_raw}'")
+    if not price >= 0:
+        raise ValueError('il prezzo deve essere positivo')
+    
+    if markup_raw.lower() in _CSV_GLOBAL_MARKUP_VALUES:
+        custom_markup = None
+    else:
         try:
-            from routes.menu_routes import render_with_menu_context
-            
-            categories = categories_manager.get_all_categories_with_pricing()
-            stats = categories_manager.get_statistics()
-            conflicts = categories_manager.validate_patterns_conflicts()
-            
+            custom_markup = float(markup_raw.rstrip('%').replace(',', '.'))
+        except ValueError:
+            raise ValueError(f"markup non valido '{markup_raw}'")
+        if not -100 <= custom_markup <= 1000:
+            raise ValueError('markup fuori intervallo (da -100% a 1000%)')
+    
+    patterns = [pattern for pattern in map(str.strip, patterns_raw.split(';')) if pattern]
+    if not patterns:
+        raise ValueError('almeno un pattern è obbligatorio')
+    
+    currency = (currency or 'EUR').upper()
+    if not _CURRENCY_RE.match(currency):
+        raise ValueError(f"valuta non valida '{currency}'")
+    
+    return {
+        'name': name,
+        'display_name': display_name or name,
+        'price_per_minute': price,
+        'patterns': patterns,
+        'currency': currency,
+        'description': description,
+        'custom_markup_percent': custom_markup,
+        'is_active': (is_active_raw or 'sì').lower() in _CSV_TRUE_VALUES,
+    }
+
+
+def _open_csv_upload(file):
+    """Stream binario dell'upload CSV, decompresso al volo se il file è gzip (es. categorie.csv.gz)"""
+    stream = file.stream
+    magic = stream.read(2)
+    stream.seek(0)
+    if magic == b'\x1f\x8b':
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    return stream
+
+
+def _read_csv_upload_arrow(stream, max_rows):
+    """
+    Legge l'upload CSV con il parser multithread di pyarrow, tutte le colonne come testo
+    
+    Restituisce un iteratore di righe (liste di stringhe, intestazione compresa) come csv.reader;
+    la lettura si ferma oltre max_rows righe. Il file viene letto per intero prima di restituire
+    le righe: solleva pa.ArrowException (o UnicodeDecodeError) se non è leggibile, ad esempio per
+    righe con un numero di colonne diverso dall'intestazione, gestite invece da csv.reader.
+    Le righe vuote diventano righe di campi vuoti, scartate dall'import come quelle di csv.reader.
+    """
+    header = next(csv.reader([stream.readline().decode('utf-8-sig')]), None)
+    if not header:
+        return iter(())
+    
+    column_names = [f'c{index}' for index in range(len(header))]
+    reader = pacsv.open_csv(
+        stream,
+        read_options=pacsv.ReadOptions(block_size=CSV_ARROW_BLOCK_SIZE, column_names=column_names),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True, ignore_empty_lines=False),
+        convert_options=pacsv.ConvertOptions(column_types=dict.fromkeys(column_names, pa.string()))
+    )
+    batches = []
+    row_count = 0
+    for batch in reader:
+        batches.append(batch)
+        row_count += batch.num_rows
+        if row_count > max_rows:
+            break
+    
+    def iter_rows():
+        yield header
+        for batch in batches:
+            for row in zip(*(column.to_pylist() for column in batch.columns)):
+                yield list(row)
+    
+    return iter_rows()
+
+
+def _parse_is_active(value):
+    """Converte il campo is_active dei payload JSON in bool, solleva ValueError se non è un booleano"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in _CSV_TRUE_VALUES:
+            return True
+        if text in _CSV_FALSE_VALUES:
+            return False
+    raise ValueError(f"Valore is_active non valido '{value}'")
+
+
+def _payload_too_large(max_bytes):
+    """Verifica la dimensione dichiarata del body prima di decodificare il JSON"""
+    content_length = request.content_length
+    return content_length is not None and content_length > max_bytes
+
+
+def _config_file_info(path):
+    """Ricava esistenza, dimensione e permessi del file di configurazione con una sola stat"""
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        # Solo un file mancante è "non esistente": altri errori (es. permessi sulla directory) vengono propagati
+        return {'exists': False, 'size': 0, 'readable': False, 'writable': False, 'mtime': None}
+    
+    return {
+        'exists': True,
+        'size': st.st_size,
+        # Accesso effettivo del processo (utente, gruppo, root, mount in sola lettura), non i bit del proprietario
+        'readable': os.access(path, os.R_OK),
+        'writable': os.access(path, os.W_OK),
+        'mtime': st.st_mtime
+    }
+
+
+def _extension_state():
+    """Dipendenze registrate da add_cdr_categories_routes sull'app corrente"""
+    return current_app.extensions['cdr_categories']
+
+
+def _categories_manager():
+    categories_manager = _extension_state()['categories_manager']
+    # Con più worker WSGI il file può essere stato modificato da un altro processo
+    categories_manager.reload_if_changed()
+    return categories_manager
+
+
+def _cached_json_response(key, builder):
+    """Risposta JSON serializzata una sola volta per versione delle categorie, con ETag e 304"""
+    categories_manager = _categories_manager()
+    return _conditional_response(lambda: Response(
+        categories_manager.cached_projection(('response', key), lambda: current_app.json.dumps(builder())),
+        mimetype='application/json'
+    ))
+
+
+def _conditional_response(builder):
+    """Restituisce 304 se il client ha già la versione corrente delle categorie"""
+    etag = _categories_manager().etag
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = builder()
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def _render_page_if_modified(template_name, build_context):
+    """
+    Renderizza la pagina solo se il browser non ha già la versione corrente (ETag / 304)
+    
+    La pagina mostra categorie e configurazione (prezzi VoIP, markup, stato del file categorie):
+    l'ETag combina la versione delle categorie con un hash di config_info, passato poi a build_context.
+    Niente Last-Modified: al secondo non distinguerebbe due modifiche ravvicinate.
+    """
+    from routes.menu_routes import render_with_menu_context
+    
+    categories_manager = _categories_manager()
+    config_info = _build_config_info()
+    config_digest = hashlib.sha1(fast_dumps(config_info).encode('utf-8')).hexdigest()[:16]
+    etag = f"{categories_manager.etag}-{config_digest}"
+    
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(render_with_menu_context(template_name, build_context(config_info)))
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, must-revalidate'
+    return response
+
+
+def _build_config_info():
+    """Info configurazione e markup per le pagine categorie (una sola lettura della config)"""
+    state = _extension_state()
+    categories_manager = state['categories_manager']
+    # La configurazione può cambiare a runtime (markup/prezzi VoIP): letta una volta per richiesta
+    config = state['secure_config'].get_config()
+    file_info = _config_file_info(categories_manager.config_file)
+    
+    return {
+        'config_directory': config['config_directory'],
+        'config_file_name': config['categories_config_file'],
+        'config_file_path': str(categories_manager.config_file),
+        'config_exists': file_info['exists'],
+        'config_size_bytes': file_info['size'],
+        'config_readable': file_info['readable'],
+        'config_writable': file_info['writable'],
+        'config_mtime': file_info['mtime'],
+        # Nuove info markup
+        'global_markup_percent': categories_manager.global_markup_percent,
+        'voip_config': {
+            'base_fixed': config.get('voip_price_fixed', 0.02),
+            'base_mobile': config.get('voip_price_mobile', 0.15),
+            'global_markup': config.get('voip_markup_percent', 0.0),
+            'currency': config.get('voip_currency', 'EUR')
+        }
+    }
+
+
+@categories_bp.route('/cdr_categories_new')
+def cdr_categories_page_new():
+    """Pagina principale gestione categorie con info configurazione e markup"""
+    categories_manager = _categories_manager()
+    try:
+        # Il contesto viene calcolato solo se la pagina va effettivamente renderizzata
+        return _render_page_if_modified('categoriesNEW.html', lambda config_info: {
+            'categories': categories_manager.get_all_categories_with_pricing(),
+            'stats': categories_manager.get_statistics(),
+            'conflicts': categories_manager.validate_patterns_conflicts(),
             # Info configurazione da .env incluso markup
-            config_info = {
-                'config_directory': secure_config.get_config()['config_directory'],
-                'config_file_name': secure_config.get_config()['categories_config_file'],
-                'config_file_path': str(categories_manager.config_file),
-                'config_exists': categories_manager.config_file.exists(),
-                'config_size_bytes': categories_manager.config_file.stat().st_size if categories_manager.config_file.exists() else 0,
-                'config_readable': os.access(categories_manager.config_file, os.R_OK) if categories_manager.config_file.exists() else False,
-                'config_writable': os.access(categories_manager.config_file, os.W_OK) if categories_manager.config_file.exists() else False,
-                # Nuove info markup
-                'global_markup_percent': categories_manager.global_markup_percent,
-                'voip_config': {
-                    'base_fixed': secure_config.get_config().get('voip_price_fixed', 0.02),
-                    'base_mobile': secure_config.get_config().get('voip_price_mobile', 0.15),
-                    'global_markup': secure_config.get_config().get('voip_markup_percent', 0.0),
-                    'currency': secure_config.get_config().get('voip_currency', 'EUR')
-                }
-            }
-            
-            return render_with_menu_context('categoriesNEW.html', {
-                'categories': categories,
-                'stats': stats,
-                'conflicts': conflicts,
-                'config_info': config_info
-            })
-        except Exception as e:
-            logger.error(f"Errore caricamento pagina categorie: {e}")
-            return render_template('error.html', 
-                                 error_message=f"Errore caricamento categorie: {e}")
-
-    @app.route('/cdr_categories_edit')
-    def cdr_categories_edit():
-        """Pagina principale gestione categorie con info configurazione e markup"""
-        try:
-            from routes.menu_routes import render_with_menu_context
-            
-            categories = categories_manager.get_all_categories_with_pricing()
-            stats = categories_manager.get_statistics()
-            conflicts = categories_manager.validate_patterns_conflicts()
-            
+            'config_info': config_info
+        })
+    except Exception as e:
+        logger.error(f"Errore caricamento pagina categorie: {e}")
+        return render_template('error.html', 
+                             error_message=f"Errore caricamento categorie: {e}")
+
+@categories_bp.route('/cdr_categories_edit')
+def cdr_categories_edit():
+    """Pagina principale gestione categorie con info configurazione e markup"""
+    categories_manager = _categories_manager()
+    try:
+        # Il contesto viene calcolato solo se la pagina va effettivamente renderizzata
+        return _render_page_if_modified('categories.html', lambda config_info: {
+            'categories': categories_manager.get_all_categories_with_pricing(),
+            'stats': categories_manager.get_statistics(),
+            'conflicts': categories_manager.validate_patterns_conflicts(),
             # Info configurazione da .env incluso markup
-            config_info = {
-                'config_directory': secure_config.get_config()['config_directory'],
-                'config_file_name': secure_config.get_config()['categories_config_file'],
-                'config_file_path': str(categories_manager.config_file),
-                'config_exists': categories_manager.config_file.exists(),
-                'config_size_bytes': categories_manager.config_file.stat().st_size if categories_manager.config_file.exists() else 0,
-                'config_readable': os.access(categories_manager.config_file, os.R_OK) if categories_manager.config_file.exists() else False,
-                'config_writable': os.access(categories_manager.config_file, os.W_OK) if categories_manager.config_file.exists() else False,
-                # Nuove info markup
-                'global_markup_percent': categories_manager.global_markup_percent,
-                'voip_config': {
-                    'base_fixed': secure_config.get_config().get('voip_price_fixed', 0.02),
-                    'base_mobile': secure_config.get_config().get('voip_price_mobile', 0.15),
-                    'global_markup': secure_config.get_config().get('voip_markup_percent', 0.0),
-                    'currency': secure_config.get_config().get('voip_currency', 'EUR')
-                }
-            }
+            'config_info': config_info
+        })
+    except Exception as e:
+        logger.error(f"Errore caricamento pagina categorie: {e}")
+        return render_template('error.html', 
+                             error_message=f"Errore caricamento categorie: {e}")
+
+@categories_bp.route('/api/categories', methods=['GET'])
+def get_categories():
+    """API per ottenere tutte le categorie con informazioni pricing"""
+    categories_manager = _categories_manager()
+    try:
+        return _cached_json_response('categories', lambda: {
+            'success': True,
+            'categories': categories_manager.get_all_categories_with_pricing(),
+            'stats': categories_manager.get_statistics(),
+            'global_markup_percent': categories_manager.global_markup_percent
+        })
+        
+    except Exception as e:
+        logger.error(f"Errore API get categories: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@categories_bp.route('/api/categories', methods=['POST'])
+def create_category():
+    """API per creare una nuova categoria con markup personalizzabile"""
+    categories_manager = _categories_manager()
+    try:
+        if _payload_too_large(MAX_CATEGORY_PAYLOAD_BYTES):
+            return jsonify({'success': False, 'message': 'Payload troppo grande'}), 413
+        
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data, dict):
+            return jsonify({'success': False, 'message': 'Dati non validi'}), 400
+        
+        # Validazione dati richiesti
+        required_fields = ['name', 'display_name', 'price_per_minute', 'patterns']
+        for field in required_fields:
+            if field not in data or not data[field]:
+                return jsonify({'success': False, 'message': f'Campo {field} obbligatorio'}), 400
+        
+        # Validazione struttura
+        if not isinstance(data['name'], str) or not isinstance(data['display_name'], str):
+            return jsonify({'success': False, 'message': 'Nome e nome visualizzato devono essere stringhe'}), 400
+        if not isinstance(data['patterns'], list) or not all(isinstance(p, str) for p in data['patterns']):
+            return jsonify({'success': False, 'message': 'Il campo patterns deve essere una lista di stringhe'}), 400
+        
+        # Estrai dati
+        name = data['name'].strip().upper()
+        display_name = data['display_name'].strip()
+        price_per_minute = float(data['price_per_minute'])
+        patterns = [p.strip() for p in data['patterns'] if p.strip()]
+        currency = data.get('currency', 'EUR')
+        description = data.get('description', '').strip()
+        
+        # Gestione markup personalizzato
+        custom_markup_percent = None
+        if 'custom_markup_percent' in data and data['custom_markup_percent'] not in [None, '', 'null']:
+            try:
+                custom_markup_percent = float(data['custom_markup_percent'])
+                if custom_markup_percent < -100:
+                    return jsonify({'success': False, 'message': 'Markup non può essere inferiore a -100%'}), 400
+                if custom_markup_percent > 1000:
+                    return jsonify({'success': False, 'message': 'Markup troppo alto (massimo 1000%)'}), 400
+            except (ValueError, TypeError):
+                return jsonify({'success': False, 'message': 'Valore markup non valido'}), 400
+        
+        # Validazioni aggiuntive
+        if price_per_minute < 0:
+            return jsonify({'success': False, 'message': 'Il prezzo deve essere positivo'}), 400
+        
+        if not patterns:
+            return jsonify({'success': False, 'message': 'Almeno un pattern è obbligatorio'}), 400
+        
+        # Crea categoria con markup
+        success = categories_manager.add_category(
+            name=name,
+            display_name=display_name,
+            price_per_minute=price_per_minute,
+            patterns=patterns,
+            currency=currency,
+            description=description,
+            custom_markup_percent=custom_markup_percent,
+            is_active=_parse_is_active(data.get('is_active', True))
+        )
+        
+        if success:
+            logger.info(f"Categoria {name} creata con successo")
+            # Restituisci info pricing complete
+            category_data = categories_manager.get_category_with_pricing(name)
             
-            return render_with_menu_context('categories.html', {
-                'categories': categories,
-                'stats': stats,
-                'conflicts': conflicts,
-                'config_info': config_info
+            return jsonify({
+                'success': True,
+                'message': f'Categoria {name} creata con successo',
+                'category_name': name,
+                'category_data': category_data
             })
-        except Exception as e:
-            logger.error(f"Errore caricamento pagina categorie: {e}")
-            return render_template('error.html', 
-                                 error_message=f"Errore caricamento categorie: {e}")
+        else:
+            return jsonify({'success': False, 'message': 'Errore nella creazione della categoria'}), 500
+            
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Errore API create category: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
     
-    @app.route('/api/categories', methods=['GET'])
-    def get_categories():
-        """API per ottenere tutte le categorie con informazioni pricing"""
-        try:
-            categories_data = categories_manager.get_all_categories_with_pricing()
-            
+@categories_bp.route('/api/categories/<category_name>', methods=['GET'])
+def get_category(category_name):
+    """API per ottenere una categoria specifica con pricing"""
+    categories_manager = _categories_manager()
+    try:
+        category_data = categories_manager.get_category_with_pricing(category_name)
+        
+        if not category_data:
+            return jsonify({'success': False, 'message': 'Categoria non trovata'}), 404
+        
+        def build_response():
+            # Dati categoria con pricing info (dalla proiezione in cache del manager)
             return jsonify({
                 'success': True,
-                'categories': categories_data,
-                'stats': categories_manager.get_statistics(),
-                'global_markup_percent': categories_manager.global_markup_percent
+                'category': category_data
             })
-            
-        except Exception as e:
-            logger.error(f"Errore API get categories: {e}")
-            return jsonify({'success': False, 'message': str(e)}), 500
-    
-    @app.route('/api/categories', methods=['POST'])
-    def create_category():
-        """API per creare una nuova categoria con markup personalizzabile"""
-        try:
-            data = request.get_json()
-            if not data:
-                return jsonify({'success': False, 'message': 'Dati non validi'}), 400
-            
-            # Validazione dati richiesti
-            required_fields = ['name', 'display_name', 'price_per_minute', 'patterns']
-            for field in required_fields:
-                if field not in data or not data[field]:
-                    return jsonify({'success': False, 'message': f'Campo {field} obbligatorio'}), 400
-            
-            # Estrai dati
-            name = data['name'].strip().upper()
-            display_name = data['display_name'].strip()
-            price_per_minute = float(data['price_per_minute'])
+        
+        return _conditional_response(build_response)
+        
+    except Exception as e:
+        logger.error(f"Errore API get category {category_name}: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@categories_bp.route('/api/categories/<category_name>', methods=['PUT'])
+def update_category(category_name):
+    """API per aggiornare una categoria esistente con supporto markup"""
+    categories_manager = _categories_manager()
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'message': 'Dati non validi'}), 400
+        
+        # Prepara aggiornamenti
+        updates = {}
+        
+        if 'display_name' in data:
+            updates['display_name'] = data['display_name'].strip()
+        
+        if 'price_per_minute' in data:
+            price = float(data['price_per_minute'])
+            if price < 0:
+                return jsonify({'success': False, 'message': 'Il prezzo deve essere positivo'}), 400
+            updates['price_per_minute'] = price
+        
+        if 'patterns' in data:
             patterns = [p.strip() for p in data['patterns'] if p.strip()]
-            currency = data.get('currency', 'EUR')
-            description = data.get('description', '').strip()
+            if not patterns:
+                return jsonify({'success': False, 'message': 'Almeno un pattern è obbligatorio'}), 400
+            updates['patterns'] = patterns
+        
+        if 'currency' in data:
+            updates['currency'] = data['currency']
+        
+        if 'description' in data:
+            updates['description'] = data['description'].strip()
+        
+        if 'is_active' in data:
+            updates['is_active'] = _parse_is_active(data['is_active'])
+        
+        # Gestione aggiornamento markup personalizzato
+        if 'custom_markup_percent' in data:
+            markup_value = data['custom_markup_percent']
             
-            # Gestione markup personalizzato
-            custom_markup_percent = None
-            if 'custom_markup_percent' in data and data['custom_markup_percent'] not in [None, '', 'null']:
+            if markup_value in [None, '', 'null', 'reset']:
+                # Reset a markup globale
+                updates['custom_markup_percent'] = None
+            else:
                 try:
-                    custom_markup_percent = float(data['custom_markup_percent'])
-                    if custom_markup_percent < -100:
+                    custom_markup = float(markup_value)
+                    if custom_markup < -100:
                         return jsonify({'success': False, 'message': 'Markup non può essere inferiore a -100%'}), 400
-                    if custom_markup_percent > 1000:
+                    if custom_markup > 1000:
                         return jsonify({'success': False, 'message': 'Markup troppo alto (massimo 1000%)'}), 400
+                    updates['custom_markup_percent'] = custom_markup
                 except (ValueError, TypeError):
                     return jsonify({'success': False, 'message': 'Valore markup non valido'}), 400
-            
-            # Validazioni aggiuntive
-            if price_per_minute < 0:
-                return jsonify({'success': False, 'message': 'Il prezzo deve essere positivo'}), 400
-            
-            if not patterns:
-                return jsonify({'success': False, 'message': 'Almeno un pattern è obbligatorio'}), 400
-            
-            # Crea categoria con markup
-            success = categories_manager.add_category(
-                name=name,
-                display_name=display_name,
-                price_per_minute=price_per_minute,
-                patterns=patterns,
-                currency=currency,
-                description=description,
-                custom_markup_percent=custom_markup_percent
-            )
-            
-            if success:
-                logger.info(f"Categoria {name} creata con successo")
-                # Restituisci info pricing complete
-                new_category = categories_manager.get_category(name)
-                from dataclasses import asdict
-                category_data = asdict(new_category)
-                category_data['pricing_info'] = new_category.get_pricing_info(categories_manager.global_markup_percent)
-                
-                return jsonify({
-                    'success': True,
-                    'message': f'Categoria {name} creata con successo',
-                    'category_name': name,
-                    'category_data': category_data
-                })
-            else:
-                return jsonify({'success': False, 'message': 'Errore nella creazione della categoria'}), 500
-                
-        except ValueError as e:
-            return jsonify({'success': False, 'message': str(e)}), 400
-        except Exception as e:
-            logger.error(f"Errore API create category: {e}")
-            return jsonify({'success': False, 'message': str(e)}), 500
-        
-    @app.route('/api/categories/<category_name>', methods=['GET'])
-    def get_category(category_name):
-        """API per ottenere una categoria specifica con pricing"""
-        try:
-            category = categories_manager.get_category(category_name)
-            
-            if not category:
-                return jsonify({'success': False, 'message': 'Categoria non trovata'}), 404
-            
-            # Costruisce dati categoria con pricing info
-            from dataclasses import asdict
-            category_data = asdict(category)
-            category_data['pricing_info'] = category.get_pricing_info(categories_manager.global_markup_percent)
+        
+        # Aggiorna categoria
+        success = categories_manager.update_category(category_name, **updates)
+        
+        if success:
+            logger.info(f"Categoria {category_name} aggiornata con successo")
+            # Restituisci dati aggiornati con pricing
+            category_data = categories_manager.get_category_with_pricing(category_name)
             
             return jsonify({
                 'success': True,
-                'category': category_data
+                'message': f'Categoria {category_name} aggiornata con successo',
+                'category_data': category_data
             })
-            
-        except Exception as e:
-            logger.error(f"Errore API get category {category_name}: {e}")
-            return jsonify({'success': False, 'message': str(e)}), 500
-    
-    @app.route('/api/categories/<category_name>', methods=['PUT'])
-    def update_category(category_name):
-        """API per aggiornare una categoria esistente con supporto markup"""
+        elif categories_manager.get_category(category_name) is None:
+            # Esistenza verificata solo in caso di errore
+            return jsonify({'success': False, 'message': 'Categoria non trovata'}), 404
+        else:
+            return jsonify({'success': False, 'message': 'Errore nell\'aggiornamento della categoria'}), 500
+            
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Errore API update category {category_name}: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@categories_bp.route('/api/categories/<category_name>', methods=['DELETE'])
+def delete_category(category_name):
+    """API per eliminare una categoria"""
+    categories_manager = _categories_manager()
+    try:
+        # Elimina categoria
+        success = categories_manager.delete_category(category_name)
+        
+        if success:
+            logger.info(f"Categoria {category_name} eliminata con successo")
+            return jsonify({
+                'success': True,
+                'message': f'Categoria {category_name} eliminata con successo'
+            })
+        elif categories_manager.get_category(category_name) is None:
+            # Esistenza verificata solo in caso di errore
+            return jsonify({'success': False, 'message': 'Categoria non trovata'}), 404
+        else:
+            return jsonify({'success': False, 'message': 'Errore nell\'eliminazione della categoria'}), 500
+            
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Errore API delete category {category_name}: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@categories_bp.route('/api/categories/global-markup', methods=['POST'])
+def update_global_markup():
+    """API per aggiornare il markup globale e ricalcolare tutti i prezzi"""
+    categories_manager = _categories_manager()
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'message': 'Dati non validi'}), 400
+        
+        if 'global_markup_percent' not in data:
+            return jsonify({'success': False, 'message': 'Campo global_markup_percent obbligatorio'}), 400
+        
         try:
-            data = request.get_json()
-            if not data:
-                return jsonify({'success': False, 'message': 'Dati non validi'}), 400
-            
-            # Verifica esistenza categoria
-            if not categories_manager.get_category(category_name):
-                return jsonify({'success': False, 'message': 'Categoria non trovata'}), 404
-            
-            # Prepara aggiornamenti
-            updates = {}
-            
-            if 'display_name' in data:
-                updates['display_name'] = data['display_name'].strip()
-            
-            if 'price_per_minute' in data:
-                price = float(data['price_per_minute'])
-                if price < 0:
-                    return jsonify({'success': False, 'message': 'Il prezzo deve essere positivo'}), 400
-                updates['price_per_minute'] = price
-            
-            if 'patterns' in data:
-                patterns = [p.strip() for p in data['patterns'] if p.strip()]
-                if not patterns:
-                    return jsonify({'success': False, 'message': 'Almeno un pattern è obbligatorio'}), 400
-                updates['patterns'] = patterns
-            
-            if 'currency' in data:
-                updates['currency'] = data['currency']
-            
-            if 'description' in data:
-                updates['description'] = data['description'].strip()
-            
-            if 'is_active' in data:
-                updates['is_active'] = bool(data['is_active'])
+            new_markup = float(data['global_markup_percent'])
+            if new_markup < -100:
+                return jsonify({'success': False, 'message': 'Markup globale non può essere inferiore a -100%'}), 400
+            if new_markup > 1000:
+                return jsonify({'success': False, 'message': 'Markup globale troppo alto (massimo 1000%)'}), 400
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'message': 'Valore markup globale non valido'}), 400
+        
+        # Aggiorna markup globale
+        success = categories_manager.update_global_markup(new_markup)
+        
+        if success:
+            # Opzionale: aggiorna anche la configurazione .env
+            update_env_config = data.get('update_env_config', False)
+            if update_env_config:
+                try:
+                    secure_config = _extension_state()['secure_config']
+                    secure_config.update_config({'voip_markup_percent': new_markup})
+                    from config import save_config_to_env
+                    save_config_to_env(secure_config, current_app.secret_key)
+                    logger.info(f"Markup globale aggiornato anche nel file .env: {new_markup}%")
+                except Exception as e:
+                    logger.warning(f"Errore aggiornamento .env: {e}")
             
-            # Gestione aggiornamento markup personalizzato
-            if 'custom_markup_percent' in data:
-                markup_value = data['custom_markup_percent']
-                
-                if markup_value in [None, '', 'null', 'reset']:
-                    # Reset a markup globale
-                    updates['custom_markup_percent'] = None
-                else:
-                    try:
-                        custom_markup = float(markup_value)
-                        if custom_markup < -100:
-                            return jsonify({'success': False, 'message': 'Markup non può essere inferiore a -100%'}), 400
-                        if custom_markup > 1000:
-                            return jsonify({'success': False, 'message': 'Markup troppo alto (massimo 1000%)'}), 400
-                        updates['custom_markup_percent'] = custom_markup
-                    except (ValueError, TypeError):
-                        return jsonify({'success': False, 'message': 'Valore markup non valido'}), 400
+            # Restituisci statistiche aggiornate
+            updated_stats = categories_manager.get_statistics()
+            affected_categories = [
+                name for name, cat in categories_manager.get_all_categories().items() 
+                if cat.custom_markup_percent is None
+            ]
             
-            # Aggiorna categoria
-            success = categories_manager.update_category(category_name, **updates)
+            return jsonify({
+                'success': True,
+                'message': f'Markup globale aggiornato a {new_markup}%',
+                'global_markup_percent': new_markup,
+                'affected_categories': affected_categories,
+                'stats': updated_stats
+            })
+        else:
+            return jsonify({'success': False, 'message': 'Errore nell\'aggiornamento del markup globale'}), 500
             
-            if success:
-                logger.info(f"Categoria {category_name} aggiornata con successo")
-                # Restituisci dati aggiornati con pricing
-                updated_category = categories_manager.get_category(category_name)
-                from dataclasses import asdict
-                category_data = asdict(updated_category)
-                category_data['pricing_info'] = updated_category.get_pricing_info(categories_manager.global_markup_percent)
+    except Exception as e:
+        logger.error(f"Errore API update global markup: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@categories_bp.route('/api/categories/pricing-preview', methods=['POST'])
+def pricing_preview():
+    """API per anteprima calcolo prezzi con markup diversi"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'message': 'Dati non validi'}), 400
+        
+        base_price = float(data.get('base_price', 0))
+        markup_scenarios = data.get('markup_scenarios', [0, 10, 20, 30])
+        duration_minutes = int(data.get('duration_minutes', 5))
+        
+        if base_price < 0:
+            return jsonify({'success': False, 'message': 'Prezzo base deve essere positivo'}), 400
+        
+        preview_results = []
+        
+        for markup_percent in markup_scenarios:
+            try:
+                markup_multiplier = 1 + (float(markup_percent) / 100)
+                final_price = round(base_price * markup_multiplier, 4)
+                total_cost = round(final_price * duration_minutes, 4)
+                markup_amount = round(final_price - base_price, 4)
                 
-                return jsonify({
-                    'success': True,
-                    'message': f'Categoria {category_name} aggiornata con successo',
-                    'category_data': category_data
+                preview_results.append({
+                    'markup_percent': markup_percent,
+                    'base_price': base_price,
+                    'markup_amount': markup_amount,
+                    'final_price': final_price,
+                    'total_cost_example': total_cost,
+                    'duration_minutes': duration_minutes
                 })
-            else:
-                return jsonify({'success': False, 'message': 'Errore nell\'aggiornamento della categoria'}), 500
-                
-        except ValueError as e:
-            return jsonify({'success': False, 'message': str(e)}), 400
-        except Exception as e:
-            logger.error(f"Errore API update category {category_name}: {e}")
-            return jsonify({'success': False, 'message': str(e)}), 500
-    
-    @app.route('/api/categories/<category_name>', methods=['DELETE'])
-    def delete_category(category_name):
-        """API per eliminare una categoria"""
-        try:
-            # Verifica esistenza categoria
-            if not categories_manager.get_category(category_name):
-                return jsonify({'success': False, 'message': 'Categoria non trovata'}), 404
-            
-            # Elimina categoria
-            success = categories_manager.delete_category(category_name)
+            except Exception as e:
+                logger.warning(f"Errore calcolo preview per markup {markup_percent}%: {e}")
+        
+        return jsonify({
+            'success': True,
+            'pricing_preview': preview_results,
+            'base_price': base_price,
+            'duration_minutes': duration_minutes
+        })
+        
+    except Exception as e:
+        logger.error(f"Errore API pricing preview: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@categories_bp.route('/api/categories/test-classification', methods=['POST'])
+def test_classification():
+    """API per testare la classificazione di tipi di chiamata con markup"""
+    categories_manager = _categories_manager()
+    try:
+        data = request.get_json()
+        if not data or 'call_types' not in data:
+            return jsonify({'success': False, 'message': 'Dati non validi'}), 400
+        
+        call_types = data['call_types']
+        duration_seconds = int(data.get('duration_seconds', 300))  # Default 5 minuti
+        
+        results = []
+        
+        for call_type in call_types:
+            # Testa con markup
+            classification = categories_manager.calculate_call_cost(call_type, duration_seconds)
+            
+            results.append({
+                'call_type': call_type,
+                'category_name': classification['category_name'],
+                'category_display': classification['category_display_name'],
+                'matched': classification['matched'],
+                'price_per_minute_base': classification.get('price_per_minute_base', 0),
+                'price_per_minute_with_markup': classification.get('price_per_minute_with_markup', 0),
+                'price_per_minute_used': classification.get('price_per_minute_used', 0),
+                'markup_percent': classification.get('markup_percent_applied', 0),
+                'markup_source': classification.get('markup_source', 'none'),
+                'markup_applied': classification.get('markup_applied', False),
+                'cost_calculated': classification['cost_calculated'],
+                'currency': classification['currency']
+            })
+        
+        return jsonify({
+            'success': True,
+            'test_duration_seconds': duration_seconds,
+            'global_markup_percent': categories_manager.global_markup_percent,
+            'results': results
+        })
+        
+    except Exception as e:
+        logger.error(f"Errore API test classification: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@categories_bp.route('/api/categories/bulk-update-markup', methods=['POST'])
+def bulk_update_markup():
+    """API per aggiornamento massivo dei markup delle categorie"""
+    categories_manager = _categories_manager()
+    try:
+        data = request.get_json()
+        if not data or 'updates' not in data:
+            return jsonify({'success': False, 'message': 'Dati non validi'}), 400
+        
+        updates = data['updates']  # Lista di {category_name, custom_markup_percent}
+        results = []
+        pending = []  # (indice risultato, category_name, markup) da applicare in un unico salvataggio
+        
+        for update_item in updates:
+            category_name = update_item.get('category_name')
+            markup_percent = update_item.get('custom_markup_percent')
             
-            if success:
-                logger.info(f"Categoria {category_name} eliminata con successo")
-                return jsonify({
-                    'success': True,
-                    'message': f'Categoria {category_name} eliminata con successo'
+            if not category_name:
+                results.append({
+                    'category_name': category_name,
+                    'success': False,
+                    'message': 'Nome categoria mancante'
                 })
-            else:
-                return jsonify({'success': False, 'message': 'Errore nell\'eliminazione della categoria'}), 500
-                
-        except ValueError as e:
-            return jsonify({'success': False, 'message': str(e)}), 400
-        except Exception as e:
-            logger.error(f"Errore API delete category {category_name}: {e}")
-            return jsonify({'success': False, 'message': str(e)}), 500
-    
-    @app.route('/api/categories/global-markup', methods=['POST'])
-    def update_global_markup():
-        """API per aggiornare il markup globale e ricalcolare tutti i prezzi"""
-        try:
-            data = request.get_json()
-            if not data:
-                return jsonify({'success': False, 'message': 'Dati non validi'}), 400
-            
-            if 'global_markup_percent' not in data:
-                return jsonify({'success': False, 'message': 'Campo global_markup_percent obbligatorio'}), 400
+                continue
             
             try:
-                new_markup = float(data['global_markup_percent'])
-                if new_markup < -100:
-                    return jsonify({'success': False, 'message': 'Markup globale non può essere inferiore a -100%'}), 400
-                if new_markup > 1000:
-                    return jsonify({'success': False, 'message': 'Markup globale troppo alto (massimo 1000%)'}), 400
-            except (ValueError, TypeError):
-                return jsonify({'success': False, 'message': 'Valore markup globale non valido'}), 400
-            
-            # Aggiorna markup globale
-            success = categories_manager.update_global_markup(new_markup)
-            
-            if success:
-                # Opzionale: aggiorna anche la configurazione .env
-                update_env_config = data.get('update_env_config', False)
-                if update_env_config:
-                    try:
-                        secure_config.update_config({'voip_markup_percent': new_markup})
-                        from config import save_config_to_env
-                        save_config_to_env(secure_config, app.secret_key)
-                        logger.info(f"Markup globale aggiornato anche nel file .env: {new_markup}%")
-                    except Exception as e:
-                        logger.warning(f"Errore aggiornamento .env: {e}")
-                
-                # Restituisci statistiche aggiornate
-                updated_stats = categories_manager.get_statistics()
-                affected_categories = [
-                    name for name, cat in categories_manager.get_all_categories().items() 
-                    if cat.custom_markup_percent is None
-                ]
-                
-                return jsonify({
-                    'success': True,
-                    'message': f'Markup globale aggiornato a {new_markup}%',
-                    'global_markup_percent': new_markup,
-                    'affected_categories': affected_categories,
-                    'stats': updated_stats
-                })
-            else:
-                return jsonify({'success': False, 'message': 'Errore nell\'aggiornamento del markup globale'}), 500
+                # Validazione markup
+                if markup_percent is not None and markup_percent != '':
+                    markup_percent = float(markup_percent)
+                    if markup_percent < -100 or markup_percent > 1000:
+                        results.append({
+                            'category_name': category_name,
+                            'success': False,
+                            'message': 'Markup fuori range (-100% - 1000%)'
+                        })
+                        continue
+                else:
+                    markup_percent = None  # Reset a globale
                 
-        except Exception as e:
-            logger.error(f"Errore API update global markup: {e}")
-            return jsonify({'success': False, 'message': str(e)}), 500
-    
-    @app.route('/api/categories/pricing-preview', methods=['POST'])
-    def pricing_preview():
-        """API per anteprima calcolo prezzi con markup diversi"""
-        try:
-            data = request.get_json()
-            if not data:
-                return jsonify({'success': False, 'message': 'Dati non validi'}), 400
-            
-            base_price = float(data.get('base_price', 0))
-            markup_scenarios = data.get('markup_scenarios', [0, 10, 20, 30])
-            duration_minutes = int(data.get('duration_minutes', 5))
-            
-            if base_price < 0:
-                return jsonify({'success': False, 'message': 'Prezzo base deve essere positivo'}), 400
-            
-            preview_results = []
-            
-            for markup_percent in markup_scenarios:
-                try:
-                    markup_multiplier = 1 + (float(markup_percent) / 100)
-                    final_price = round(base_price * markup_multiplier, 4)
-                    total_cost = round(final_price * duration_minutes, 4)
-                    markup_amount = round(final_price - base_price, 4)
+                pending.append((len(results), category_name, markup_percent))
+                results.append(None)
                     
-                    preview_results.append({
-                        'markup_percent': markup_percent,
-                        'base_price': base_price,
-                        'markup_amount': markup_amount,
-                        'final_price': final_price,
-                        'total_cost_example': total_cost,
-                        'duration_minutes': duration_minutes
-                    })
-                except Exception as e:
-                    logger.warning(f"Errore calcolo preview per markup {markup_percent}%: {e}")
-            
-            return jsonify({
-                'success': True,
-                'pricing_preview': preview_results,
-                'base_price': base_price,
-                'duration_minutes': duration_minutes
-            })
-            
-        except Exception as e:
-            logger.error(f"Errore API pricing preview: {e}")
-            return jsonify({'success': False, 'message': str(e)}), 500
-    
-    @app.route('/api/categories/test-classification', methods=['POST'])
-    def test_classification():
-        """API per testare la classificazione di tipi di chiamata con markup"""
-        try:
-            data = request.get_json()
-            if not data or 'call_types' not in data:
-                return jsonify({'success': False, 'message': 'Dati non validi'}), 400
-            
-            call_types = data['call_types']
-            duration_seconds = int(data.get('duration_seconds', 300))  # Default 5 minuti
-            
-            results = []
-            
-            for call_type in call_types:
-                # Testa con markup
-                classification = categories_manager.calculate_call_cost(call_type, duration_seconds)
-                
+            except Exception as e:
                 results.append({
-                    'call_type': call_type,
-                    'category_name': classification['category_name'],
-                    'category_display': classification['category_display_name'],
-                    'matched': classification['matched'],
-                    'price_per_minute_base': classification.get('price_per_minute_base', 0),
-                    'price_per_minute_with_markup': classification.get('price_per_minute_with_markup', 0),
-                    'price_per_minute_used': classification.get('price_per_minute_used', 0),
-                    'markup_percent': classification.get('markup_percent_applied', 0),
-                    'markup_source': classification.get('markup_source', 'none'),
-                    'markup_applied': classification.get('markup_applied', False),
-                    'cost_calculated': classification['cost_calculated'],
-                    'currency': classification['currency']
+                    'category_name': category_name,
+                    'success': False,
+                    'message': str(e)
                 })
-            
-            return jsonify({
+        
+        # Aggiorna tutte le categorie valide con un solo salvataggio su disco
+        bulk_results = categories_manager.update_categories_bulk([
+            {'category_name': category_name, 'updates': {'custom_markup_percent': markup_percent}}
+            for _, category_name, markup_percent in pending
+        ])
+        
+        for (index, category_name, markup_percent), bulk_result in zip(pending, bulk_results):
+            if bulk_result['success']:
+                updated_category = categories_manager.get_category(category_name)
+                results[index] = {
+                    'category_name': category_name,
+                    'success': True,
+                    'new_markup_percent': markup_percent,
+                    'final_price': updated_category.price_with_markup if updated_category else None
+                }
+            else:
+                results[index] = {
+                    'category_name': category_name,
+                    'success': False,
+                    'message': bulk_result.get('message', 'Errore aggiornamento categoria')
+                }
+        
+        successful_updates = sum(1 for r in results if r['success'])
+        
+        return jsonify({
+            'success': True,
+            'message': f'{successful_updates}/{len(results)} categorie aggiornate con successo',
+            'results': results
+        })
+        
+    except Exception as e:
+        logger.error(f"Errore API bulk update markup: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@categories_bp.route('/api/categories/conflicts', methods=['GET'])
+def get_pattern_conflicts():
+    """API per ottenere conflitti tra pattern delle categorie"""
+    categories_manager = _categories_manager()
+    try:
+        def build_conflicts():
+            conflicts = categories_manager.validate_patterns_conflicts()
+            return {
+                'success': True,
+                'conflicts': conflicts,
+                'has_conflicts': len(conflicts) > 0
+            }
+        
+        return _cached_json_response('conflicts', build_conflicts)
+        
+    except Exception as e:
+        logger.error(f"Errore API conflicts: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@categories_bp.route('/api/categories/statistics', methods=['GET'])
+def get_categories_statistics():
+    """API per ottenere statistiche delle categorie con info markup"""
+    categories_manager = _categories_manager()
+    try:
+        return _cached_json_response('statistics', lambda: {
+            'success': True,
+            'statistics': categories_manager.get_statistics()
+        })
+        
+    except Exception as e:
+        logger.error(f"Errore API statistics: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@categories_bp.route('/api/categories/export', methods=['GET'])
+def export_categories():
+    """API per esportare le categorie con informazioni markup"""
+    categories_manager = _categories_manager()
+    try:
+        format_type = request.args.get('format', 'json').lower()
+        
+        if format_type not in ['json', 'csv']:
+            return jsonify({'success': False, 'message': 'Formato non supportato'}), 400
+        
+        if format_type == 'json':
+            # Esporta con informazioni pricing complete
+            categories_data = categories_manager.get_all_categories_with_pricing()
+            response = jsonify({
                 'success': True,
-                'test_duration_seconds': duration_seconds,
+                'format': format_type,
                 'global_markup_percent': categories_manager.global_markup_percent,
-                'results': results
+                'export_timestamp': datetime.now().isoformat(),
+                'data': categories_data
             })
+        else:  # CSV
+            # CSV con colonne markup, generato riga per riga in streaming
+            categories = list(categories_manager.get_all_categories().values())
             
-        except Exception as e:
-            logger.error(f"Errore API test classification: {e}")
-            return jsonify({'success': False, 'message': str(e)}), 500
-    
-    @app.route('/api/categories/bulk-update-markup', methods=['POST'])
-    def bulk_update_markup():
-        """API per aggiornamento massivo dei markup delle categorie"""
-        try:
-            data = request.get_json()
-            if not data or 'updates' not in data:
-                return jsonify({'success': False, 'message': 'Dati non validi'}), 400
-            
-            updates = data['updates']  # Lista di {category_name, custom_markup_percent}
-            results = []
-            
-            for update_item in updates:
-                category_name = update_item.get('category_name')
-                markup_percent = update_item.get('custom_markup_percent')
-                
-                if not category_name:
-                    results.append({
-                        'category_name': category_name,
-                        'success': False,
-                        'message': 'Nome categoria mancante'
-                    })
-                    continue
+            def generate_csv():
+                yield _CSV_EXPORT_HEADER
                 
-                try:
-                    # Validazione markup
-                    if markup_percent is not None and markup_percent != '':
-                        markup_percent = float(markup_percent)
-                        if markup_percent < -100 or markup_percent > 1000:
-                            results.append({
-                                'category_name': category_name,
-                                'success': False,
-                                'message': 'Markup fuori range (-100% - 1000%)'
-                            })
-                            continue
-                    else:
-                        markup_percent = None  # Reset a globale
-                    
-                    # Aggiorna categoria
-                    success = categories_manager.update_category(category_name, custom_markup_percent=markup_percent)
+                # Dati con pricing
+                for category in categories:
+                    (name, display_name, price, custom_markup, price_with_markup, currency,
+                     patterns, description, is_active, created_at, updated_at) = _CSV_EXPORT_FIELDS(category)
                     
-                    if success:
-                        updated_category = categories_manager.get_category(category_name)
-                        results.append({
-                            'category_name': category_name,
-                            'success': True,
-                            'new_markup_percent': markup_percent,
-                            'final_price': updated_category.price_with_markup if updated_category else None
-                        })
-                    else:
-                        results.append({
-                            'category_name': category_name,
-                            'success': False,
-                            'message': 'Errore aggiornamento categoria'
-                        })
-                        
-                except Exception as e:
-                    results.append({
-                        'category_name': category_name,
-                        'success': False,
-                        'message': str(e)
-                    })
-            
-            successful_updates = sum(1 for r in results if r['success'])
-            
+                    yield _csv_row((
+                        name,
+                        display_name,
+                        price,
+                        f"{custom_markup}%" if custom_markup is not None else "Globale",
+                        price_with_markup,
+                        currency,
+                        ';'.join(patterns),
+                        description,
+                        'Sì' if is_active else 'No',
+                        created_at,
+                        updated_at
+                    ))
+            
+            timestamp = _filename_timestamp()
+            response = Response(
+                stream_with_context(generate_csv()),
+                mimetype='text/csv',
+                headers={'Content-Disposition': f'attachment; filename=categories_markup_{timestamp}.csv'}
+            )
+        
+        return response
+        
+    except Exception as e:
+        logger.error(f"Errore API export: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@categories_bp.route('/api/categories/import', methods=['POST'])
+def import_categories():
+    """API per importare categorie JSON"""
+    categories_manager = _categories_manager()
+    try:
+        if _payload_too_large(MAX_IMPORT_PAYLOAD_BYTES):
+            return jsonify({'success': False, 'message': 'Payload troppo grande'}), 413
+        
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data, dict):
+            return jsonify({'success': False, 'message': 'Dati non validi'}), 400
+        
+        categories_data = data.get('categories_data')
+        merge_mode = data.get('merge', True)
+        
+        if not categories_data:
+            return jsonify({'success': False, 'message': 'Dati categorie mancanti'}), 400
+        
+        # Validazione struttura: {nome_categoria: {campi categoria}}
+        if not isinstance(categories_data, dict) or not all(isinstance(v, dict) for v in categories_data.values()):
+            return jsonify({'success': False, 'message': 'Formato categorie non valido'}), 400
+        
+        # Usa il metodo di import del categories_manager passando direttamente il dizionario
+        success = categories_manager.import_categories(
+            categories_data, 
+            format='dict', 
+            merge=merge_mode
+        )
+        
+        if success:
             return jsonify({
                 'success': True,
-                'message': f'{successful_updates}/{len(results)} categorie aggiornate con successo',
-                'results': results
+                'message': f'Categorie importate con successo (merge: {merge_mode})'
             })
+        else:
+            return jsonify({'success': False, 'message': 'Errore durante importazione'}), 500
             
-        except Exception as e:
-            logger.error(f"Errore API bulk update markup: {e}")
-            return jsonify({'success': False, 'message': str(e)}), 500
-    
-    @app.route('/api/categories/conflicts', methods=['GET'])
-    def get_pattern_conflicts():
-        """API per ottenere conflitti tra pattern delle categorie"""
+    except Exception as e:
+        logger.error(f"Errore API import: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@categories_bp.route('/api/categories/import-csv', methods=['POST'])
+def import_categories_csv():
+    """API per importare categorie da file CSV (stesso formato dell'export)"""
+    categories_manager = _categories_manager()
+    try:
+        if _payload_too_large(MAX_IMPORT_PAYLOAD_BYTES):
+            return jsonify({'success': False, 'message': 'File troppo grande'}), 413
+        
+        file = request.files.get('file')
+        if not file or not file.filename:
+            return jsonify({'success': False, 'message': 'Nessun file CSV selezionato'}), 400
+        
+        merge_mode = request.form.get('merge', 'true').lower() != 'false'
+        
+        # Upload grandi: parser pyarrow multithread, con ritorno a csv.reader in caso di errore
+        stream = _open_csv_upload(file)
+        reader = None
+        if pacsv is not None and (request.content_length or 0) >= CSV_ARROW_MIN_BYTES:
+            try:
+                reader = _read_csv_upload_arrow(stream, MAX_IMPORT_ROWS + 1)
+            except (pa.ArrowException, UnicodeDecodeError, OSError, EOFError) as e:
+                logger.warning(f"Parser pyarrow non applicabile all'import CSV, uso csv: {e}")
+                stream.seek(0)
+        
+        # Lettura in streaming dall'upload (anche compresso gzip): in memoria solo le righe già convertite
+        if reader is None:
+            reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+        rows = []
+        row_numbers = []
+        errors = []
+        error_count = 0
+        
         try:
-            conflicts = categories_manager.validate_patterns_conflicts()
-            
+            # Intestazione risolta una sola volta: le righe vengono lette per posizione con un itemgetter
+            header = next(reader, None)
+            if not header:
+                return jsonify({'success': False, 'message': 'File CSV vuoto'}), 400
+            try:
+                row_fields = _csv_import_getter(header)
+            except ValueError as e:
+                return jsonify({'success': False, 'message': f'Intestazione CSV non valida: {e}'}), 400
+            header_length = len(header)
+            
+            # Nomi usati ad ogni riga risolti una sola volta fuori dal ciclo
+            max_row_num = MAX_IMPORT_ROWS + 1
+            parse_row = _parse_csv_category_row
+            rows_append = rows.append
+            row_numbers_append = row_numbers.append
+            
+            for row_num, row in enumerate(reader, start=2):
+                if row_num > max_row_num:
+                    return jsonify({'success': False, 'message': f'Troppe righe (massimo {MAX_IMPORT_ROWS})'}), 413
+                # Righe vuote o di soli separatori (es. righe finali degli export da foglio di calcolo)
+                if not any(row):
+                    continue
+                try:
+                    if len(row) > header_length:
+                        raise ValueError('numero di colonne superiore all\'intestazione')
+                    row.extend([''] * (header_length - len(row) + 1))
+                    rows_append(parse_row(row_fields(row)))
+                    row_numbers_append(row_num)
+                except ValueError as e:
+                    error_count += 1
+                    if len(errors) < MAX_IMPORT_ERRORS:
+                        errors.append(f"Riga {row_num}: {e}")
+        except UnicodeDecodeError:
+            return jsonify({'success': False, 'message': 'Il file CSV deve essere codificato in UTF-8'}), 400
+        except (OSError, EOFError):
+            return jsonify({'success': False, 'message': 'File gzip non valido'}), 400
+        
+        if not rows:
             return jsonify({
-                'success': True,
-                'conflicts': conflicts,
-                'has_conflicts': len(conflicts) > 0
-            })
-            
-        except Exception as e:
-            logger.error(f"Errore API conflicts: {e}")
-            return jsonify({'success': False, 'message': str(e)}), 500
-    
-    @app.route('/api/categories/statistics', methods=['GET'])
-    def get_categories_statistics():
-        """API per ottenere statistiche delle categorie con info markup"""
-        try:
-            stats = categories_manager.get_statistics()
-            
+                'success': False,
+                'message': 'Nessuna categoria valida nel file CSV',
+                'errors': errors,
+                'errors_truncated': error_count - len(errors)
+            }), 400
+        
+        # Tutte le righe vengono applicate in memoria e salvate con una sola scrittura
+        results = categories_manager.bulk_upsert(rows, merge=merge_mode)
+        
+        created = updated = 0
+        for row_num, result in zip(row_numbers, results):
+            if not result['success']:
+                error_count += 1
+                if len(errors) < MAX_IMPORT_ERRORS:
+                    errors.append(f"Riga {row_num}: {result['message']}")
+            elif result['created']:
+                created += 1
+            else:
+                updated += 1
+        
+        if created + updated == 0:
+            return jsonify({
+                'success': False,
+                'message': 'Nessuna categoria importata',
+                'errors': errors,
+                'errors_truncated': error_count - len(errors)
+            }), 400
+        
+        message = f'Import CSV completato: {created} categorie create, {updated} aggiornate'
+        if error_count:
+            message += f', {error_count} righe scartate'
+        
+        return jsonify({
+            'success': True,
+            'message': message,
+            'created': created,
+            'updated': updated,
+            'errors': errors,
+            'errors_truncated': error_count - len(errors)
+        })
+        
+    except RequestEntityTooLarge:
+        return jsonify({'success': False, 'message': 'File troppo grande'}), 413
+    except Exception as e:
+        logger.error(f"Errore API import CSV: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@categories_bp.route('/api/categories/reset-defaults', methods=['POST'])
+def reset_to_defaults():
+    """API per ripristinare categorie di default"""
+    categories_manager = _categories_manager()
+    try:
+        success = categories_manager.reset_to_defaults()
+        
+        if success:
+            logger.info("Categorie ripristinate ai valori di default")
             return jsonify({
                 'success': True,
-                'statistics': stats
+                'message': 'Categorie ripristinate ai valori di default',
+                'global_markup_percent': categories_manager.global_markup_percent
             })
+        else:
+            return jsonify({'success': False, 'message': 'Errore nel ripristino'}), 500
             
-        except Exception as e:
-            logger.error(f"Errore API statistics: {e}")
-            return jsonify({'success': False, 'message': str(e)}), 500
+    except Exception as e:
+        logger.error(f"Errore API reset defaults: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+def _compute_health(categories_manager) -> dict:
+    """Esegue i controlli di salute del sistema categorie"""
+    health_status = {
+        'status': 'healthy',
+        'timestamp': datetime.now().isoformat(),
+        'checks': {},
+        'warnings': [],
+        'errors': []
+    }
     
-    @app.route('/api/categories/export', methods=['GET'])
-    def export_categories():
-        """API per esportare le categorie con informazioni markup"""
-        try:
-            format_type = request.args.get('format', 'json').lower()
-            
-            if format_type not in ['json', 'csv']:
-                return jsonify({'success': False, 'message': 'Formato non supportato'}), 400
-            
-            if format_type == 'json':
-                # Esporta con informazioni pricing complete
-                categories_data = categories_manager.get_all_categories_with_pricing()
-                response = jsonify({
-                    'success': True,
-                    'format': format_type,
-                    'global_markup_percent': categories_manager.global_markup_percent,
-                    'export_timestamp': datetime.now().isoformat(),
-                    'data': categories_data
-                })
-            else:  # CSV
-                # CSV con colonne markup
-                output = io.StringIO()
-                writer = csv.writer(output)
-                
-                # Header esteso
-                writer.writerow([
-                    'Nome', 'Nome Visualizzato', 'Prezzo Base', 'Markup Personalizzato', 
-                    'Prezzo Finale', 'Valuta', 'Pattern (separati da ;)', 'Descrizione', 
-                    'Attiva', 'Data Creazione', 'Ultima Modifica'
-                ])
-                
-                # Dati con pricing
-                for category in categories_manager.get_all_categories().values():
-                    markup_display = f"{category.custom_markup_percent}%" if category.custom_markup_percent is not None else "Globale"
-                    
-                    writer.writerow([
-                        category.name,
-                        category.display_name,
-                        category.price_per_minute,
-                        markup_display,
-                        category.price_with_markup,
-                        category.currency,
-                        ';'.join(category.patterns),
-                        category.description,
-                        'Sì' if category.is_active else 'No',
-                        category.created_at,
-                        category.updated_at
-                    ])
-                
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                response = Response(
-                    output.getvalue(),
-                    mimetype='text/csv',
-                    headers={'Content-Disposition': f'attachment; filename=categories_markup_{timestamp}.csv'}
-                )
-            
-            return response
-            
-        except Exception as e:
-            logger.error(f"Errore API export: {e}")
-            return jsonify({'success': False, 'message': str(e)}), 500
+    # Check file configurazione
+    try:
+        file_info = _config_file_info(categories_manager.config_file)
+        if file_info['exists']:
+            health_status['checks']['config_file_exists'] = True
+            
+            # Check permessi
+            health_status['checks']['config_file_readable'] = file_info['readable']
+            if not file_info['readable']:
+                health_status['errors'].append('File configurazione non leggibile')
+            
+            health_status['checks']['config_file_writable'] = file_info['writable']
+            if not file_info['writable']:
+                health_status['warnings'].append('File configurazione non scrivibile')
+        else:
+            health_status['checks']['config_file_exists'] = False
+            health_status['warnings'].append('File configurazione non esiste')
+    except Exception as e:
+        health_status['checks']['config_file_check'] = False
+        health_status['errors'].append(f'Errore controllo file: {str(e)}')
     
-    @app.route('/api/categories/import', methods=['POST'])
-    def import_categories():
-        """API per importare categorie JSON"""
-        try:
-            data = request.get_json()
-            if not data:
-                return jsonify({'success': False, 'message': 'Dati non validi'}), 400
-            
-            categories_data = data.get('categories_data')
-            merge_mode = data.get('merge', True)
-            
-            if not categories_data:
-                return jsonify({'success': False, 'message': 'Dati categorie mancanti'}), 400
-            
-            # Usa il metodo di import del categories_manager
-            success = categories_manager.import_categories(
-                json.dumps(categories_data), 
-                format='json', 
-                merge=merge_mode
-            )
-            
-            if success:
-                return jsonify({
-                    'success': True,
-                    'message': f'Categorie importate con successo (merge: {merge_mode})'
-                })
-            else:
-                return jsonify({'success': False, 'message': 'Errore durante importazione'}), 500
-                
-        except Exception as e:
-            logger.error(f"Errore API import: {e}")
-            return jsonify({'success': False, 'message': str(e)}), 500
+    # Check categorie caricate
+    try:
+        categories_count = len(categories_manager.get_all_categories())
+        active_count = len(categories_manager.get_active_categories())
+        
+        health_status['checks']['categories_loaded'] = categories_count > 0
+        health_status['checks']['active_categories'] = active_count > 0
+        
+        if categories_count == 0:
+            health_status['errors'].append('Nessuna categoria caricata')
+        elif active_count == 0:
+            health_status['warnings'].append('Nessuna categoria attiva')
+            
+    except Exception as e:
+        health_status['checks']['categories_check'] = False
+        health_status['errors'].append(f'Errore controllo categorie: {str(e)}')
     
-    @app.route('/api/categories/reset-defaults', methods=['POST'])
-    def reset_to_defaults():
-        """API per ripristinare categorie di default"""
-        try:
-            success = categories_manager.reset_to_defaults()
+    # Check conflitti pattern
+    try:
+        conflicts = categories_manager.validate_patterns_conflicts()
+        health_status['checks']['no_pattern_conflicts'] = len(conflicts) == 0
+        
+        if conflicts:
+            health_status['warnings'].append(f'{len(conflicts)} conflitti pattern rilevati')
             
-            if success:
-                logger.info("Categorie ripristinate ai valori di default")
-                return jsonify({
-                    'success': True,
-                    'message': 'Categorie ripristinate ai valori di default',
-                    'global_markup_percent': categories_manager.global_markup_percent
-                })
-            else:
-                return jsonify({'success': False, 'message': 'Errore nel ripristino'}), 500
-                
-        except Exception as e:
-            logger.error(f"Errore API reset defaults: {e}")
-            return jsonify({'success': False, 'message': str(e)}), 500
+    except Exception as e:
+        health_status['checks']['conflicts_check'] = False
+        health_status['errors'].append(f'Errore controllo conflitti: {str(e)}')
     
-    @app.route('/api/categories/health', methods=['GET'])
-    def check_categories_health():
-        """API per controllo salute sistema categorie"""
-        try:
-            health_status = {
-                'status': 'healthy',
-                'timestamp': datetime.now().isoformat(),
-                'checks': {},
-                'warnings': [],
-                'errors': []
-            }
-            
-            # Check file configurazione
-            try:
-                if categories_manager.config_file.exists():
-                    health_status['checks']['config_file_exists'] = True
-                    
-                    # Check permessi
-                    if os.access(categories_manager.config_file, os.R_OK):
-                        health_status['checks']['config_file_readable'] = True
-                    else:
-                        health_status['checks']['config_file_readable'] = False
-                        health_status['errors'].append('File configurazione non leggibile')
-                    
-                    if os.access(categories_manager.config_file, os.W_OK):
-                        health_status['checks']['config_file_writable'] = True
-                    else:
-                        health_status['checks']['config_file_writable'] = False
-                        health_status['warnings'].append('File configurazione non scrivibile')
-                else:
-                    health_status['checks']['config_file_exists'] = False
-                    health_status['warnings'].append('File configurazione non esiste')
-            except Exception as e:
-                health_status['checks']['config_file_check'] = False
-                health_status['errors'].append(f'Errore controllo file: {str(e)}')
-            
-            # Check categorie caricate
-            try:
-                categories_count = len(categories_manager.get_all_categories())
-                active_count = len(categories_manager.get_active_categories())
-                
-                health_status['checks']['categories_loaded'] = categories_count > 0
-                health_status['checks']['active_categories'] = active_count > 0
-                
-                if categories_count == 0:
-                    health_status['errors'].append('Nessuna categoria caricata')
-                elif active_count == 0:
-                    health_status['warnings'].append('Nessuna categoria attiva')
-                    
-            except Exception as e:
-                health_status['checks']['categories_check'] = False
-                health_status['errors'].append(f'Errore controllo categorie: {str(e)}')
-            
-            # Check conflitti pattern
-            try:
-                conflicts = categories_manager.validate_patterns_conflicts()
-                health_status['checks']['no_pattern_conflicts'] = len(conflicts) == 0
-                
-                if conflicts:
-                    health_status['warnings'].append(f'{len(conflicts)} conflitti pattern rilevati')
-                    
-            except Exception as e:
-                health_status['checks']['conflicts_check'] = False
-                health_status['errors'].append(f'Errore controllo conflitti: {str(e)}')
-            
-            # Determina stato generale
-            if health_status['errors']:
-                health_status['status'] = 'unhealthy'
-            elif health_status['warnings']:
-                health_status['status'] = 'degraded'
-            
-            return jsonify(health_status)
-            
-        except Exception as e:
-            logger.error(f"Errore API health check: {e}")
-            return jsonify({
-                'status': 'error',
-                'timestamp': datetime.now().isoformat(),
-                'error': str(e)
-            }), 500
+    # Determina stato generale
+    if health_status['errors']:
+        health_status['status'] = 'unhealthy'
+    elif health_status['warnings']:
+        health_status['status'] = 'degraded'
     
-    @app.route('/api/categories/validate', methods=['POST'])
-    def validate_category():
-        """API per validare una categoria"""
+    return health_status
+
+@categories_bp.route('/api/categories/health', methods=['GET'])
+def check_categories_health():
+    """API per controllo salute sistema categorie"""
+    categories_manager = _categories_manager()
+    try:
+        # Snapshot nello stato del blueprint: valido finché la versione non cambia e non è più vecchio del TTL
+        state = current_app.extensions['cdr_categories']
+        version = categories_manager.version
+        now = time.monotonic()
+        cached = state.get('health_snapshot')
+        if cached and cached[0] == version and now - cached[1] < HEALTH_CACHE_TTL:
+            health_status = cached[2]
+        else:
+            health_status = _compute_health(categories_manager)
+            state['health_snapshot'] = (version, now, health_status)
+        
+        return jsonify(health_status), 503 if health_status['status'] == 'unhealthy' else 200
+        
+    except Exception as e:
+        logger.error(f"Errore API health check: {e}")
+        return jsonify({
+            'status': 'error',
+            'timestamp': datetime.now().isoformat(),
+            'error': str(e)
+        }), 500
+
+@categories_bp.route('/api/categories/validate', methods=['POST'])
+def validate_category():
+    """API per validare una categoria"""
+    categories_manager = _categories_manager()
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'message': 'Dati non validi'}), 400
+        
+        validation_result = {
+            'valid': True,
+            'errors': [],
+            'warnings': []
+        }
+        
+        # Validazioni base
+        if not data.get('name'):
+            validation_result['errors'].append('Nome categoria mancante')
+        
+        if not data.get('display_name'):
+            validation_result['errors'].append('Nome visualizzato mancante')
+        
         try:
-            data = request.get_json()
-            if not data:
-                return jsonify({'success': False, 'message': 'Dati non validi'}), 400
-            
-            validation_result = {
-                'valid': True,
-                'errors': [],
-                'warnings': []
-            }
-            
-            # Validazioni base
-            if not data.get('name'):
-                validation_result['errors'].append('Nome categoria mancante')
-            
-            if not data.get('display_name'):
-                validation_result['errors'].append('Nome visualizzato mancante')
-            
+            price = float(data.get('price_per_minute', 0))
+            if price < 0:
+                validation_result['errors'].append('Prezzo non può essere negativo')
+            elif price > 100:
+                validation_result['warnings'].append('Prezzo molto alto')
+        except (ValueError, TypeError):
+            validation_result['errors'].append('Prezzo non valido')
+        
+        patterns = data.get('patterns', [])
+        if not patterns:
+            validation_result['errors'].append('Almeno un pattern è obbligatorio')
+        elif len(patterns) > 20:
+            validation_result['warnings'].append('Molti pattern potrebbero rallentare il matching')
+        
+        # Pattern già coperti da altre categorie attive (indice precalcolato sul manager)
+        if patterns and isinstance(patterns, list):
+            own_name = str(data.get('name') or '').upper().strip()
+            pattern_index = categories_manager.get_active_pattern_index()
+            for pattern in patterns:
+                pattern_upper = str(pattern).upper().strip()
+                if not pattern_upper:
+                    continue
+                for existing_pattern, cat_name in pattern_index:
+                    if cat_name != own_name and pattern_upper in existing_pattern:
+                        validation_result['warnings'].append(f"Pattern '{pattern}' già presente nella categoria {cat_name}")
+                        break
+        
+        # Validazione markup
+        custom_markup = data.get('custom_markup_percent')
+        if custom_markup is not None:
             try:
-                price = float(data.get('price_per_minute', 0))
-                if price < 0:
-                    validation_result['errors'].append('Prezzo non può essere negativo')
-                elif price > 100:
-                    validation_result['warnings'].append('Prezzo molto alto')
+                markup = float(custom_markup)
+                if markup < -100:
+                    validation_result['errors'].append('Markup non può essere inferiore a -100%')
+                elif markup > 1000:
+                    validation_result['errors'].append('Markup troppo alto')
+                elif markup > 500:
+                    validation_result['warnings'].append('Markup molto alto')
             except (ValueError, TypeError):
-                validation_result['errors'].append('Prezzo non valido')
-            
-            patterns = data.get('patterns', [])
-            if not patterns:
-                validation_result['errors'].append('Almeno un pattern è obbligatorio')
-            elif len(patterns) > 20:
-                validation_result['warnings'].append('Molti pattern potrebbero rallentare il matching')
-            
-            # Validazione markup
-            custom_markup = data.get('custom_markup_percent')
-            if custom_markup is not None:
-                try:
-                    markup = float(custom_markup)
-                    if markup < -100:
-                        validation_result['errors'].append('Markup non può essere inferiore a -100%')
-                    elif markup > 1000:
-                        validation_result['errors'].append('Markup troppo alto')
-                    elif markup > 500:
-                        validation_result['warnings'].append('Markup molto alto')
-                except (ValueError, TypeError):
-                    validation_result['errors'].append('Valore markup non valido')
-            
-            validation_result['valid'] = len(validation_result['errors']) == 0
-            
-            return jsonify({
-                'success': True,
-                'validation': validation_result
-            })
-            
-        except Exception as e:
-            logger.error(f"Errore API validate: {e}")
-            return jsonify({'success': False, 'message': str(e)}), 500
+                validation_result['errors'].append('Valore markup non valido')
+        
+        validation_result['valid'] = len(validation_result['errors']) == 0
+        
+        return jsonify({
+            'success': True,
+            'validation': validation_result
+        })
+        
+    except Exception as e:
+        logger.error(f"Errore API validate: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
 
 
-    @app.route('/cdr_categories_dashboard')
-    def cdr_categories_dashboard():
-        """Dashboard analytics CDR con statistiche categorie"""
-        try:
-            from routes.menu_routes import render_with_menu_context
-            
-            # Statistiche categorie
-            categories = categories_manager.get_all_categories_with_pricing()
-            stats = categories_manager.get_statistics()
-            
-            # Report generati
-            reports = analytics.list_generated_reports()
-            
-            # Statistiche sistema
-            health_info = {
-                'config_file_exists': categories_manager.config_file.exists(),
-                'categories_count': len(categories),
-                'active_categories_count': len(categories_manager.get_active_categories()),
-                'global_markup_percent': categories_manager.global_markup_percent,
-                'reports_count': len(reports),
-                'latest_report': reports[0] if reports else None
-            }
-            
-            return render_with_menu_context('cdr_dashboard.html', {
-                'categories': categories,
-                'stats': stats,
-                'reports': reports,
-                'health_info': health_info
-            })
-            
-        except Exception as e:
-            logger.error(f"Errore caricamento dashboard CDR: {e}")
-            return render_template('error.html', 
-                                error_message=f"Errore caricamento dashboard: {e}")
+@categories_bp.route('/cdr_categories_dashboard')
+def cdr_categories_dashboard():
+    """Dashboard analytics CDR con statistiche categorie"""
+    categories_manager = _categories_manager()
+    try:
+        from routes.menu_routes import render_with_menu_context
+        
+        # Statistiche categorie
+        categories = categories_manager.get_all_categories_with_pricing()
+        stats = categories_manager.get_statistics()
+        
+        # Report generati
+        reports = _extension_state()['analytics'].list_generated_reports()
+        
+        # Statistiche sistema
+        health_info = {
+            'config_file_exists': categories_manager.config_file.exists(),
+            'categories_count': len(categories),
+            'active_categories_count': len(categories_manager.get_active_categories()),
+            'global_markup_percent': categories_manager.global_markup_percent,
+            'reports_count': len(reports),
+            'latest_report': reports[0] if reports else None
+        }
+        
+        return render_with_menu_context('cdr_dashboard.html', {
+            'categories': categories,
+            'stats': stats,
+            'reports': reports,
+            'health_info': health_info
+        })
         
+    except Exception as e:
+        logger.error(f"Errore caricamento dashboard CDR: {e}")
+        return render_template('error.html', 
+                            error_message=f"Errore caricamento dashboard: {e}")
+
+
+# Route registrate dal blueprint: elenco e conteggio calcolati una sola volta all'import
+CATEGORIES_ROUTES = (
+    '/cdr_categories_edit',
+    '/cdr_categories_new',
+    '/cdr_categories_dashboard',
+    '/api/categories',
+    '/api/categories/<category_name>',
+    '/api/categories/global-markup',
+    '/api/categories/pricing-preview',
+    '/api/categories/bulk-update-markup',
+    '/api/categories/test-classification',
+    '/api/categories/conflicts',
+    '/api/categories/statistics',
+    '/api/categories/export',
+    '/api/categories/import',
+    '/api/categories/import-csv',
+    '/api/categories/reset-defaults',
+    '/api/categories/health',
+    '/api/categories/validate'
+)
+CATEGORIES_ROUTES_INFO = MappingProxyType({
+    'routes_added': CATEGORIES_ROUTES,
+    'routes_count': len(CATEGORIES_ROUTES)
+})
+
+
+def add_cdr_categories_routes(app, secure_config, analytics=None):
+    """
+    Aggiunge le route per la gestione delle categorie CDR con markup
+    
+    Args:
+        app: Istanza Flask
+        secure_config: Configurazione sicura per markup globale
+        analytics: Istanza CDRAnalyticsEnhanced già preparata (opzionale)
+    """
+    # Crea istanza se non fornita
+    if analytics is None:
+        out_directory = secure_config.get_config()['config_directory']
+        analytics = CDRAnalyticsEnhanced(output_directory=out_directory)
+    
+    app.extensions['cdr_categories'] = {
+        'analytics': analytics,
+        'categories_manager': analytics.get_categories_manager(),
+        'secure_config': secure_config,
+        # Snapshot di /api/categories/health: (versione categorie, istante monotonic, risultato)
+        'health_snapshot': None
+    }
+    app.register_blueprint(categories_bp)
+    
     logger.info("🔗 Route categorie CDR con supporto markup registrate con successo")
     
     # Restituisce le informazioni sulle route aggiunte
-    return {
-        'routes_added': [
-            '/cdr_categories_edit',
-            '/cdr_categories_new',
-            '/cdr_categories_dashboard',
-            '/api/categories',
-            '/api/categories/<category_name>',
-            '/api/categories/global-markup',
-            '/api/categories/pricing-preview',
-            '/api/categories/bulk-update-markup',
-            '/api/categories/test-classification',
-            '/api/categories/conflicts',
-            '/api/categories/statistics',
-            '/api/categories/export',
-            '/api/categories/import',
-            '/api/categories/reset-defaults',
-            '/api/categories/health',
-            '/api/categories/validate'
-        ],
-        'routes_count': 16
-    }
\ No newline at end of file
+    return CATEGORIES_ROUTES_INFO
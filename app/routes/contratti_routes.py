@@ -3,7 +3,6 @@ Categories Routes - Route Flask per gestione categorie CDR con markup personaliz
 Aggiornato per utilizzare il sistema unificato cdr_categories_enhanced.py
 """
 
-import json
 import logging
 from datetime import datetime
 import os
@@ -13,6 +12,7 @@ import csv
 import io
 
 from contratti import CDRContractsService
+from json_provider import fast_dumps, fast_loads
 
 logger = logging.getLogger(__name__)
 
@@ -140,9 +140,9 @@ def api_contract_routes(app, secure_config):
             JSON con configurazione contratti corrente
         """
         try:
-            config_dir = Path(secure_config.get_config().get('CONTRACTS_CONFIG_DIRECTORY', 
-            secure_config.get_config().get('config_directory', 'config')))
-            contracts_filename = secure_config.get_config().get('CONTRACTS_CONFIG_FILE')
+            cfg = secure_config.get_config()
+            config_dir = Path(cfg.get('CONTRACTS_CONFIG_DIRECTORY', cfg.get('config_directory', 'config')))
+            contracts_filename = cfg.get('CONTRACTS_CONFIG_FILE')
             contracts_file = config_dir / contracts_filename
             
             if not contracts_file.exists():
@@ -152,16 +152,21 @@ def api_contract_routes(app, secure_config):
                     'suggestion': 'Esegui prima estrazione codici contratto'
                 })
             
-            with open(contracts_file, 'r', encoding='utf-8') as f:
-                contracts_data = json.load(f)
+            with open(contracts_file, 'rb') as f:
+                raw_data = f.read()
+            contracts_data = fast_loads(raw_data)
             
-            return jsonify({
+            summary = fast_dumps({
                 'success': True,
                 'config_file': str(contracts_file),
                 'contracts_count': len(contracts_data.get('contracts', {})),
-                'last_updated': contracts_data.get('metadata', {}).get('last_updated'),
-                'data': contracts_data
-            })
+                'last_updated': contracts_data.get('metadata', {}).get('last_updated')
+            }).encode('utf-8')
+            
+            # Il file (già validato dal parse) è inserito così com'è come campo 'data',
+            # senza riserializzare l'intera configurazione
+            payload = summary[:-1] + b',"data":' + raw_data.strip() + b'}'
+            return app.response_class(payload, mimetype='application/json')
             
         except Exception as e:
             logger.error(f"Errore lettura configurazione contratti: {e}")
@@ -200,9 +205,9 @@ def api_contract_routes(app, secure_config):
                 }), 400
             
             # Carica configurazione esistente
-            config_dir = Path(secure_config.get_config().get('CONTRACTS_CONFIG_DIRECTORY',
-            secure_config.get_config().get('config_directory', 'config')))
-            contracts_filename = secure_config.get_config().get('CONTRACTS_CONFIG_FILE')
+            cfg = secure_config.get_config()
+            config_dir = Path(cfg.get('CONTRACTS_CONFIG_DIRECTORY', cfg.get('config_directory', 'config')))
+            contracts_filename = cfg.get('CONTRACTS_CONFIG_FILE')
             contracts_file = config_dir / contracts_filename
             
             if not contracts_file.exists():
@@ -211,8 +216,8 @@ def api_contract_routes(app, secure_config):
                     'message': 'File configurazione contratti non trovato'
                 }), 404
             
-            with open(contracts_file, 'r', encoding='utf-8') as f:
-                contracts_data = json.load(f)
+            with open(contracts_file, 'rb') as f:
+                contracts_data = fast_loads(f.read())
             
             # Verifica esistenza contratto
             if str(contract_code) not in contracts_data.get('contracts', {}):
@@ -235,15 +240,18 @@ def api_contract_routes(app, secure_config):
             if 'notes' in data:
                 contract['notes'] = data['notes'].strip()
             
-            contract['last_updated'] = datetime.now().isoformat()
+            now_iso = datetime.now().isoformat()
+            contract['last_updated'] = now_iso
             
             # Aggiorna metadata
-            contracts_data['metadata']['last_updated'] = datetime.now().isoformat()
+            contracts_data['metadata']['last_updated'] = now_iso
             contracts_data['metadata']['manual_updates'] = contracts_data['metadata'].get('manual_updates', 0) + 1
             
-            # Salva configurazione aggiornata
-            with open(contracts_file, 'w', encoding='utf-8') as f:
-                json.dump(contracts_data, f, indent=2, ensure_ascii=False)
+            # Salva configurazione aggiornata: file temporaneo e rename atomico,
+            # un'interruzione a metà scrittura lascia intatto il file precedente
+            tmp_file = Path(str(contracts_file) + '.tmp')
+            tmp_file.write_bytes(fast_dumps(contracts_data, indent=True).encode('utf-8'))
+            os.replace(tmp_file, contracts_file)
             
             logger.info(f"✅ Contratto {contract_code} aggiornato")
             
@@ -263,8 +271,8 @@ def api_contract_routes(app, secure_config):
     @app.route('/api/cdr/contract_type')    
     def contract_type():
         json_path = os.path.join(app.root_path, 'config/cdr_contract_type.json')
-        with open(json_path, encoding='utf-8') as f:
-            data = json.load(f)
+        with open(json_path, 'rb') as f:
+            data = fast_loads(f.read())
         return jsonify(data)
 
     logger.info("🔗 Route estrazione codici contratto CDR registrate")
@@ -650,6 +658,7 @@ def add_elaborazione_contratti_routes(app, secure_config, elaboratore_instance=N
             
             logger.info(f"✅ Elaborazione completata: {successi} successi, {errori} errori")
             
+            now_iso = datetime.now().isoformat()
             return jsonify({
                 'success': True,
                 'message': f'Elaborazione completata: {successi} successi, {errori} errori',
@@ -660,9 +669,9 @@ def add_elaborazione_contratti_routes(app, secure_config, elaboratore_instance=N
                     'failed': errori,
                     'timeout_used': timeout,
                     'processor_used': processor_name,
-                    'execution_time': datetime.now().isoformat()
+                    'execution_time': now_iso
                 },
-                'timestamp': datetime.now().isoformat()
+                'timestamp': now_iso
             })
             
         except Exception as e:
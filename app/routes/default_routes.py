@@ -7,6 +7,7 @@ from pathlib import Path
 from datetime import datetime
 from flask import render_template, request, jsonify, redirect, url_for, Response
 from ftp_downloader import FTPDownloader
+from json_provider import fast_dumps
 logger = get_logger(__name__)
 
 def create_routes(app, secure_config, scheduler_manager):
@@ -196,10 +197,8 @@ def create_routes(app, secure_config, scheduler_manager):
                 'config': secure_config.get_safe_config(),
                 'scheduler_running': scheduler_manager.is_running()
             }
-            last_logs_json = jsonify(last_logs)
-             # ✅ Converti in testo JSON formattato
-            json_text = json.dumps(last_logs, indent=2, ensure_ascii=False)
-            # return  last_logs_json
+            # ✅ Converti in testo JSON formattato (una sola serializzazione, via orjson)
+            json_text = fast_dumps(last_logs, indent=True)
             return render_template('logs.html', json=json_text)
         except Exception as e:
             logger.error(f"Errore endpoint status: {e}")
@@ -245,15 +244,16 @@ def create_routes(app, secure_config, scheduler_manager):
             from file_processor import ConvertFILE
             file = ConvertFILE(secure_config)
             examples = file.generate_pattern_examples()
+            now = datetime.now()
             return jsonify({
                 'success': True,
                 'examples': examples,
                 'current_datetime': {
-                    'year': datetime.now().year,
-                    'month': datetime.now().month,
-                    'day': datetime.now().day,
-                    'hour': datetime.now().hour,
-                    'minute': datetime.now().minute
+                    'year': now.year,
+                    'month': now.month,
+                    'day': now.day,
+                    'hour': now.hour,
+                    'minute': now.minute
                 }
             })
         except Exception as e:
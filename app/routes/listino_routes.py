@@ -16,6 +16,14 @@ from datetime import datetime
 import tempfile
 from pathlib import Path
 
+# Parser CSV multithread di pyarrow per i file grandi (opzionale)
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+    pacsv = None
+
 # logger = logging.getLogger(__name__)
 # Import dei logger esistenti se disponibili
 try:
@@ -44,6 +52,10 @@ def create_listino_routes(app, secure_config):
     
     # Configurazioni
     MAX_FILE_SIZE = 20 * 1024 * 1024  # 20MB
+    CSV_SNIFF_BYTES = 64 * 1024  # Campione per il rilevamento del separatore
+    CSV_CHUNK_ROWS = 10000  # Righe lette per blocco dal parser C di pandas
+    CSV_ARROW_MIN_BYTES = 5 * 1024 * 1024  # Oltre questa dimensione si usa pyarrow, se installato
+    CSV_ARROW_BLOCK_SIZE = 8 * 1024 * 1024  # Blocco di lettura del parser pyarrow
     ALLOWED_EXTENSIONS = {'csv'}
     
     def allowed_file(filename):
@@ -62,59 +74,75 @@ def create_listino_routes(app, secure_config):
     
     def parse_csv_file(file_path):
         """Analizza un file CSV con gestione robusta di encoding e separatori"""
-        try:
-            # Prova prima con encoding utf-8
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except UnicodeDecodeError:
-            # Se fallisce, prova con latin-1
-            with open(file_path, 'r', encoding='latin-1') as f:
-                content = f.read()
+        # Separatore rilevato su un campione iniziale: il file non viene mai caricato intero come stringa
+        with open(file_path, 'rb') as f:
+            sample = f.read(CSV_SNIFF_BYTES).decode('utf-8', errors='ignore')
+        
+        separator = detect_csv_separator(sample)
         
-        # Rileva il separatore
-        separator = detect_csv_separator(content)
+        # File grandi: parser pyarrow multithread, con ritorno a pandas in caso di errore
+        if pacsv is not None and os.path.getsize(file_path) >= CSV_ARROW_MIN_BYTES:
+            try:
+                return _read_csv_records_arrow(file_path, separator)
+            except (pa.ArrowException, UnicodeDecodeError) as error:
+                log_warning(f"Parser pyarrow non applicabile, uso pandas: {error}")
         
-        # Leggi il CSV con pandas
-        df = pd.read_csv(
+        # Leggi il CSV con pandas a blocchi (parser C), prima in utf-8 e in caso di errore con latin-1
+        try:
+            return _read_csv_records(file_path, separator, 'utf-8')
+        except UnicodeDecodeError:
+            return _read_csv_records(file_path, separator, 'latin-1')
+    
+    def _read_csv_records(file_path, separator, encoding):
+        """Legge il CSV a blocchi e converte ogni colonna in valori JSON compatibili"""
+        data = []
+        for chunk in pd.read_csv(file_path, sep=separator, encoding=encoding, skipinitialspace=True,
+                                 engine='c', chunksize=CSV_CHUNK_ROWS):
+            # Pulisci le intestazioni
+            columns = [str(col).strip() for col in chunk.columns]
+            column_values = [_column_to_json_values(chunk[col]) for col in chunk.columns]
+            data.extend(dict(zip(columns, row)) for row in zip(*column_values))
+        return data
+    
+    def _read_csv_records_arrow(file_path, separator):
+        """Legge il CSV a batch con pyarrow e applica la stessa conversione per colonna"""
+        reader = pacsv.open_csv(
             file_path,
-            sep=separator,
-            encoding='utf-8' if ';' in content else 'latin-1',
-            skipinitialspace=True
+            read_options=pacsv.ReadOptions(block_size=CSV_ARROW_BLOCK_SIZE),
+            parse_options=pacsv.ParseOptions(delimiter=separator),
+            convert_options=pacsv.ConvertOptions(strings_can_be_null=True)
         )
-        
-        # Pulisci le intestazioni
-        df.columns = df.columns.str.strip()
-        
-        # Converti i dati in formato JSON compatibile
         data = []
-        for _, row in df.iterrows():
-            row_dict = {}
-            for col in df.columns:
-                value = row[col]
-                if pd.isna(value):
-                    row_dict[col] = None
-                elif isinstance(value, (int, float)):
-                    # Mantieni i numeri come numeri
-                    row_dict[col] = float(value) if value != int(value) else int(value)
-                else:
-                    # Converti tutto il resto in stringa e prova a convertire in numero
-                    str_value = str(value).strip()
-                    try:
-                        # Prova a convertire in float
-                        if ',' in str_value and '.' not in str_value:
-                            # Sostituisci virgola con punto per numeri europei
-                            str_value = str_value.replace(',', '.')
-                        
-                        float_value = float(str_value)
-                        row_dict[col] = float_value if float_value != int(float_value) else int(float_value)
-                    except ValueError:
-                        # Se non è un numero, mantieni come stringa
-                        row_dict[col] = str_value
-            
-            data.append(row_dict)
-        
+        for batch in reader:
+            chunk = batch.to_pandas()
+            columns = [str(col).strip() for col in chunk.columns]
+            column_values = [_column_to_json_values(chunk[col]) for col in chunk.columns]
+            data.extend(dict(zip(columns, row)) for row in zip(*column_values))
         return data
     
+    def _json_number(value):
+        """Mantieni i numeri come numeri: interi se senza parte decimale"""
+        if isinstance(value, float):
+            return int(value) if value.is_integer() else value
+        # Interi (e booleani) convertiti direttamente: passando da float si perde precisione oltre 2**53
+        return int(value)
+    
+    def _column_to_json_values(series):
+        """Converte una colonna in lista di None, numeri o stringhe con operazioni vettoriali"""
+        if pd.api.types.is_numeric_dtype(series):
+            return [None if pd.isna(value) else _json_number(value) for value in series.tolist()]
+        
+        # Converti tutto il resto in stringa e prova a convertire in numero
+        # (virgola sostituita con punto per i numeri europei senza punto decimale)
+        text = series.astype(str).str.strip()
+        european = text.str.contains(',', regex=False) & ~text.str.contains('.', regex=False)
+        numbers = pd.to_numeric(text.where(~european, text.str.replace(',', '.', regex=False)), errors='coerce')
+        
+        return [
+            None if not present else (str_value if pd.isna(number) else _json_number(number))
+            for present, number, str_value in zip(series.notna().tolist(), numbers.tolist(), text.tolist())
+        ]
+    
     # ===== ROUTE PRINCIPALI =====
     
     @app.route('/listino')
@@ -149,6 +177,13 @@ def create_listino_routes(app, secure_config):
     def upload_file():
         """API per caricare un file CSV"""
         try:
+            # Rifiuta subito upload dichiarati troppo grandi (con margine per l'overhead multipart), prima di leggere il form
+            if request.content_length is not None and request.content_length > MAX_FILE_SIZE + CSV_SNIFF_BYTES:
+                return jsonify({
+                    'status': False,
+                    'message': f'File troppo grande. Massimo {MAX_FILE_SIZE // (1024*1024)}MB'
+                }), 400
+            
             # Verifica che ci sia un file nella richiesta
             if 'file' not in request.files:
                 return jsonify({
@@ -227,14 +262,12 @@ def create_listino_routes(app, secure_config):
             
             markup_factor = 1 + (markup / 100)
             
-            updated_data = []
+            # Le righe arrivano dal JSON della richiesta e servono solo per la risposta: si aggiornano sul posto, senza copia
             for item in table_data:
-                new_item = item.copy()
-                
                 for column in price_columns:
-                    if column in new_item and new_item[column] is not None:
+                    if column in item and item[column] is not None:
                         # Gestisce sia stringhe che numeri
-                        value = new_item[column]
+                        value = item[column]
                         
                         if isinstance(value, str):
                             # Sostituisci virgola con punto
@@ -245,16 +278,14 @@ def create_listino_routes(app, secure_config):
                             continue
                         
                         if not pd.isna(value):
-                            new_item[column] = round(value * markup_factor, 2)
-                
-                updated_data.append(new_item)
+                            item[column] = round(value * markup_factor, 2)
             
             log_success(f"Ricarico {markup}% applicato con successo")
             
             return jsonify({
                 'status': True,
                 'message': f'Ricarico del {markup}% applicato con successo a {len(price_columns)} colonne',
-                'data': updated_data
+                'data': table_data
             })
         
         except Exception as error:
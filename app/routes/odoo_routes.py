@@ -51,11 +51,12 @@ def handle_connection_errors(func):
     
     return wrapper
 
-def add_odoo_routes(app, secure_config):
+def add_odoo_routes(app, secure_config, odoo_manager=None):
     """Registra tutte le route Odoo mantenendo i nomi originali"""
     
-    # Inizializza manager principale
-    odoo_manager = get_odoo_manager(secure_config)
+    # Inizializza manager principale se non fornito
+    if odoo_manager is None:
+        odoo_manager = get_odoo_manager(secure_config)
     
     # ==================== PAGINE WEB ====================
     
@@ -222,33 +222,34 @@ class UnifiedProcessor:
             }
             
             # STEP 4: Elaborazione CDR se disponibile
-            if hasattr(self, 'cdr_analytics') and converted_files:
+            # Filtra i file CDR prima del ciclo di elaborazione
+            cdr_files = [f for f in converted_files if is_cdr_file(f)] if hasattr(self, 'cdr_analytics') else []
+            if cdr_files:
                 try:
                     cdr_results = []
                     
-                    for json_file in converted_files:
-                        if is_cdr_file(json_file):
-                            logger.info(f"🔍 Elaborazione CDR per: {json_file}")
-                            cdr_result = self.cdr_analytics.process_cdr_file(json_file)
+                    for json_file in cdr_files:
+                        logger.info("🔍 Elaborazione CDR per: %s", json_file)
+                        cdr_result = self.cdr_analytics.process_cdr_file(json_file)
+                        
+                        # Pulisci risultato CDR
+                        if isinstance(cdr_result, dict):
+                            clean_cdr_result = {
+                                'success': cdr_result.get('success', False),
+                                'message': cdr_result.get('message', ''),
+                                'source_file': str(cdr_result.get('source_file', '')),
+                                'total_records': cdr_result.get('total_records', 0),
+                                'total_contracts': cdr_result.get('total_contracts', 0),
+                                'generated_files': [str(f) for f in cdr_result.get('generated_files', [])],
+                                'categories_system_enabled': cdr_result.get('categories_system_enabled', False),
+                                'processing_timestamp': cdr_result.get('processing_timestamp', datetime.now().isoformat())
+                            }
+                            
+                            # Aggiungi statistiche categorie se disponibili
+                            if 'category_stats' in cdr_result:
+                                clean_cdr_result['category_stats'] = cdr_result['category_stats']
                             
-                            # Pulisci risultato CDR
-                            if isinstance(cdr_result, dict):
-                                clean_cdr_result = {
-                                    'success': cdr_result.get('success', False),
-                                    'message': cdr_result.get('message', ''),
-                                    'source_file': str(cdr_result.get('source_file', '')),
-                                    'total_records': cdr_result.get('total_records', 0),
-                                    'total_contracts': cdr_result.get('total_contracts', 0),
-                                    'generated_files': [str(f) for f in cdr_result.get('generated_files', [])],
-                                    'categories_system_enabled': cdr_result.get('categories_system_enabled', False),
-                                    'processing_timestamp': cdr_result.get('processing_timestamp', datetime.now().isoformat())
-                                }
-                                
-                                # Aggiungi statistiche categorie se disponibili
-                                if 'category_stats' in cdr_result:
-                                    clean_cdr_result['category_stats'] = cdr_result['category_stats']
-                                
-                                cdr_results.append(clean_cdr_result)
+                            cdr_results.append(clean_cdr_result)
                     
                     if cdr_results:
                         result['cdr_analytics'] = {
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# I moduli dell'applicazione sono file singoli nella cartella app
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
@@ -0,0 +1,68 @@
+"""Le proiezioni in cache del manager non devono essere modificabili dai chiamanti"""
+
+import copy
+
+import numpy as np
+import pytest
+
+from cdr_categories_enhanced import CDRCategoriesManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return CDRCategoriesManager(config_file=str(tmp_path / 'cdr_categories.json'))
+
+
+@pytest.mark.parametrize('getter', [
+    'get_all_categories_with_pricing',
+    'get_statistics',
+    'export_categories_obj',
+])
+def test_mutating_returned_value_keeps_cache(manager, getter):
+    # Copia indipendente dal valore restituito, per non confrontare la cache con sé stessa
+    expected = copy.deepcopy(getattr(manager, getter)())
+    expected_json = manager.export_categories('json')
+    
+    value = getattr(manager, getter)()
+    for item in value.values():
+        if isinstance(item, dict):
+            for nested in item.values():
+                if isinstance(nested, (list, dict)):
+                    nested.clear()
+            item.clear()
+    value.clear()
+    
+    assert getattr(manager, getter)() == expected
+    assert manager.export_categories('json') == expected_json
+
+
+def test_mutating_category_with_pricing_keeps_cache(manager):
+    expected = copy.deepcopy(manager.get_category_with_pricing('FISSI'))
+    
+    value = manager.get_category_with_pricing('FISSI')
+    value['patterns'].append('ALTRO')
+    value['pricing_info']['final_price'] = -1
+    
+    assert manager.get_category_with_pricing('FISSI') == expected
+    assert 'ALTRO' not in manager.export_categories_obj()['FISSI']['patterns']
+
+
+def test_mutating_conflicts_keeps_cache(manager):
+    manager.update_category('MOBILI', patterns=['MOBILE', 'CELLULARE'])
+    manager.update_category('FISSI', patterns=['FISSO', 'CELLULARE'])
+    expected = copy.deepcopy(manager.validate_patterns_conflicts())
+    assert expected
+    
+    manager.validate_patterns_conflicts()[0].clear()
+    
+    assert manager.validate_patterns_conflicts() == expected
+
+
+def test_price_table_is_read_only(manager):
+    _, prices_base, prices_markup, _ = manager.get_price_table()
+    
+    with pytest.raises(ValueError):
+        prices_base[0] = 99.0
+    with pytest.raises(ValueError):
+        prices_markup[0] = 99.0
+    assert not np.any(manager.get_price_table()[1] == 99.0)
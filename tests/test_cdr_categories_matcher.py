@@ -0,0 +1,55 @@
+"""Test di regressione per la classificazione dei tipi chiamata (automa Aho-Corasick e fallback regex)"""
+
+import json
+
+import pytest
+
+import cdr_categories_enhanced
+from cdr_categories_enhanced import CDRCategoriesManager
+from json_provider import fast_loads
+
+
+@pytest.fixture(params=['ahocorasick', 'regex'])
+def manager(request, tmp_path, monkeypatch):
+    if request.param == 'ahocorasick':
+        if cdr_categories_enhanced.ahocorasick is None:
+            pytest.skip("pyahocorasick non installato")
+    else:
+        monkeypatch.setattr(cdr_categories_enhanced, 'ahocorasick', None)
+    return CDRCategoriesManager(config_file=str(tmp_path / 'cdr_categories.json'))
+
+
+def test_all_categories_inactive(manager):
+    for name in list(manager.categories):
+        assert manager.update_category(name, is_active=False)
+    
+    assert manager.classify_call_type('TELEFONIA MOBILE') is None
+    assert manager.calculate_call_cost('TELEFONIA MOBILE', 60)['category_name'] == 'ALTRO'
+    costs, _ = manager.calculate_call_cost_batch(['TELEFONIA MOBILE', 'FAX'], [60, 120])
+    assert costs.tolist() == [0.0, 0.0]
+
+
+def _write_patterns(manager, patterns):
+    """Riscrive il file categorie con gli stessi pattern per tutte (la validazione delle API non ammette pattern vuoti)"""
+    data = fast_loads(manager.config_file.read_bytes())
+    for category in data.values():
+        category['patterns'] = patterns
+    manager.config_file.write_text(json.dumps(data), encoding='utf-8')
+    manager.load_categories()
+
+
+def test_only_empty_patterns(manager):
+    _write_patterns(manager, [''])
+    
+    # Un pattern vuoto corrisponde a qualsiasi tipo chiamata: vince la prima categoria attiva
+    first = next(iter(manager.categories.values()))
+    assert manager.classify_call_type('QUALSIASI') is first
+    assert manager.calculate_call_cost('QUALSIASI', 60)['matched'] is True
+
+
+def test_no_patterns(manager):
+    _write_patterns(manager, [])
+    
+    assert manager.classify_call_type('TELEFONIA MOBILE') is None
+    costs, _ = manager.calculate_call_cost_batch(['TELEFONIA MOBILE'], [60])
+    assert costs.tolist() == [0.0]
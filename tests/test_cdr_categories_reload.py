@@ -0,0 +1,29 @@
+"""Test della ricarica a runtime del file categorie modificato da un altro processo"""
+
+from cdr_categories_enhanced import CDRCategoriesManager
+
+
+def test_reload_keeps_categories_on_malformed_file(tmp_path):
+    manager = CDRCategoriesManager(config_file=str(tmp_path / 'cdr_categories.json'))
+    assert manager.update_category('FAX', price_per_minute=0.5)
+    
+    # Scrittura parziale di un altro worker
+    manager.config_file.write_text('{"FISSI": {', encoding='utf-8')
+    manager._file_checked_at = 0.0
+    manager.reload_if_changed()
+    
+    assert manager.categories['FAX'].price_per_minute == 0.5
+    
+    # Il salvataggio successivo riscrive la configurazione reale, non i default
+    assert manager.update_category('FISSI', price_per_minute=0.2)
+    reloaded = CDRCategoriesManager(config_file=str(manager.config_file))
+    assert reloaded.categories['FAX'].price_per_minute == 0.5
+    assert reloaded.categories['FISSI'].price_per_minute == 0.2
+
+
+def test_initial_load_falls_back_to_defaults(tmp_path):
+    config_file = tmp_path / 'cdr_categories.json'
+    config_file.write_text('{"FISSI": {', encoding='utf-8')
+    
+    manager = CDRCategoriesManager(config_file=str(config_file))
+    assert set(manager.categories) == set(CDRCategoriesManager._DEFAULT_SPECS)
@@ -0,0 +1,75 @@
+"""Test delle API categorie su un'app Flask con file categorie temporaneo"""
+
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from cdr_categories_enhanced import CDRCategoriesManager
+from routes import cdr_categories_routes
+from routes.cdr_categories_routes import add_cdr_categories_routes
+
+NEW_CATEGORY = {
+    'name': 'satellitare',
+    'display_name': 'Satellitare',
+    'price_per_minute': 0.1,
+    'patterns': ['SATELLITARE'],
+}
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return CDRCategoriesManager(config_file=str(tmp_path / 'cdr_categories.json'))
+
+
+@pytest.fixture
+def client(manager):
+    app = Flask(__name__)
+    analytics = SimpleNamespace(get_categories_manager=lambda: manager)
+    add_cdr_categories_routes(app, SimpleNamespace(get_config=dict), analytics=analytics)
+    return app.test_client()
+
+
+@pytest.mark.parametrize('value, expected', [(False, False), ('no', False), ('0', False), (0, False), ('Sì', True), (1, True)])
+def test_create_category_is_active(client, manager, value, expected):
+    response = client.post('/api/categories', json={**NEW_CATEGORY, 'is_active': value})
+    
+    assert response.status_code == 200
+    assert manager.categories['SATELLITARE'].is_active is expected
+
+
+@pytest.mark.parametrize('value', ['false-ish', 2, None, [], {}])
+def test_create_category_rejects_non_boolean_is_active(client, manager, value):
+    response = client.post('/api/categories', json={**NEW_CATEGORY, 'is_active': value})
+    
+    assert response.status_code == 400
+    assert 'SATELLITARE' not in manager.categories
+
+
+def test_update_category_rejects_non_boolean_is_active(client, manager):
+    response = client.put('/api/categories/FISSI', json={'is_active': 'off?'})
+    
+    assert response.status_code == 400
+    assert manager.categories['FISSI'].is_active is True
+    
+    assert client.put('/api/categories/FISSI', json={'is_active': 'false'}).status_code == 200
+    assert manager.categories['FISSI'].is_active is False
+
+
+def test_health_snapshot_refreshed_on_change(client, manager, monkeypatch):
+    first = client.get('/api/categories/health')
+    assert first.status_code == 200
+    snapshot = client.application.extensions['cdr_categories']['health_snapshot']
+    
+    client.get('/api/categories/health')
+    assert client.application.extensions['cdr_categories']['health_snapshot'] is snapshot
+    
+    assert manager.update_category('FISSI', price_per_minute=0.3)
+    client.get('/api/categories/health')
+    assert client.application.extensions['cdr_categories']['health_snapshot'][0] == manager.version
+    
+    # Oltre il TTL lo snapshot viene ricalcolato anche senza modifiche
+    snapshot = client.application.extensions['cdr_categories']['health_snapshot']
+    monkeypatch.setattr(cdr_categories_routes, 'HEALTH_CACHE_TTL', 0.0)
+    client.get('/api/categories/health')
+    assert client.application.extensions['cdr_categories']['health_snapshot'] is not snapshot
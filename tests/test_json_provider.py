@@ -0,0 +1,45 @@
+"""Il fallback di fast_dumps su json standard deve serializzare gli stessi tipi del percorso orjson"""
+
+import dataclasses
+import decimal
+from datetime import datetime
+
+import pytest
+
+import json_provider
+from json_provider import fast_dumps, fast_loads
+
+
+@dataclasses.dataclass
+class _Category:
+    name: str
+    patterns: list
+
+
+PAYLOAD = {
+    'z': datetime(2024, 1, 2, 3, 4, 5),
+    'a': decimal.Decimal('0.0150'),
+    'tags': {'fisso'},
+    'category': _Category('FISSI', ['FISSO']),
+}
+
+
+@pytest.mark.parametrize('indent', [False, True])
+def test_stdlib_fallback_matches_orjson(monkeypatch, indent):
+    if json_provider.orjson is None:
+        pytest.skip("orjson non installato")
+    expected = fast_loads(fast_dumps(PAYLOAD, indent=indent))
+    
+    monkeypatch.setattr(json_provider, 'orjson', None)
+    text = fast_dumps(PAYLOAD, indent=indent)
+    
+    assert fast_loads(text) == expected
+    # Ordine di inserimento delle chiavi conservato
+    assert list(fast_loads(text)) == ['z', 'a', 'tags', 'category']
+
+
+def test_orjson_type_error_falls_back_with_default():
+    # Intero oltre 64 bit: orjson solleva TypeError, il fallback usa comunque _orjson_default
+    payload = {'big': 2 ** 70, 'when': datetime(2024, 1, 2, 3, 4, 5)}
+    
+    assert fast_loads(fast_dumps(payload)) == {'big': 2 ** 70, 'when': '2024-01-02T03:04:05'}